@@ -0,0 +1,64 @@
+from typing import Any, Dict, Optional
+from app.config import settings
+
+
+class AdaptiveLimit:
+    """Limite de concorrência AIMD guiado pela latência: cresce +1 enquanto a
+    latência recente acompanha a de referência e o limite está em uso;
+    encolhe multiplicativamente quando ela passa de `tolerance` vezes a
+    referência (fila se formando dentro do Ollama)"""
+
+    def __init__(
+        self,
+        min_limit: int = None,
+        max_limit: int = None,
+        tolerance: float = None,
+        backoff: float = None,
+    ):
+        self.min_limit = min_limit or settings.OLLAMA_ADAPTIVE_MIN_LIMIT
+        self.max_limit = max_limit or settings.OLLAMA_ADAPTIVE_MAX_LIMIT
+        self.tolerance = tolerance or settings.OLLAMA_ADAPTIVE_TOLERANCE
+        self.backoff = backoff or settings.OLLAMA_ADAPTIVE_BACKOFF
+        self.latencia: Optional[float] = None
+        self.referencia: Optional[float] = None
+        self.aumentos = 0
+        self.reducoes = 0
+        self._desde_ajuste = 0
+
+    def update(self, duracao: float, ativos: int, limite: int) -> int:
+        """Registra a duração de uma geração e devolve o novo limite"""
+        if self.latencia is None:
+            self.latencia = self.referencia = duracao
+        self.latencia = 0.2 * duracao + 0.8 * self.latencia
+        # referência sobe devagar (troca de hardware/modelo) e desce na hora
+        self.referencia = 0.02 * duracao + 0.98 * self.referencia
+        self.referencia = min(self.referencia, max(self.latencia, duracao))
+
+        # no máximo um ajuste por "rodada" de gerações no limite atual
+        self._desde_ajuste += 1
+        if self._desde_ajuste < limite:
+            return limite
+        if self.latencia > self.referencia * self.tolerance:
+            novo = max(self.min_limit, int(limite * self.backoff))
+            self.reducoes += novo < limite
+        elif ativos >= limite:
+            novo = min(self.max_limit, limite + 1)
+            self.aumentos += novo > limite
+        else:
+            return limite
+        self._desde_ajuste = 0
+        return novo
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "latenciaMs": _ms(self.latencia),
+            "latenciaReferenciaMs": _ms(self.referencia),
+            "minimo": self.min_limit,
+            "maximo": self.max_limit,
+            "aumentos": self.aumentos,
+            "reducoes": self.reducoes,
+        }
+
+
+def _ms(segundos: Optional[float]) -> Optional[float]:
+    return None if segundos is None else round(segundos * 1000, 1)
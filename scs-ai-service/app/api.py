@@ -1,4 +1,8 @@
-from fastapi import APIRouter, HTTPException
+import json
+from typing import Any, AsyncIterator, Optional, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
 from app.models import (
     EventoRequest,
     AnaliseEvento,
@@ -37,10 +41,29 @@ from app.services import (
     AgentesOrchestratorService,
     EventoPredictorService,
 )
-from app.llm import MVPEngine, OllamaClient
+from app import providers
+from app.providers import ollama_breaker, ollama_pool
+from app.refinement import Refinamento
+from app.request_state import current_request
 from app.config import settings
 
-router = APIRouter()
+
+async def registrar_deadline(
+    deadline_ms: Optional[int] = Query(None, ge=1),
+    x_deadline_ms: Optional[int] = Header(None, ge=1),
+) -> None:
+    """Orçamento de latência da requisição (query tem precedência sobre header)"""
+    current_request().deadline_ms = deadline_ms or x_deadline_ms
+
+
+async def registrar_refinamento(refinar: bool = Query(False)) -> None:
+    """Com model=ollama: responde o MVP na hora e refina em background"""
+    current_request().refinar = refinar
+
+
+router = APIRouter(
+    dependencies=[Depends(registrar_deadline), Depends(registrar_refinamento)]
+)
 
 evento_service = EventoService()
 seguranca_service = SegurancaService()
@@ -54,6 +77,24 @@ agentes_orchestrator_service = AgentesOrchestratorService()
 evento_predictor_service = EventoPredictorService()
 
 
+def sse_response(eventos: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    async def corpo():
+        try:
+            async for evento, dados in eventos:
+                if isinstance(dados, BaseModel):
+                    dados = dados.model_dump(mode="json")
+                payload = json.dumps(dados, ensure_ascii=False)
+                yield f"event: {evento}\ndata: {payload}\n\n"
+        except Exception as e:
+            yield f"event: erro\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        corpo(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/")
 async def api_root():
     return {
@@ -61,13 +102,19 @@ async def api_root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/api/v1/health",
+            "ready": "/api/v1/ready",
             "models": "/api/v1/models",
+            "metrics": "/api/v1/metrics",
+            "refinamentos": "/api/v1/refinamentos/{id}",
+            "refinamentos_stream": "/api/v1/refinamentos/{id}/stream",
             "eventos": "/api/v1/eventos/analisar",
+            "eventos_stream": "/api/v1/eventos/analisar/stream",
             "seguranca": "/api/v1/seguranca/analisar-padroes",
             "protecao_mulher": "/api/v1/protecao-mulher/analisar",
             "acessibilidade": "/api/v1/acessibilidade/priorizar",
             "gestao": "/api/v1/gestao/recomendacoes",
             "textos": "/api/v1/textos/gerar",
+            "textos_stream": "/api/v1/textos/gerar/stream",
             "comunicacao": "/api/v1/comunicacao/otimizar",
             "agora_scs": "/api/v1/mapa/agora",
             "prever_movimento": "/api/v1/movimento/prever",
@@ -80,11 +127,26 @@ async def api_root():
 
 @router.get("/health")
 async def health():
-    return {
+    status = {
         "status": "ok",
         "version": "1.0.0",
         "models": ["mvp", "ollama"] if settings.USE_OLLAMA else ["mvp"],
     }
+    if ollama_pool:
+        status["ollama"] = {
+            "disponivel": ollama_pool.is_available(),
+            "circuito": ollama_breaker.stats(),
+            "warmup": providers.warmup_stats(),
+        }
+    return status
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness: só fica pronto depois do warm-up dos modelos do Ollama"""
+    if providers.is_ready():
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
 
 
 @router.get("/models", response_model=list[ModelInfo])
@@ -93,19 +155,44 @@ async def list_models():
         ModelInfo(name="mvp", provider="mvp", available=True),
     ]
 
-    if settings.USE_OLLAMA:
-        ollama = OllamaClient()
+    if ollama_pool:
         models.append(
             ModelInfo(
                 name="ollama",
                 provider="ollama",
-                available=ollama.is_available(),
+                available=ollama_pool.is_available(),
+                detalhes=ollama_pool.stats(),
             )
         )
 
     return models
 
 
+@router.get("/metrics")
+async def metrics():
+    return providers.stats()
+
+
+def _refinamento(job_id: str) -> Refinamento:
+    job = providers.refinement_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Refinamento não encontrado")
+    return job
+
+
+@router.get("/refinamentos/{job_id}")
+async def obter_refinamento(job_id: str):
+    """Polling: revisão 0 é a resposta do MVP, revisão 1 a refinada pelo Ollama"""
+    return _refinamento(job_id).to_dict()
+
+
+@router.get("/refinamentos/{job_id}/stream")
+async def acompanhar_refinamento(job_id: str) -> StreamingResponse:
+    """SSE: `resultado` com a revisão atual e outro quando o Ollama terminar"""
+    job = _refinamento(job_id)
+    return sse_response(providers.refinement_jobs.watch(job))
+
+
 @router.post("/eventos/analisar", response_model=AnaliseEvento)
 async def analisar_evento(
     evento: EventoRequest, model: str = "mvp"
@@ -116,6 +203,14 @@ async def analisar_evento(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/eventos/analisar/stream")
+async def analisar_evento_stream(
+    evento: EventoRequest, model: str = "mvp"
+) -> StreamingResponse:
+    """Versão SSE: eventos `token` com o texto parcial e um `resultado` final"""
+    return sse_response(evento_service.analisar_stream(evento, model))
+
+
 @router.post("/seguranca/analisar-padroes", response_model=AnaliseSeguranca)
 async def analisar_padroes_seguranca(
     alertas: list[dict], eventos: list[dict], model: str = "mvp"
@@ -184,6 +279,14 @@ async def gerar_texto(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/textos/gerar/stream")
+async def gerar_texto_stream(
+    request: GerarTextoRequest, model: str = "mvp"
+) -> StreamingResponse:
+    """Versão SSE: eventos `token` com o texto parcial e um `resultado` final"""
+    return sse_response(comunicacao_service.gerar_texto_stream(request, model))
+
+
 @router.post("/comunicacao/otimizar", response_model=ComunicacaoOtimizada)
 async def otimizar_comunicacao(
     request: ComunicacaoRequest, model: str = "mvp"
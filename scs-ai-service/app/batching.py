@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from app.llm import LLMProvider
+from app.registry import BATCHABLE, analisadores
+from app.config import settings
+
+
+class BatchingProvider(LLMProvider):
+    """Junta gerações do mesmo prompt que chegam dentro de uma janela curta
+    numa só chamada (JSON array). Itens que o lote não resolveu são gerados
+    individualmente"""
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        prompts: List[str] = None,
+        max_size: int = None,
+        window_ms: float = None,
+    ):
+        self.provider = provider
+        if prompts is None:
+            prompts = settings.OLLAMA_BATCH_PROMPTS
+        if prompts is None:
+            prompts = analisadores.prompts(BATCHABLE)
+        self.prompts = set(prompts)
+        self.max_size = max_size or settings.OLLAMA_BATCH_MAX_SIZE
+        self.window = (window_ms or settings.OLLAMA_BATCH_WINDOW_MS) / 1000
+        self._pendentes: Dict[str, List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tarefas: set = set()
+        self.lotes = 0
+        self.itens_em_lote = 0
+        self.individuais = 0
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    async def generate(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        if prompt not in self.prompts or self.max_size < 2:
+            return await self.provider.generate(prompt, context)
+
+        futuro = asyncio.get_running_loop().create_future()
+        fila = self._pendentes.setdefault(prompt, [])
+        fila.append((context, futuro))
+        if len(fila) >= self.max_size:
+            self._disparar(prompt)
+        elif len(fila) == 1:
+            self._timers[prompt] = asyncio.get_running_loop().call_later(
+                self.window, self._disparar, prompt
+            )
+        # shield: um chamador que desiste não cancela o lote dos outros
+        return await asyncio.shield(futuro)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "lotes": self.lotes,
+            "itensEmLote": self.itens_em_lote,
+            "tamanhoMedio": round(self.itens_em_lote / self.lotes, 2)
+            if self.lotes
+            else 0.0,
+            "individuais": self.individuais,
+            "pendentes": sum(len(f) for f in self._pendentes.values()),
+        }
+
+    def _disparar(self, prompt: str) -> None:
+        timer = self._timers.pop(prompt, None)
+        if timer:
+            timer.cancel()
+        itens = self._pendentes.pop(prompt, [])
+        if itens:
+            tarefa = asyncio.ensure_future(self._executar(prompt, itens))
+            self._tarefas.add(tarefa)
+            tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _executar(
+        self, prompt: str, itens: List[Tuple[Dict[str, Any], asyncio.Future]]
+    ) -> None:
+        contextos = [context for context, _ in itens]
+        try:
+            if len(itens) == 1:
+                resultados: List[Optional[Dict[str, Any]]] = [None]
+            else:
+                resultados = await self.provider.generate_batch(prompt, contextos)
+                self.lotes += 1
+                self.itens_em_lote += len(itens) - resultados.count(None)
+        except Exception as e:
+            for _, futuro in itens:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+
+        await asyncio.gather(
+            *[
+                self._resolver(prompt, context, futuro, resultado)
+                for (context, futuro), resultado in zip(itens, resultados)
+            ]
+        )
+
+    async def _resolver(
+        self,
+        prompt: str,
+        context: Dict[str, Any],
+        futuro: asyncio.Future,
+        resultado: Optional[Dict[str, Any]],
+    ) -> None:
+        if resultado is None:
+            self.individuais += 1
+            try:
+                resultado = await self.provider.generate(prompt, context)
+            except Exception as e:
+                if not futuro.done():
+                    futuro.set_exception(e)
+                return
+        if not futuro.done():
+            futuro.set_result(resultado)
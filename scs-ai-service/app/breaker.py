@@ -0,0 +1,195 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Tuple
+from app.llm import LLMProvider, ProviderIndisponivelError
+from app.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitoAbertoError(ProviderIndisponivelError):
+    motivo = "circuito_aberto"
+
+
+class FalhaProviderError(ProviderIndisponivelError):
+    motivo = "erro"
+
+
+class CircuitBreaker:
+    """Abre com muitas falhas ou chamadas lentas; testa de novo após o cooldown
+
+    Cada mudança de estado abre uma nova geração: before_call devolve a da
+    chamada, e resultados de chamadas iniciadas numa geração anterior (ex.:
+    antes de abrir) não contam no estado atual.
+    """
+
+    def __init__(
+        self,
+        window: int = None,
+        min_calls: int = None,
+        error_rate: float = None,
+        slow_call_ms: int = None,
+        slow_rate: float = None,
+        open_seconds: float = None,
+        half_open_calls: int = None,
+    ):
+        self.window = window or settings.OLLAMA_BREAKER_WINDOW
+        self.min_calls = min_calls or settings.OLLAMA_BREAKER_MIN_CALLS
+        self.error_rate = error_rate or settings.OLLAMA_BREAKER_ERROR_RATE
+        self.slow_call = (slow_call_ms or settings.OLLAMA_BREAKER_SLOW_CALL_MS) / 1000
+        self.slow_rate = slow_rate or settings.OLLAMA_BREAKER_SLOW_RATE
+        self.open_seconds = open_seconds or settings.OLLAMA_BREAKER_OPEN_SECONDS
+        self.half_open_calls = (
+            half_open_calls or settings.OLLAMA_BREAKER_HALF_OPEN_CALLS
+        )
+        self.estado = CLOSED
+        self.aberto_em = 0.0
+        self.aberturas = 0
+        self.rejeitadas = 0
+        self.transicoes: Deque[Dict[str, Any]] = deque(maxlen=10)
+        self._chamadas: Deque[Tuple[bool, bool]] = deque(maxlen=self.window)
+        self._testes_em_andamento = 0
+        self._testes_ok = 0
+        self.geracao = 0
+
+    def before_call(self) -> int:
+        if self.estado == OPEN:
+            if time.monotonic() - self.aberto_em < self.open_seconds:
+                self.rejeitadas += 1
+                raise CircuitoAbertoError("Circuito do Ollama aberto")
+            self._mudar_para(HALF_OPEN)
+
+        if self.estado == HALF_OPEN:
+            if self._testes_em_andamento >= self.half_open_calls:
+                self.rejeitadas += 1
+                raise CircuitoAbertoError("Circuito do Ollama em teste")
+            self._testes_em_andamento += 1
+        return self.geracao
+
+    def record(self, sucesso: bool, duracao: float, geracao: int = None) -> None:
+        if geracao is not None and geracao != self.geracao:
+            return
+        lenta = duracao >= self.slow_call
+        if self.estado == HALF_OPEN:
+            self._testes_em_andamento -= 1
+            if not sucesso or lenta:
+                self._abrir()
+                return
+            self._testes_ok += 1
+            if self._testes_ok >= self.half_open_calls:
+                self._mudar_para(CLOSED)
+            return
+
+        self._chamadas.append((sucesso, lenta))
+        if self.estado == CLOSED and self._deve_abrir():
+            self._abrir()
+
+    def release(self, geracao: int = None) -> None:
+        """Chamada abandonada (cancelada) sem resultado para contabilizar"""
+        if geracao is not None and geracao != self.geracao:
+            return
+        if self.estado == HALF_OPEN and self._testes_em_andamento > 0:
+            self._testes_em_andamento -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        falhas, lentas = self._taxas()
+        return {
+            "estado": self.estado,
+            "taxaErro": round(falhas, 3),
+            "taxaLentas": round(lentas, 3),
+            "chamadasNaJanela": len(self._chamadas),
+            "aberturas": self.aberturas,
+            "rejeitadas": self.rejeitadas,
+            "transicoes": list(self.transicoes),
+        }
+
+    def _taxas(self) -> Tuple[float, float]:
+        total = len(self._chamadas)
+        if not total:
+            return 0.0, 0.0
+        falhas = sum(1 for sucesso, _ in self._chamadas if not sucesso)
+        lentas = sum(1 for _, lenta in self._chamadas if lenta)
+        return falhas / total, lentas / total
+
+    def _deve_abrir(self) -> bool:
+        if len(self._chamadas) < self.min_calls:
+            return False
+        falhas, lentas = self._taxas()
+        return falhas >= self.error_rate or lentas >= self.slow_rate
+
+    def _abrir(self) -> None:
+        self.aberto_em = time.monotonic()
+        self.aberturas += 1
+        self._mudar_para(OPEN)
+
+    def _mudar_para(self, estado: str) -> None:
+        self.transicoes.append({"de": self.estado, "para": estado, "em": time.time()})
+        self.estado = estado
+        self.geracao += 1
+        self._chamadas.clear()
+        self._testes_em_andamento = 0
+        self._testes_ok = 0
+
+
+class BreakerProvider(LLMProvider):
+    """Curto-circuita o Ollama enquanto o breaker estiver aberto
+
+    Fica abaixo do scheduler: a duração medida é só a do backend, sem a espera
+    na fila de prioridade.
+    """
+
+    def __init__(self, provider: LLMProvider, breaker: CircuitBreaker):
+        self.provider = provider
+        self.breaker = breaker
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    async def generate(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return await self._proteger(lambda: self.provider.generate(prompt, context))
+
+    async def generate_batch(
+        self, prompt: str, contexts: List[Dict[str, Any]]
+    ) -> List[Any]:
+        return await self._proteger(
+            lambda: self.provider.generate_batch(prompt, contexts)
+        )
+
+    async def _proteger(self, chamar: Callable[[], Awaitable[Any]]) -> Any:
+        geracao = self.breaker.before_call()
+        inicio = time.monotonic()
+        try:
+            resultado = await chamar()
+        except (ProviderIndisponivelError, asyncio.CancelledError):
+            self.breaker.release(geracao)
+            raise
+        except Exception as e:
+            self.breaker.record(False, time.monotonic() - inicio, geracao)
+            raise FalhaProviderError(str(e)) from e
+        self.breaker.record(True, time.monotonic() - inicio, geracao)
+        return resultado
+
+    async def generate_stream(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        geracao = self.breaker.before_call()
+        inicio = time.monotonic()
+        emitiu = False
+        try:
+            async for evento in self.provider.generate_stream(prompt, context):
+                emitiu = True
+                yield evento
+        except (ProviderIndisponivelError, asyncio.CancelledError, GeneratorExit):
+            self.breaker.release(geracao)
+            raise
+        except Exception as e:
+            self.breaker.record(False, time.monotonic() - inicio, geracao)
+            if emitiu:
+                raise
+            raise FalhaProviderError(str(e)) from e
+        self.breaker.record(True, time.monotonic() - inicio, geracao)
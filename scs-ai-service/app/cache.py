@@ -0,0 +1,171 @@
+import asyncio
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+from app.llm import LLMProvider, RespostaDoMVP, optional_prompt_key
+from app.config import settings
+
+
+class ResponseCache:
+    """LRU em memória com TTL por prompt e, opcionalmente, uma camada SQLite"""
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        default_ttl: float = None,
+        ttls: Dict[str, float] = None,
+        sqlite_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self.default_ttl = (
+            settings.LLM_CACHE_TTL if default_ttl is None else default_ttl
+        )
+        self.ttls = settings.LLM_CACHE_TTLS if ttls is None else ttls
+        self._memoria: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        self._disco: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expiradas = 0
+
+        if sqlite_path:
+            self._disco = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._disco.execute(
+                "CREATE TABLE IF NOT EXISTS respostas "
+                "(chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL NOT NULL)"
+            )
+            self._disco.commit()
+
+    def ttl(self, prompt: str) -> float:
+        return self.ttls.get(prompt, self.default_ttl)
+
+    async def get(self, chave: str) -> Optional[Dict[str, Any]]:
+        item = self._memoria.get(chave)
+        if item is not None:
+            expira, valor = item
+            if expira > time.time():
+                self._memoria.move_to_end(chave)
+                self.hits += 1
+                return copy.deepcopy(valor)
+            del self._memoria[chave]
+            self.expiradas += 1
+
+        if self._disco is not None:
+            item = await asyncio.to_thread(self._ler_disco, chave)
+            if item is not None:
+                expira, valor = item
+                self._guardar_memoria(chave, expira, valor)
+                self.hits += 1
+                self.hits_disco += 1
+                return copy.deepcopy(valor)
+
+        self.misses += 1
+        return None
+
+    async def set(self, chave: str, prompt: str, valor: Dict[str, Any]) -> None:
+        ttl = self.ttl(prompt)
+        if ttl <= 0:
+            return
+        expira = time.time() + ttl
+        self._guardar_memoria(chave, expira, copy.deepcopy(valor))
+        if self._disco is not None:
+            await asyncio.to_thread(self._gravar_disco, chave, expira, valor)
+
+    def close(self) -> None:
+        if self._disco is not None:
+            self._disco.close()
+            self._disco = None
+
+    def stats(self) -> Dict[str, Any]:
+        consultas = self.hits + self.misses
+        return {
+            "entradas": len(self._memoria),
+            "hits": self.hits,
+            "hitsDisco": self.hits_disco,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expiradas": self.expiradas,
+            "hitRate": round(self.hits / consultas, 3) if consultas else 0.0,
+        }
+
+    def _guardar_memoria(
+        self, chave: str, expira: float, valor: Dict[str, Any]
+    ) -> None:
+        self._memoria[chave] = (expira, valor)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_entries:
+            self._memoria.popitem(last=False)
+            self.evictions += 1
+
+    def _ler_disco(self, chave: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._lock:
+            linha = self._disco.execute(
+                "SELECT valor, expira FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                return None
+            if linha[1] <= time.time():
+                self._disco.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+                self._disco.commit()
+                self.expiradas += 1
+                return None
+            return linha[1], json.loads(linha[0])
+
+    def _gravar_disco(
+        self, chave: str, expira: float, valor: Dict[str, Any]
+    ) -> None:
+        with self._lock:
+            self._disco.execute(
+                "INSERT OR REPLACE INTO respostas (chave, valor, expira) "
+                "VALUES (?, ?, ?)",
+                (chave, json.dumps(valor, default=str), expira),
+            )
+            self._disco.commit()
+
+
+class CachedProvider(LLMProvider):
+    """Serve respostas repetidas do cache; `namespace` separa MVP de Ollama"""
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        cache: ResponseCache,
+        namespace: str,
+        diretos: FrozenSet[str] = frozenset(),
+        pular: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+    ):
+        self.provider = provider
+        self.cache = cache
+        self.namespace = namespace
+        self.diretos = diretos
+        self.pular = pular
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    async def generate(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        if self.cache.ttl(prompt) <= 0:
+            return await self.provider.generate(prompt, context)
+        chave = optional_prompt_key(prompt, context, self.diretos, self.pular)
+        if chave is None:
+            return await self.provider.generate(prompt, context)
+
+        chave = f"{self.namespace}:{chave}"
+        resultado = await self.cache.get(chave)
+        if resultado is not None:
+            return resultado
+
+        resultado = await self.provider.generate(prompt, context)
+        if not isinstance(resultado, RespostaDoMVP):
+            await self.cache.set(chave, prompt, resultado)
+        return resultado
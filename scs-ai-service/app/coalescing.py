@@ -0,0 +1,55 @@
+import asyncio
+import copy
+from typing import Any, Callable, Dict, FrozenSet, Optional
+from app.llm import LLMProvider, optional_prompt_key
+
+
+class CoalescingProvider(LLMProvider):
+    """Requisições idênticas em andamento compartilham uma única geração"""
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        diretos: FrozenSet[str] = frozenset(),
+        pular: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+    ):
+        self.provider = provider
+        self.diretos = diretos
+        self.pular = pular
+        self._em_andamento: Dict[str, asyncio.Future] = {}
+        self.executadas = 0
+        self.coalescidas = 0
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    async def generate(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        chave = optional_prompt_key(prompt, context, self.diretos, self.pular)
+        if chave is None:
+            return await self.provider.generate(prompt, context)
+        tarefa = self._em_andamento.get(chave)
+
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(self.provider.generate(prompt, context))
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda _: self._liberar(chave, tarefa))
+            self.executadas += 1
+        else:
+            self.coalescidas += 1
+
+        # shield: o cancelamento de um chamador não derruba os demais
+        resultado = await asyncio.shield(tarefa)
+        return copy.deepcopy(resultado)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executadas": self.executadas,
+            "coalescidas": self.coalescidas,
+            "emAndamento": len(self._em_andamento),
+        }
+
+    def _liberar(self, chave: str, tarefa: asyncio.Future) -> None:
+        if self._em_andamento.get(chave) is tarefa:
+            del self._em_andamento[chave]
@@ -1,14 +1,137 @@
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings
-from pydantic import ConfigDict
+from pydantic import ConfigDict, field_validator
 
 
 class Settings(BaseSettings):
     model_config = ConfigDict(env_file=".env")
 
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_BASE_URLS: List[str] = []
     OLLAMA_MODEL: str = "llama3"
     USE_OLLAMA: bool = True
     USE_MVP: bool = True
+    # Fuso das análises: datas sem fuso são hora local; as demais convertidas
+    SCS_TIMEZONE: str = "America/Sao_Paulo"
+
+    # Análises do MVP com entrada grande (itens nas listas do contexto >=
+    # limiar) rodam num pool: thread | process | off
+    MVP_OFFLOAD: str = "thread"
+    MVP_OFFLOAD_WORKERS: int = 4
+    MVP_OFFLOAD_THRESHOLD: int = 2000
+    # Com NumPy instalado, análises com alertas >= limiar usam app.vectorized
+    MVP_VECTORIZED: bool = True
+    MVP_VECTORIZED_THRESHOLD: int = 2000
+    # Análises que dependem só de features discretas saem de uma tabela
+    MVP_MEMO: bool = True
+
+    OLLAMA_TIMEOUT: float = 30.0
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    OLLAMA_MAX_CONNECTIONS: int = 20
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OLLAMA_KEEPALIVE_EXPIRY: float = 60.0
+    OLLAMA_HTTP2: bool = True
+
+    OLLAMA_JSON_FORMAT: str = "schema"  # schema | json | off
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    # JSON completo: espera o chunk done (durações e contagens) até este limite
+    OLLAMA_DONE_GRACE_MS: float = 500.0
+    # Desligado por padrão: com o prefixo reaproveitado a geração vai em modo
+    # raw, sem o chat template do modelo (ver README)
+    OLLAMA_PREFIX_CACHE: bool = False
+    # {"gerar_texto": {"model": "phi3", "options": {"num_predict": 256}}}
+    OLLAMA_PROMPT_ROUTES: Dict[str, Dict[str, Any]] = {}
+    OLLAMA_ROUTES_FILE: Optional[str] = "ollama_routes.json"
+
+    OLLAMA_WARMUP: bool = True
+    OLLAMA_WARMUP_MODELS: List[str] = []
+    OLLAMA_WARMUP_RETRY: float = 5.0
+    OLLAMA_REWARM_INTERVAL: Optional[float] = None
+
+    PROMPT_TOKEN_BUDGET: int = 1024
+    PROMPT_TOKEN_BUDGETS: Dict[str, int] = {}
+    PROMPT_CHARS_PER_TOKEN: float = 4.0
+
+    OLLAMA_POOL_MAX_FAILURES: int = 3
+    OLLAMA_POOL_EJECT_SECONDS: float = 30.0
+    OLLAMA_POOL_EWMA_ALPHA: float = 0.3
+
+    # Prompt packing: até MAX_SIZE gerações do mesmo prompt na mesma janela
+    # viram uma chamada só (JSON array). None = análises "batchable" do registro
+    OLLAMA_BATCH_PROMPTS: Optional[List[str]] = None
+    OLLAMA_BATCH_MAX_SIZE: int = 8
+    OLLAMA_BATCH_WINDOW_MS: float = 15.0
+
+    # Tokens (prompt + geração) por endpoint da API numa janela móvel;
+    # esgotado, o endpoint passa a responder com o MVP
+    OLLAMA_TOKEN_BUDGETS: Dict[str, int] = {}
+    OLLAMA_TOKEN_BUDGET_WINDOW: float = 60.0
+
+    OLLAMA_HEALTH_INTERVAL: float = 10.0
+    OLLAMA_HEALTH_TIMEOUT: float = 2.0
+    OLLAMA_HEALTH_MAX_BACKOFF: float = 60.0
+    OLLAMA_HEALTH_JITTER: float = 0.2
+
+    OLLAMA_MAX_PARALLEL: int = 2
+    # Limite adaptativo (AIMD por latência); OLLAMA_MAX_PARALLEL é o inicial
+    OLLAMA_ADAPTIVE_CONCURRENCY: bool = True
+    OLLAMA_ADAPTIVE_MIN_LIMIT: int = 1
+    OLLAMA_ADAPTIVE_MAX_LIMIT: int = 16
+    OLLAMA_ADAPTIVE_TOLERANCE: float = 2.0
+    OLLAMA_ADAPTIVE_BACKOFF: float = 0.9
+    OLLAMA_PROMPT_PRIORITIES: Dict[str, str] = {
+        "analisar_protecao_mulher": "seguranca",
+        "prever_risco": "seguranca",
+        "analisar_seguranca": "seguranca",
+        "otimizar_comunicacao": "marketing",
+        "gerar_texto": "marketing",
+    }
+    OLLAMA_QUEUE_LIMITS: Dict[str, int] = {
+        "seguranca": 32,
+        "operacional": 16,
+        "marketing": 8,
+    }
+
+    OLLAMA_DEADLINE_MS: int = 20000
+    OLLAMA_DEADLINES_MS: Dict[str, int] = {
+        "analisar_protecao_mulher": 3000,
+        "prever_risco": 3000,
+        "analisar_seguranca": 3000,
+    }
+
+    # ?refinar=true: responde o MVP na hora e refina com o Ollama em background
+    REFINE_MAX_JOBS: int = 1000
+    REFINE_TTL: float = 300.0
+
+    # Shadow: fração das respostas do MVP reexecutada no Ollama para comparação
+    SHADOW_SAMPLE_RATE: float = 0.0
+    SHADOW_QUEUE_SIZE: int = 100
+    SHADOW_WORKERS: int = 1
+    SHADOW_TIMEOUT: float = 30.0
+
+    OLLAMA_BREAKER_WINDOW: int = 20
+    OLLAMA_BREAKER_MIN_CALLS: int = 5
+    OLLAMA_BREAKER_ERROR_RATE: float = 0.5
+    OLLAMA_BREAKER_SLOW_CALL_MS: int = 15000
+    OLLAMA_BREAKER_SLOW_RATE: float = 0.8
+    OLLAMA_BREAKER_OPEN_SECONDS: float = 30.0
+    OLLAMA_BREAKER_HALF_OPEN_CALLS: int = 1
+
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 1000
+    LLM_CACHE_TTL: float = 300.0
+    LLM_CACHE_TTLS: Dict[str, float] = {"agora_no_scs": 30.0}
+    LLM_CACHE_SQLITE_PATH: Optional[str] = None
+
+    @field_validator("OLLAMA_REWARM_INTERVAL", mode="before")
+    @classmethod
+    def vazio_e_none(cls, v):
+        # "OLLAMA_REWARM_INTERVAL=" no .env vale como não definido
+        return None if v == "" else v
+
+    @property
+    def ollama_base_urls(self) -> List[str]:
+        return self.OLLAMA_BASE_URLS or [self.OLLAMA_BASE_URL]
 
 
 settings = Settings()
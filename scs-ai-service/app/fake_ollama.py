@@ -0,0 +1,256 @@
+"""Ollama falso para testes e benchmarks offline.
+
+    python -m app.fake_ollama --port 11435 --latencia lognormal:800:300 \\
+        --erro 0.05 --json-invalido 0.1
+
+Responde /api/tags e /api/generate (stream e não stream) com o resultado do
+MVP no formato pedido em "format"; latência, erros HTTP e JSON malformado são
+sorteados conforme a configuração, que pode ser trocada em runtime por
+POST /fake/config.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.llm import MVPEngine, response_schema
+from app.registry import analisadores
+
+DISTRIBUICOES = ("fixa", "uniforme", "normal", "lognormal")
+# Contexto usado para montar a resposta; os prompts ausentes aceitam {}
+CONTEXTOS_EXEMPLO: Dict[str, Dict[str, Any]] = {
+    "analisar_evento": {
+        "evento": {
+            "titulo": "Show no SCS",
+            "descricao": "Show de música ao vivo",
+            "quadra": "SCS 1",
+            "dataHora": "2024-12-20T20:00:00",
+            "tipo": "show",
+        }
+    },
+}
+
+
+@dataclass
+class Latencia:
+    tipo: str = "fixa"
+    media_ms: float = 0.0
+    desvio_ms: float = 0.0
+
+    @classmethod
+    def parse(cls, valor: str) -> "Latencia":
+        """"lognormal:800:300" -> tipo, média e desvio em ms"""
+        tipo, *numeros = valor.split(":")
+        if tipo not in DISTRIBUICOES:
+            raise ValueError(f"Distribuição desconhecida: {tipo}")
+        return cls(tipo, *map(float, numeros))
+
+    def sortear(self, rng: random.Random) -> float:
+        """Segundos"""
+        media, desvio = self.media_ms, self.desvio_ms
+        if self.tipo == "uniforme":
+            valor = rng.uniform(media - desvio, media + desvio)
+        elif self.tipo == "normal":
+            valor = rng.gauss(media, desvio)
+        elif self.tipo == "lognormal" and media > 0:
+            sigma2 = math.log(1 + (desvio / media) ** 2)
+            mu = math.log(media) - sigma2 / 2
+            valor = rng.lognormvariate(mu, math.sqrt(sigma2))
+        else:
+            valor = media
+        return max(0.0, valor) / 1000
+
+
+@dataclass
+class FakeOllamaConfig:
+    latencia: Latencia = field(default_factory=Latencia)
+    carga: Latencia = field(default_factory=Latencia)  # load_duration simulado
+    taxa_erro: float = 0.0
+    taxa_json_invalido: float = 0.0
+    modelos: List[str] = field(default_factory=lambda: ["llama3"])
+    tamanho_chunk: int = 4
+    seed: Optional[int] = None
+
+    def update(self, dados: Dict[str, Any]) -> None:
+        for nome, valor in dados.items():
+            if nome in ("latencia", "carga"):
+                if isinstance(valor, str):
+                    valor = Latencia.parse(valor)
+                else:
+                    valor = Latencia(**valor)
+            if hasattr(self, nome):
+                setattr(self, nome, valor)
+
+
+class FakeOllama:
+    def __init__(self, config: FakeOllamaConfig = None):
+        self.config = config or FakeOllamaConfig()
+        self.rng = random.Random(self.config.seed)
+        self.mvp = MVPEngine()
+        self.por_schema = {
+            json.dumps(response_schema(prompt), sort_keys=True): prompt
+            for prompt in analisadores.prompts()
+        }
+        self.contadores = {"generate": 0, "erros": 0, "jsonInvalido": 0, "tags": 0}
+
+    async def resposta(self, formato: Any) -> str:
+        """Resultado do MVP para o prompt identificado pelo schema pedido"""
+        itens = None
+        if isinstance(formato, dict) and formato.get("type") == "array":
+            itens = formato.get("minItems", 1)
+            defs = {"$defs": formato["$defs"]} if "$defs" in formato else {}
+            formato = {**formato["items"], **defs}
+        prompt = self.por_schema.get(json.dumps(formato, sort_keys=True))
+        if prompt:
+            dados = await self.mvp.generate(prompt, CONTEXTOS_EXEMPLO.get(prompt, {}))
+        else:
+            dados = {"resposta": "ok"}
+        texto = json.dumps([dados] * itens if itens else dados, ensure_ascii=False)
+
+        if self.rng.random() < self.config.taxa_json_invalido:
+            self.contadores["jsonInvalido"] += 1
+            if self.rng.random() < 0.5:
+                return texto[: max(1, len(texto) // 2)]  # truncado, reparável
+            return "Desculpe, não consegui gerar o JSON."
+        return texto
+
+    def chunks(self, texto: str) -> List[str]:
+        passo = max(1, self.config.tamanho_chunk)
+        return [texto[i : i + passo] for i in range(0, len(texto), passo)]
+
+    def final(
+        self,
+        corpo: Dict[str, Any],
+        inicio: float,
+        carga: float,
+        gerados: int,
+        motivo: str = "stop",
+    ) -> Dict[str, Any]:
+        total = time.monotonic() - inicio
+        prompt_eval = max(0.0, total - carga) * 0.2
+        contexto = list(corpo.get("context") or [])
+        avaliados = math.ceil(len(corpo.get("prompt", "")) / 4)
+        return {
+            "model": corpo.get("model"),
+            "done": True,
+            "done_reason": motivo,
+            "context": contexto + list(range(avaliados + gerados)),
+            "total_duration": int(total * 1e9),
+            "load_duration": int(carga * 1e9),
+            "prompt_eval_count": avaliados,
+            "prompt_eval_duration": int(prompt_eval * 1e9),
+            "eval_count": gerados,
+            "eval_duration": int(max(0.0, total - carga - prompt_eval) * 1e9),
+        }
+
+    async def generate(self, corpo: Dict[str, Any]):
+        self.contadores["generate"] += 1
+        if self.rng.random() < self.config.taxa_erro:
+            self.contadores["erros"] += 1
+            await asyncio.sleep(self.config.latencia.sortear(self.rng) * 0.1)
+            return JSONResponse(status_code=500, content={"error": "erro injetado"})
+
+        inicio = time.monotonic()
+        carga = self.config.carga.sortear(self.rng)
+        latencia = self.config.latencia.sortear(self.rng)
+        await asyncio.sleep(carga)
+
+        if not corpo.get("prompt"):
+            # warm-up: só carrega o modelo
+            return self.final(corpo, inicio, carga, 0)
+
+        texto = await self.resposta(corpo.get("format"))
+        num_predict = (corpo.get("options") or {}).get("num_predict")
+        partes = self.chunks(texto)
+        # como o Ollama: cortado por num_predict termina com done_reason "length"
+        motivo = "length" if num_predict and len(partes) > num_predict else "stop"
+        if num_predict:
+            partes = partes[:num_predict]
+
+        if not corpo.get("stream", True):
+            await asyncio.sleep(latencia)
+            return {
+                "response": "".join(partes),
+                **self.final(corpo, inicio, carga, len(partes), motivo),
+            }
+
+        async def linhas() -> AsyncIterator[str]:
+            # 20% da latência antes do primeiro token, o resto entre os tokens
+            await asyncio.sleep(latencia * 0.2)
+            intervalo = latencia * 0.8 / max(1, len(partes))
+            for parte in partes:
+                chunk = {"model": corpo.get("model"), "response": parte, "done": False}
+                yield json.dumps(chunk, ensure_ascii=False) + "\n"
+                await asyncio.sleep(intervalo)
+            final = self.final(corpo, inicio, carga, len(partes), motivo)
+            yield json.dumps(final) + "\n"
+
+        return StreamingResponse(linhas(), media_type="application/x-ndjson")
+
+    def tags(self) -> Dict[str, Any]:
+        self.contadores["tags"] += 1
+        return {"models": [{"name": m, "model": m} for m in self.config.modelos]}
+
+
+def create_app(config: FakeOllamaConfig = None) -> FastAPI:
+    fake = FakeOllama(config)
+    app = FastAPI(title="Fake Ollama")
+    app.state.fake = fake
+
+    @app.get("/api/tags")
+    async def tags():
+        return fake.tags()
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        try:
+            return await fake.generate(await request.json())
+        except Exception as e:
+            # como o Ollama: erro vira 500, não exceção no cliente (ASGITransport)
+            return JSONResponse(status_code=500, content={"error": repr(e)})
+
+    @app.get("/fake/stats")
+    async def stats():
+        return {"config": asdict(fake.config), "contadores": fake.contadores}
+
+    @app.post("/fake/config")
+    async def configurar(request: Request):
+        fake.config.update(await request.json())
+        return asdict(fake.config)
+
+    return app
+
+
+def main(argv: List[str] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latencia", type=Latencia.parse, default=Latencia())
+    parser.add_argument("--carga", type=Latencia.parse, default=Latencia())
+    parser.add_argument("--erro", type=float, default=0.0)
+    parser.add_argument("--json-invalido", type=float, default=0.0)
+    parser.add_argument("--modelos", nargs="+", default=["llama3"])
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    config = FakeOllamaConfig(
+        latencia=args.latencia,
+        carga=args.carga,
+        taxa_erro=args.erro,
+        taxa_json_invalido=args.json_invalido,
+        modelos=args.modelos,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from typing import Any, Callable, Dict, Hashable, Tuple
+from app.config import settings
+
+
+def _copia(valor: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia suficiente para os resultados do MVP (listas e dicts de 1 nível)"""
+    copia = valor.copy()
+    for chave, item in copia.items():
+        if item.__class__ is list:
+            copia[chave] = item[:]
+        elif item.__class__ is dict:
+            copia[chave] = item.copy()
+    return copia
+
+
+class FeatureMemo:
+    """Resultados do MVP por chave de features discretas, preenchidos sob demanda
+
+    As chaves (faixa de hora, grupo da quadra, tipo, flags) têm poucos valores
+    possíveis, então a tabela não precisa de limite nem de TTL. Quem chama
+    recebe uma cópia e completa os campos de texto livre (título, descrição).
+    """
+
+    def __init__(self, enabled: bool = None):
+        self.enabled = settings.MVP_MEMO if enabled is None else enabled
+        self._tabelas: Dict[str, Dict[Hashable, Dict[str, Any]]] = {}
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    def obter(
+        self,
+        prompt: str,
+        chave: Tuple,
+        calcular: Callable[..., Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Resultado de calcular(*chave), da tabela quando já visto"""
+        if not self.enabled:
+            return calcular(*chave)
+        tabela = self._tabelas.get(prompt)
+        if tabela is None:
+            tabela = self._tabelas[prompt] = {}
+        valor = tabela.get(chave)
+        if valor is None:
+            self.misses[prompt] = self.misses.get(prompt, 0) + 1
+            valor = tabela[chave] = calcular(*chave)
+        else:
+            self.hits[prompt] = self.hits.get(prompt, 0) + 1
+        return _copia(valor)
+
+    def clear(self) -> None:
+        self._tabelas.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ativo": self.enabled,
+            "prompts": {
+                prompt: {
+                    "chaves": len(tabela),
+                    "hits": self.hits.get(prompt, 0),
+                    "misses": self.misses.get(prompt, 0),
+                }
+                for prompt, tabela in self._tabelas.items()
+            },
+        }
@@ -0,0 +1,131 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+FECHAMENTO = {"{": "}", "[": "]"}
+
+
+def strip_fences(texto: str) -> str:
+    texto = texto.strip()
+    if texto.startswith("```json"):
+        texto = texto[7:]
+    if texto.startswith("```"):
+        texto = texto[3:]
+    if texto.endswith("```"):
+        texto = texto[:-3]
+    return texto.strip()
+
+
+class JsonScanner:
+    """Acompanha o texto gerado e detecta quando o JSON de topo se fecha"""
+
+    def __init__(self):
+        self.texto = ""
+        self.inicio: Optional[int] = None
+        self.fim: Optional[int] = None
+        self._pilha: List[str] = []
+        self._em_string = False
+        self._escape = False
+
+    @property
+    def completo(self) -> bool:
+        return self.fim is not None
+
+    def feed(self, trecho: str) -> bool:
+        base = len(self.texto)
+        self.texto += trecho
+        if self.completo:
+            return True
+
+        for i, ch in enumerate(trecho, start=base):
+            if self.inicio is None:
+                if ch in FECHAMENTO:
+                    self.inicio = i
+                    self._pilha.append(ch)
+                continue
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._em_string = False
+            elif ch == '"':
+                self._em_string = True
+            elif ch in FECHAMENTO:
+                self._pilha.append(ch)
+            elif ch in "}]" and self._pilha:
+                self._pilha.pop()
+                if not self._pilha:
+                    self.fim = i + 1
+                    return True
+        return False
+
+    def documento(self) -> str:
+        if self.inicio is None:
+            return strip_fences(self.texto)
+        return self.texto[self.inicio : self.fim]
+
+
+def repair_json(texto: str) -> Any:
+    """Fecha strings e colchetes de uma saída truncada; recua até a última
+    vírgula de topo se o último item estiver incompleto"""
+    texto = strip_fences(texto)
+    inicio = min(
+        (i for i in (texto.find("{"), texto.find("[")) if i >= 0), default=-1
+    )
+    if inicio < 0:
+        raise ValueError("Nenhum JSON na resposta")
+
+    saida: List[str] = []
+    pilha: List[str] = []
+    cortes: List[Tuple[int, List[str]]] = []
+    em_string = escape = False
+
+    for ch in texto[inicio:]:
+        if em_string:
+            saida.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                em_string = False
+            continue
+        if ch == '"':
+            em_string = True
+        elif ch in FECHAMENTO:
+            pilha.append(ch)
+        elif ch in "}]":
+            _remover_virgula_final(saida)
+            if pilha:
+                pilha.pop()
+            saida.append(ch)
+            if not pilha:
+                break
+            continue
+        elif ch == ",":
+            cortes.append((len(saida), list(pilha)))
+        saida.append(ch)
+
+    tentativas = [("".join(saida) + ('"' if em_string else ""), pilha)]
+    tentativas += [
+        ("".join(saida[:pos]), abertos) for pos, abertos in reversed(cortes)
+    ]
+    for parcial, abertos in tentativas:
+        parcial = parcial.rstrip()
+        if parcial.endswith(":"):
+            parcial += " null"
+        parcial = parcial.rstrip(",")
+        fechamento = "".join(FECHAMENTO[c] for c in reversed(abertos))
+        try:
+            return json.loads(parcial + fechamento)
+        except ValueError:
+            continue
+    raise ValueError("JSON irreparável")
+
+
+def _remover_virgula_final(saida: List[str]) -> None:
+    while saida and saida[-1].isspace():
+        saida.pop()
+    if saida and saida[-1] == ",":
+        saida.pop()
@@ -1,8 +1,102 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    FrozenSet,
+    Any,
+    List,
+    Optional,
+    AsyncIterator,
+    Tuple,
+    Type,
+)
 from datetime import datetime
+from contextlib import aclosing
+from functools import lru_cache
+import asyncio
+import hashlib
+import json
 import httpx
+from pydantic import BaseModel, ValidationError
+from app.jsonparse import JsonScanner, repair_json, strip_fences
+from app.prefix_cache import PrefixCache
+from app.prompts import PromptCompilado, PromptCompiler, estimar_tokens
+from app.routing import ModelRouter, Rota
+from app.models import (
+    AgoraNoSCS,
+    AnaliseEvento,
+    AnaliseProtecaoMulher,
+    AnaliseSeguranca,
+    ComunicacaoOtimizada,
+    OrquestracaoAgentes,
+    PredicaoRisco,
+    PrevisaoMovimento,
+    PrevisaoSucessoEvento,
+    PriorizacoesAcessibilidade,
+    RecomendacoesGestao,
+    TextoGerado,
+)
+from app.registry import BATCHABLE, CHEAP, OFFLOADABLE, analisadores
+from app.request_state import current_request
 from app.config import settings
+from app.feature_memo import FeatureMemo
+from app.timestamps import agora, parse_datetime, parse_lote
+from app import vectorized
+
+if TYPE_CHECKING:
+    from app.offload import MVPOffloader
+    from app.telemetry import OllamaMetrics
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Cliente HTTP com pool de conexões, reutilizado entre requisições."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.OLLAMA_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY,
+        ),
+        http2=settings.OLLAMA_HTTP2,
+    )
+
+
+class ProviderIndisponivelError(Exception):
+    """O provider recusou a geração; o chamador deve responder com o MVP"""
+
+    motivo = "indisponivel"
+
+
+def prompt_key(prompt: str, context: Dict[str, Any]) -> str:
+    """Chave estável de prompt + contexto, independente da ordem das chaves"""
+    canonico = json.dumps(
+        context, sort_keys=True, default=str, separators=(",", ":")
+    )
+    return f"{prompt}:{hashlib.sha256(canonico.encode()).hexdigest()}"
+
+
+def optional_prompt_key(
+    prompt: str,
+    context: Dict[str, Any],
+    diretos: FrozenSet[str],
+    pular: Optional[Callable[[str, Dict[str, Any]], bool]],
+) -> Optional[str]:
+    """prompt_key para cache e coalescing; None quando a chave não compensa
+
+    A chave é JSON + sha256 do contexto inteiro, no event loop: sai mais cara
+    que a análise nos prompts `diretos` e trava o loop nos contextos que
+    `pular` aponta (entradas grandes que vão para o pool do offload).
+    """
+    if prompt in diretos or (pular is not None and pular(prompt, context)):
+        return None
+    return prompt_key(prompt, context)
+
+
+class RespostaDoMVP(dict):
+    """Resposta do Ollama trocada ou completada pelo MVP; não vai para o cache"""
 
 
 class LLMProvider(ABC):
@@ -16,60 +110,88 @@ class LLMProvider(ABC):
     def is_available(self) -> bool:
         pass
 
+    async def generate_batch(
+        self, prompt: str, contexts: List[Dict[str, Any]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Um resultado por contexto, na mesma ordem; None se o item falhou"""
+        return list(
+            await asyncio.gather(*[self.generate(prompt, c) for c in contexts])
+        )
+
+
+QUADRAS_ATIVAS = ("SCS 1", "SCS 2")
+QUADRAS_APOIO = ("SCS 3", "SCS 4")
+PALAVRAS_EVENTO_GRANDE = ("festival", "grande", "muitos", "show")
+
+
+def _grupo_quadra(quadra: str) -> str:
+    if quadra in QUADRAS_ATIVAS:
+        return "ativa"
+    return "apoio" if quadra in QUADRAS_APOIO else "outra"
+
+
+def _evento_grande(descricao: str) -> bool:
+    descricao = descricao.lower()
+    return any(palavra in descricao for palavra in PALAVRAS_EVENTO_GRANDE)
+
 
 class MVPEngine(LLMProvider):
+    """Análises determinísticas; cada uma registrada em app.registry.analisadores
+
+    As "cheap" dependem só de features discretas: o resultado sai de self.memo.
+    """
+
+    def __init__(
+        self,
+        offload: Optional["MVPOffloader"] = None,
+        memo: Optional[FeatureMemo] = None,
+    ):
+        self.offload = offload
+        self.memo = memo or FeatureMemo()
+
     def is_available(self) -> bool:
         return True
 
     async def generate(
         self, prompt: str, context: Dict[str, Any]
     ) -> Dict[str, Any]:
-        if prompt == "analisar_evento":
-            return self._analisar_evento(context["evento"])
-        if prompt == "analisar_seguranca":
-            return self._analisar_seguranca(context)
-        if prompt == "prever_risco":
-            return self._prever_risco(context)
-        if prompt == "analisar_protecao_mulher":
-            return self._analisar_protecao_mulher(context)
-        if prompt == "priorizar_acessibilidade":
-            return self._priorizar_acessibilidade(context)
-        if prompt == "recomendacoes_gestao":
-            return self._recomendacoes_gestao(context)
-        if prompt == "gerar_texto":
-            return self._gerar_texto(context)
-        if prompt == "otimizar_comunicacao":
-            return self._otimizar_comunicacao(context)
-        if prompt == "agora_no_scs":
-            return self._agora_no_scs(context)
-        if prompt == "prever_movimento":
-            return self._prever_movimento(context)
-        if prompt == "orquestrar_agentes":
-            return self._orquestrar_agentes(context)
-        if prompt == "prever_sucesso_evento":
-            return self._prever_sucesso_evento(context)
-        return {}
+        """Entradas grandes vão para o pool do offload; o resto roda inline"""
+        if self.offload is not None and self.offload.should_offload(prompt, context):
+            return await self.offload.run(prompt, context)
+        return self.run(prompt, context)
+
+    def run(self, prompt: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Levanta PromptDesconhecidoError para prompt sem análise registrada"""
+        return analisadores.get(prompt).funcao(self, context)
+
+    @analisadores.register(
+        "analisar_evento",
+        resposta=AnaliseEvento,
+        entradas=("evento",),
+        custo=CHEAP,
+    )
+    def _analisar_evento_contexto(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        return self._analisar_evento(context.get("evento", {}))
 
     def _analisar_evento(self, evento: Dict[str, Any]) -> Dict[str, Any]:
-        data_hora_raw = evento.get("dataHora")
-        if isinstance(data_hora_raw, str):
-            data_hora = datetime.fromisoformat(
-                data_hora_raw.replace("Z", "+00:00")
-            )
-        elif isinstance(data_hora_raw, datetime):
-            data_hora = data_hora_raw
-        else:
-            data_hora = datetime.now()
-
+        data_hora = parse_datetime(evento.get("dataHora"), agora())
         hora = data_hora.hour
-        is_noturno = hora >= 18
-        is_quadra_ativa = evento["quadra"] in ["SCS 1", "SCS 2"]
-        descricao_lower = evento.get("descricao", "").lower()
-        is_evento_grande = any(
-            palavra in descricao_lower
-            for palavra in ["festival", "grande", "muitos", "show"]
+        chave = (
+            hora >= 18,
+            hora >= 22,
+            _grupo_quadra(evento["quadra"]),
+            _evento_grande(evento.get("descricao", "")),
         )
+        analise = self.memo.obter(
+            "analisar_evento", chave, self._avaliar_evento
+        )
+        analise["sugestaoTexto"] = self._gerar_texto_evento(evento, data_hora)
+        return analise
 
+    def _avaliar_evento(
+        self, is_noturno: bool, is_tarde: bool, grupo: str, is_evento_grande: bool
+    ) -> Dict[str, Any]:
+        is_quadra_ativa = grupo == "ativa"
         nivel_destaque = (
             "alto"
             if is_evento_grande
@@ -78,26 +200,24 @@ class MVPEngine(LLMProvider):
 
         risco_operacional = (
             "medio"
-            if is_noturno and is_quadra_ativa and hora >= 22
+            if is_noturno and is_quadra_ativa and is_tarde
             else ("medio" if is_evento_grande and is_noturno else "baixo")
         )
 
-        sugestao_texto = self._gerar_texto_evento(evento, data_hora)
-
         recomendacoes = []
         if is_noturno and is_quadra_ativa:
             recomendacoes.append("Reforço de segurança recomendado")
-        if is_noturno and evento["quadra"] in ["SCS 3", "SCS 4"]:
+        if is_noturno and grupo == "apoio":
             recomendacoes.append("Iluminação adicional recomendada")
 
         return {
             "nivelDestaque": nivel_destaque,
             "necessidadeApoio": {
                 "seguranca": is_noturno and (is_quadra_ativa or is_evento_grande),
-                "iluminacao": is_noturno and evento["quadra"] in ["SCS 3", "SCS 4"],
+                "iluminacao": is_noturno and grupo == "apoio",
             },
             "riscoOperacional": risco_operacional,
-            "sugestaoTexto": sugestao_texto,
+            "sugestaoTexto": None,  # texto livre, preenchido por requisição
             "recomendacoes": recomendacoes,
         }
 
@@ -119,6 +239,13 @@ class MVPEngine(LLMProvider):
 
         return templates.get(tipo, f"Evento na {quadra}. {titulo}.")
 
+    @analisadores.register(
+        "analisar_seguranca",
+        resposta=AnaliseSeguranca,
+        entradas=("alertas", "eventos"),
+        custo=OFFLOADABLE,
+        relogio=True,
+    )
     def _analisar_seguranca(self, context: Dict[str, Any]) -> Dict[str, Any]:
         alertas = context.get("alertas", [])
         eventos = context.get("eventos", [])
@@ -135,11 +262,12 @@ class MVPEngine(LLMProvider):
             alertas_por_quadra.items(), key=lambda x: x[1], default=(None, 0)
         )[0]
 
+        instante = agora()
         eventos_na_quadra = [
             e
             for e in eventos
             if e.get("quadra") == quadra_mais_alertas
-            and self._is_futuro(e.get("dataHora"))
+            and self._is_futuro(e.get("dataHora"), instante)
         ]
 
         risco = (
@@ -166,24 +294,35 @@ class MVPEngine(LLMProvider):
             "recomendacao": recomendacao,
         }
 
+    @analisadores.register(
+        "prever_risco",
+        resposta=PredicaoRisco,
+        entradas=("quadra", "eventosAtivos"),
+        custo=CHEAP,
+    )
     def _prever_risco(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        quadra = context.get("quadra", "")
-        eventos_ativos = context.get("eventosAtivos", [])
+        chave = (
+            any(
+                e.get("nivelDestaque") == "alto"
+                for e in context.get("eventosAtivos", [])
+            ),
+            context.get("quadra", "") in QUADRAS_ATIVAS,
+        )
+        return self.memo.obter(
+            "prever_risco", chave, self._avaliar_risco
+        )
 
+    def _avaliar_risco(
+        self, tem_evento_grande: bool, is_quadra_ativa: bool
+    ) -> Dict[str, Any]:
         fatores = []
         risco = "baixo"
 
-        if eventos_ativos:
-            eventos_grandes = [
-                e
-                for e in eventos_ativos
-                if e.get("nivelDestaque") == "alto"
-            ]
-            if eventos_grandes:
-                fatores.append("Evento noturno de grande porte")
-                risco = "alto"
+        if tem_evento_grande:
+            fatores.append("Evento noturno de grande porte")
+            risco = "alto"
 
-        if quadra in ["SCS 1", "SCS 2"]:
+        if is_quadra_ativa:
             fatores.append("Quadra de alto movimento noturno")
             if risco == "baixo":
                 risco = "medio"
@@ -201,6 +340,12 @@ class MVPEngine(LLMProvider):
             "probabilidade": 0.75 if risco == "alto" else 0.5,
         }
 
+    @analisadores.register(
+        "analisar_protecao_mulher",
+        resposta=AnaliseProtecaoMulher,
+        entradas=("alertas", "bares"),
+        custo=OFFLOADABLE,
+    )
     def _analisar_protecao_mulher(
         self, context: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -216,37 +361,33 @@ class MVPEngine(LLMProvider):
                 "correlacaoBares": False,
             }
 
-        horarios: Dict[int, int] = {}
-        quadras: Dict[str, int] = {}
-
-        for alerta in alertas:
-            data_hora_raw = alerta.get("dataHora")
-            if isinstance(data_hora_raw, str):
-                data_hora = datetime.fromisoformat(
-                    data_hora_raw.replace("Z", "+00:00")
-                )
-            elif hasattr(data_hora_raw, "hour"):
-                data_hora = data_hora_raw
-            else:
-                data_hora = datetime.now()
-
-            hora = data_hora.hour
-            horarios[hora] = horarios.get(hora, 0) + 1
-
-            quadra = alerta.get("quadra", "")
-            quadras[quadra] = quadras.get(quadra, 0) + 1
-
-        horarios_criticos = [
-            f"{h:02d}:00-{h+1:02d}:00"
-            for h in sorted(horarios.keys(), key=lambda x: horarios[x], reverse=True)[
-                :3
+        if vectorized.usar(alertas):
+            horarios_criticos, quadras_problematicas = vectorized.protecao_mulher(
+                alertas
+            )
+        else:
+            horarios: Dict[int, int] = {}
+            quadras: Dict[str, int] = {}
+
+            datas = parse_lote((a.get("dataHora") for a in alertas), agora())
+            for alerta, data_hora in zip(alertas, datas):
+                hora = data_hora.hour
+                horarios[hora] = horarios.get(hora, 0) + 1
+
+                quadra = alerta.get("quadra", "")
+                quadras[quadra] = quadras.get(quadra, 0) + 1
+
+            horarios_criticos = [
+                f"{h:02d}:00-{h+1:02d}:00"
+                for h in sorted(
+                    horarios.keys(), key=lambda x: horarios[x], reverse=True
+                )[:3]
             ]
-        ]
 
-        quadras_problematicas = sorted(
-            quadras.items(), key=lambda x: x[1], reverse=True
-        )[:2]
-        quadras_problematicas = [q[0] for q in quadras_problematicas]
+            quadras_problematicas = sorted(
+                quadras.items(), key=lambda x: x[1], reverse=True
+            )[:2]
+            quadras_problematicas = [q[0] for q in quadras_problematicas]
 
         risco = "alto" if len(alertas) >= 3 else "medio"
 
@@ -266,6 +407,12 @@ class MVPEngine(LLMProvider):
             "correlacaoBares": len(bares) > 0,
         }
 
+    @analisadores.register(
+        "priorizar_acessibilidade",
+        resposta=PriorizacoesAcessibilidade,
+        entradas=("necessidades",),
+        custo=OFFLOADABLE,
+    )
     def _priorizar_acessibilidade(
         self, context: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -306,6 +453,12 @@ class MVPEngine(LLMProvider):
 
         return {"priorizacao": priorizacao}
 
+    @analisadores.register(
+        "recomendacoes_gestao",
+        resposta=RecomendacoesGestao,
+        entradas=("eventos", "alertas", "ocupacao"),
+        custo=OFFLOADABLE,
+    )
     def _recomendacoes_gestao(self, context: Dict[str, Any]) -> Dict[str, Any]:
         eventos = context.get("eventos", [])
         alertas = context.get("alertas", [])
@@ -374,6 +527,12 @@ class MVPEngine(LLMProvider):
 
         return {"recomendacoes": recomendacoes}
 
+    @analisadores.register(
+        "gerar_texto",
+        resposta=TextoGerado,
+        entradas=("tipo", "contexto"),
+        custo=BATCHABLE,
+    )
     def _gerar_texto(self, context: Dict[str, Any]) -> Dict[str, Any]:
         tipo_texto = context.get("tipo", "evento")
         contexto = context.get("contexto", {})
@@ -394,24 +553,30 @@ class MVPEngine(LLMProvider):
 
         return {"texto": "", "hashtags": []}
 
+    @analisadores.register(
+        "otimizar_comunicacao",
+        resposta=ComunicacaoOtimizada,
+        entradas=("evento",),
+        custo=CHEAP,
+    )
     def _otimizar_comunicacao(self, context: Dict[str, Any]) -> Dict[str, Any]:
         evento = context.get("evento", {})
-        nivel_destaque = evento.get("nivelDestaque", "medio")
-
-        data_hora_raw = evento.get("dataHora")
-        if isinstance(data_hora_raw, str):
-            data_hora = datetime.fromisoformat(
-                data_hora_raw.replace("Z", "+00:00")
-            )
-        elif hasattr(data_hora_raw, "hour"):
-            data_hora = data_hora_raw
-        else:
-            data_hora = datetime.now()
-
-        hora = data_hora.hour if hasattr(data_hora, "hour") else 14
-        is_noturno = hora >= 18
+        hora = parse_datetime(evento.get("dataHora"), agora()).hour
+        chave = (evento.get("nivelDestaque", "medio") == "alto", hora >= 18)
+        plano = self.memo.obter(
+            "otimizar_comunicacao", chave, self._avaliar_comunicacao
+        )
+        plano["conteudo"] = {
+            "titulo": evento.get("titulo", ""),
+            "descricao": evento.get("descricao", ""),
+            "hashtags": [f"#{evento.get('quadra', '').replace(' ', '')}"],
+        }
+        return plano
 
-        if nivel_destaque == "alto":
+    def _avaliar_comunicacao(
+        self, is_destaque_alto: bool, is_noturno: bool
+    ) -> Dict[str, Any]:
+        if is_destaque_alto:
             canal = "instagram"
             horario = "18:00-20:00"
             formato = "story"
@@ -424,31 +589,35 @@ class MVPEngine(LLMProvider):
             horario = "12:00-13:00"
             formato = "canal"
 
-        conteudo = {
-            "titulo": evento.get("titulo", ""),
-            "descricao": evento.get("descricao", ""),
-            "hashtags": [f"#{evento.get('quadra', '').replace(' ', '')}"],
-        }
-
         return {
             "canalSugerido": canal,
             "horarioPublicacao": horario,
             "formato": formato,
-            "conteudo": conteudo,
+            "conteudo": None,  # texto livre, preenchido por requisição
         }
 
-    def _is_futuro(self, data_hora_raw: Any) -> bool:
-        if isinstance(data_hora_raw, str):
-            data_hora = datetime.fromisoformat(
-                data_hora_raw.replace("Z", "+00:00")
-            )
-        elif hasattr(data_hora_raw, "__gt__"):
-            data_hora = data_hora_raw
-        else:
+    def _is_futuro(
+        self, data_hora_raw: Any, instante: Optional[datetime] = None
+    ) -> bool:
+        data_hora = parse_datetime(data_hora_raw)
+        if data_hora is None:
             return False
 
-        return data_hora > datetime.now()
-
+        return data_hora > (instante or agora())
+
+    @analisadores.register(
+        "agora_no_scs",
+        resposta=AgoraNoSCS,
+        entradas=(
+            "quadra",
+            "timestamp",
+            "eventosAtivos",
+            "comerciosAbertos",
+            "alertasRecentes",
+            "checkIns",
+        ),
+        custo=OFFLOADABLE,
+    )
     def _agora_no_scs(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """MAPA VIVO: Mostra o que está acontecendo AGORA no SCS"""
         quadra = context.get("quadra")
@@ -485,17 +654,10 @@ class MVPEngine(LLMProvider):
             seguranca = "presente" if eventos_ativos else "ausente"
 
         # Iluminação
-        if timestamp:
-            try:
-                if isinstance(timestamp, str):
-                    timestamp_clean = timestamp.replace("Z", "+00:00")
-                    hora = datetime.fromisoformat(timestamp_clean).hour
-                else:
-                    hora = timestamp.hour
-            except (ValueError, AttributeError):
-                hora = datetime.now().hour
-        else:
-            hora = datetime.now().hour
+        try:
+            hora = parse_datetime(timestamp or None, agora()).hour
+        except ValueError:
+            hora = agora().hour
 
         if hora >= 18:
             iluminacao = "reforcada" if eventos_ativos else "adequada"
@@ -530,19 +692,19 @@ class MVPEngine(LLMProvider):
             "pessoasEstimadas": pessoas_estimadas,
         }
 
+    @analisadores.register(
+        "prever_movimento",
+        resposta=PrevisaoMovimento,
+        entradas=("quadra", "eventosAgendados", "historico", "dataHora"),
+        custo=OFFLOADABLE,
+    )
     def _prever_movimento(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """PREDIÇÃO: Prever movimento futuro baseado em padrões"""
         quadra = context.get("quadra", "")
-        data_hora_raw = context.get("dataHora")
         eventos_agendados = context.get("eventosAgendados", [])
         historico = context.get("historico", {})
 
-        if isinstance(data_hora_raw, str):
-            data_hora = datetime.fromisoformat(data_hora_raw.replace("Z", "+00:00"))
-        elif hasattr(data_hora_raw, "hour"):
-            data_hora = data_hora_raw
-        else:
-            data_hora = datetime.now()
+        data_hora = parse_datetime(context.get("dataHora"), agora())
 
         # Score base do histórico
         dia_semana = data_hora.weekday()
@@ -592,6 +754,13 @@ class MVPEngine(LLMProvider):
             "recomendacao": recomendacao,
         }
 
+    @analisadores.register(
+        "orquestrar_agentes",
+        resposta=OrquestracaoAgentes,
+        entradas=("quadra", "contexto"),
+        custo=OFFLOADABLE,
+        relogio=True,
+    )
     def _orquestrar_agentes(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """IA MULTI-AGENTE: Orquestra múltiplos agentes para decisão inteligente"""
         quadra = context.get("quadra", "")
@@ -663,16 +832,51 @@ class MVPEngine(LLMProvider):
             },
         }
 
+    @analisadores.register(
+        "prever_sucesso_evento",
+        resposta=PrevisaoSucessoEvento,
+        entradas=("evento", "historico"),
+        custo=CHEAP,
+    )
     def _prever_sucesso_evento(self, context: Dict[str, Any]) -> Dict[str, Any]:
         """PREDIÇÃO: Prever se evento vai ter sucesso antes de acontecer"""
         evento = context.get("evento", {})
         historico = context.get("historico", {})
 
+        tipo = evento.get("tipo", "")
+        hora = parse_datetime(evento.get("dataHora"), agora()).hour
+        chave = (
+            tipo if tipo in ("musical", "gastronomico", "cultural") else "",
+            "noite" if 18 <= hora <= 22 else "tarde" if 14 <= hora < 18 else "",
+            hora < 18,
+            _grupo_quadra(evento.get("quadra", "")),
+            _evento_grande(evento.get("descricao", "")),
+        )
+
+        similares = (historico or {}).get("eventos_similares", [])
+        if similares:
+            # taxa média contínua: não vale a tabela
+            taxa_media = sum(e.get("taxaSucesso", 0.5) for e in similares) / len(
+                similares
+            )
+            return self._avaliar_sucesso(*chave, (len(similares), taxa_media))
+        return self.memo.obter(
+            "prever_sucesso_evento", chave, self._avaliar_sucesso
+        )
+
+    def _avaliar_sucesso(
+        self,
+        tipo: str,
+        faixa: str,
+        antes_das_18: bool,
+        grupo: str,
+        is_evento_grande: bool,
+        similares: Optional[Tuple[int, float]] = None,
+    ) -> Dict[str, Any]:
         fatores = []
         score = 0.5  # Base
 
         # Fator 1: Tipo de evento
-        tipo = evento.get("tipo", "")
         if tipo == "musical":
             score += 0.15
             fatores.append("Eventos musicais têm 30% mais engajamento (+15%)")
@@ -684,44 +888,31 @@ class MVPEngine(LLMProvider):
             fatores.append("Eventos culturais têm engajamento moderado (+8%)")
 
         # Fator 2: Horário
-        data_hora_raw = evento.get("dataHora")
-        if isinstance(data_hora_raw, str):
-            data_hora = datetime.fromisoformat(data_hora_raw.replace("Z", "+00:00"))
-        elif hasattr(data_hora_raw, "hour"):
-            data_hora = data_hora_raw
-        else:
-            data_hora = datetime.now()
-
-        hora = data_hora.hour
-        if 18 <= hora <= 22:
+        if faixa == "noite":
             score += 0.10
             fatores.append("Horário noturno ideal para SCS (+10%)")
-        elif 14 <= hora < 18:
+        elif faixa == "tarde":
             score += 0.05
             fatores.append("Horário vespertino adequado (+5%)")
 
         # Fator 3: Quadra
-        quadra = evento.get("quadra", "")
-        if quadra in ["SCS 1", "SCS 2"]:
+        if grupo == "ativa":
             score += 0.10
             fatores.append("Quadras 1-2 têm histórico positivo (+10%)")
-        elif quadra in ["SCS 3", "SCS 4"]:
+        elif grupo == "apoio":
             score += 0.05
             fatores.append("Quadras 3-4 têm potencial de crescimento (+5%)")
 
         # Fator 4: Descrição (palavras-chave)
-        descricao = evento.get("descricao", "").lower()
-        if any(palavra in descricao for palavra in ["festival", "grande", "show", "muitos"]):
+        if is_evento_grande:
             score += 0.10
             fatores.append("Descrição indica evento de grande porte (+10%)")
 
         # Fator 5: Histórico (se disponível)
-        if historico:
-            eventos_similares = historico.get("eventos_similares", [])
-            if eventos_similares:
-                taxa_media = sum(e.get("taxaSucesso", 0.5) for e in eventos_similares) / len(eventos_similares)
-                score = (score + taxa_media) / 2
-                fatores.append(f"Baseado em {len(eventos_similares)} eventos similares no histórico")
+        if similares:
+            quantidade, taxa_media = similares
+            score = (score + taxa_media) / 2
+            fatores.append(f"Baseado em {quantidade} eventos similares no histórico")
 
         score = min(1.0, score)
         categoria = "alto" if score > 0.7 else "medio" if score > 0.5 else "baixo"
@@ -731,9 +922,9 @@ class MVPEngine(LLMProvider):
         if score < 0.6:
             sugestoes.append("Adicionar food trucks (+15% movimento)")
             sugestoes.append("Solicitar reforço de segurança (+10% confiança)")
-        if hora < 18:
+        if antes_das_18:
             sugestoes.append("Considerar horário noturno (18h-22h) para maior engajamento")
-        if quadra not in ["SCS 1", "SCS 2"]:
+        if grupo != "ativa":
             sugestoes.append("Parceria com comércios locais para aumentar visibilidade")
         sugestoes.append("Publicar no Instagram Stories (+20% alcance)")
 
@@ -746,85 +937,337 @@ class MVPEngine(LLMProvider):
         }
 
 
-class OllamaClient(LLMProvider):
-    def __init__(self, base_url: str = None):
-        from app.config import settings
+@lru_cache(maxsize=None)
+def response_schema(prompt: str) -> Dict[str, Any]:
+    return analisadores.get(prompt).resposta.model_json_schema()
+
 
+class OllamaClient(LLMProvider):
+    def __init__(
+        self,
+        base_url: str = None,
+        client: Optional[httpx.AsyncClient] = None,
+        fallback: Optional[LLMProvider] = None,
+        prompts: Optional[PromptCompiler] = None,
+        router: Optional[ModelRouter] = None,
+        metrics: Optional["OllamaMetrics"] = None,
+    ):
         self.base_url = base_url or settings.OLLAMA_BASE_URL
         self.model = settings.OLLAMA_MODEL
+        self.fallback = fallback or MVPEngine()
+        self.prompts = prompts or PromptCompiler()
+        self.router = router or ModelRouter()
+        self.metrics = metrics
+        self.prefixes = PrefixCache() if settings.OLLAMA_PREFIX_CACHE else None
+        self._client = client
+        self._available = False
+        self.json_stats = {
+            "ok": 0,
+            "reparadas": 0,
+            "completadas": 0,
+            "fallback": 0,
+            "paradasAntecipadas": 0,
+            "itensLote": 0,
+            "itensLoteInvalidos": 0,
+        }
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client()
+        return self._client
+
+    def open(self) -> None:
+        if self._client is None or self._client.is_closed:
+            self._client = create_http_client()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     def is_available(self) -> bool:
+        return self._available
+
+    async def probe(self) -> bool:
+        """Consulta o Ollama e atualiza o estado lido por is_available()"""
         try:
-            response = httpx.get(f"{self.base_url}/api/tags", timeout=2.0)
-            return response.status_code == 200
+            response = await self.client.get(
+                f"{self.base_url}/api/tags",
+                timeout=settings.OLLAMA_HEALTH_TIMEOUT,
+            )
+            self._available = response.status_code == 200
         except Exception:
-            return False
+            self._available = False
+        return self._available
 
     async def generate(
         self, prompt: str, context: Dict[str, Any]
     ) -> Dict[str, Any]:
-        prompt_texto = self._build_prompt(prompt, context)
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt_texto,
-                    "stream": False,
-                },
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            resposta_texto = data.get("response", "")
-            return await self._parse_response(prompt, resposta_texto, context)
-
-    def _build_prompt(self, prompt: str, context: Dict[str, Any]) -> str:
-        if prompt == "analisar_evento":
-            evento = context["evento"]
-            return f"""Analise este evento do Setor Comercial Sul (SCS) em Brasília:
+        payload = await self._payload(prompt, context)
+        partes = [token async for token in self._stream_tokens(prompt, payload)]
+        return await self._parse_response(prompt, "".join(partes), context)
+
+    async def generate_batch(
+        self, prompt: str, contexts: List[Dict[str, Any]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Vários contextos numa só chamada que devolve um JSON array; itens
+        ausentes ou fora do schema voltam como None"""
+        chave = f"{prompt}[lote]"
+        compilado = self.prompts.compile_batch(prompt, contexts)
+        payload = await self._montar_payload(
+            chave, prompt, compilado, self._formato(prompt, len(contexts))
+        )
+        partes = [token async for token in self._stream_tokens(chave, payload)]
+        dados = self._decode("".join(partes))
+        if isinstance(dados, dict):
+            dados = dados.get("itens")
+        if not isinstance(dados, list):
+            dados = []
+
+        schema = analisadores.resposta(prompt)
+        itens = []
+        for i in range(len(contexts)):
+            item = dados[i] if i < len(dados) else None
+            if not isinstance(item, dict) or (schema and not _valida(schema, item)):
+                item = None
+            itens.append(item)
+        self.json_stats["itensLote"] += len(itens)
+        self.json_stats["itensLoteInvalidos"] += itens.count(None)
+        return itens
+
+    async def generate_stream(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Repassa ("token", texto) conforme chega e termina com ("resultado", dict)"""
+        partes = []
+        payload = await self._payload(prompt, context)
+        async for token in self._stream_tokens(prompt, payload):
+            partes.append(token)
+            yield "token", token
+
+        resposta_texto = "".join(partes)
+        yield "resultado", await self._parse_response(
+            prompt, resposta_texto, context
+        )
 
-Título: {evento.get('titulo', '')}
-Descrição: {evento.get('descricao', '')}
-Quadra: {evento.get('quadra', '')}
-Data/Hora: {evento.get('dataHora', '')}
-Tipo: {evento.get('tipo', '')}
+    async def generate_raw(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Texto gerado e chunk final ({} se não chegou); sem parse nem fallback"""
+        payload = await self._payload(prompt, context)
+        final: Dict[str, Any] = {}
+        partes = [token async for token in self._stream_tokens(prompt, payload, final)]
+        return "".join(partes), final
+
+    async def _stream_tokens(
+        self,
+        prompt: str,
+        payload: Dict[str, Any],
+        destino_final: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """Tokens do /api/generate; para de repassar assim que o JSON de topo se
+        completa e espera o chunk done (métricas) por até OLLAMA_DONE_GRACE_MS
+        antes de fechar a conexão (e a geração). O chunk done vai para
+        destino_final, quando dado."""
+        scanner = JsonScanner()
+        final, gerados = None, 0
+
+        async with self.client.stream(
+            "POST", f"{self.base_url}/api/generate", json=payload
+        ) as response:
+            if response.is_error and "context" in payload:
+                # context recusado (ex.: modelo recarregado com outro vocabulário)
+                self.prefixes.invalidate(prompt)
+            response.raise_for_status()
+            # aclosing: o iterador de linhas não fica pendente após o break
+            async with aclosing(response.aiter_lines()) as linhas:
+                async for linha in linhas:
+                    if not linha:
+                        continue
+                    chunk = json.loads(linha)
+                    token = chunk.get("response", "")
+                    if token:
+                        gerados += 1
+                        yield token
+                    if chunk.get("done"):
+                        final = chunk
+                        break
+                    if token and scanner.feed(token):
+                        self.json_stats["paradasAntecipadas"] += 1
+                        final = await self._aguardar_final(linhas)
+                        break
+
+        if destino_final is not None and final:
+            destino_final.update(final)
+        if self.metrics is not None:
+            # com prefixo em cache, o context tem os tokens do início do prompt
+            prompt_tokens = estimar_tokens(payload["prompt"])
+            estimados = prompt_tokens + len(payload.get("context") or ()) + gerados
+            self.metrics.record(
+                prompt, current_request().endpoint, final, estimados
+            )
 
-Retorne um JSON com:
-- nivelDestaque: "baixo", "medio" ou "alto"
-- necessidadeApoio: {{"seguranca": true/false, "iluminacao": true/false}}
-- riscoOperacional: "baixo", "medio" ou "alto"
-- sugestaoTexto: texto descritivo do evento
-- recomendacoes: lista de recomendações"""
+    @staticmethod
+    async def _aguardar_final(linhas: AsyncIterator[str]) -> Optional[Dict[str, Any]]:
+        """Descarta o que vier depois do JSON até o chunk done; None se demorar"""
 
-        if prompt == "gerar_texto":
-            contexto = context.get("contexto", {})
-            return f"""Gere um texto para evento:
-Tipo: {contexto.get('tipo', '')}
-Quadra: {contexto.get('quadra', '')}
+        async def ler() -> Optional[Dict[str, Any]]:
+            async for linha in linhas:
+                if linha:
+                    chunk = json.loads(linha)
+                    if chunk.get("done"):
+                        return chunk
+            return None
 
-Retorne JSON com: texto, hashtags, legendaInstagram, mensagemWhatsApp"""
+        try:
+            return await asyncio.wait_for(ler(), settings.OLLAMA_DONE_GRACE_MS / 1000)
+        except asyncio.TimeoutError:
+            return None
+
+    async def warmup(self, model: str = None) -> Dict[str, Any]:
+        """Carrega o modelo na memória do Ollama (prompt vazio) com keep_alive"""
+        response = await self.client.post(
+            f"{self.base_url}/api/generate",
+            json={
+                "model": model or self.model,
+                "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+                "stream": False,
+            },
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def prime(self, prefixo: str, rota: Rota = None) -> List[int]:
+        """Avalia só o prefixo e devolve o context sem o token gerado"""
+        rota = rota or Rota(self.model)
+        response = await self.client.post(
+            f"{self.base_url}/api/generate",
+            json={
+                "model": rota.model,
+                "prompt": prefixo,
+                "raw": True,
+                "stream": False,
+                "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+                "options": {**rota.options, "num_predict": 1},
+            },
+        )
+        response.raise_for_status()
+        data = response.json()
+        tokens = data.get("context") or []
+        gerados = data.get("eval_count", 0)
+        return tokens[: len(tokens) - gerados] if gerados else tokens
+
+    async def _prefix_context(
+        self, prompt: str, compilado: PromptCompilado, rota: Rota
+    ) -> List[int]:
+        tokens = self.prefixes.get(prompt, rota.model, compilado.prefixo)
+        if tokens is not None:
+            return tokens
+        async with self.prefixes.lock(prompt):
+            tokens = self.prefixes.get(prompt, rota.model, compilado.prefixo)
+            if tokens is not None:
+                return tokens
+            try:
+                tokens = await self.prime(compilado.prefixo, rota)
+            except httpx.HTTPError:
+                self.prefixes.falhas += 1
+                return []
+            except ValueError:
+                tokens = []
+            self.prefixes.set(prompt, rota.model, compilado.prefixo, tokens)
+            return tokens
+
+    async def _payload(self, prompt: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        compilado = self.prompts.compile(prompt, context)
+        return await self._montar_payload(
+            prompt, prompt, compilado, self._formato(prompt)
+        )
 
-        return f"Analise: {prompt}"
+    async def _montar_payload(
+        self, chave: str, prompt: str, compilado: PromptCompilado, formato: Any
+    ) -> Dict[str, Any]:
+        """chave identifica o prefixo no cache de context (prompt ou lote)"""
+        rota = self.router.rota(prompt, self.model)
+        payload = {
+            "model": rota.model,
+            "prompt": compilado.texto,
+            "stream": True,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+        }
+        if rota.options:
+            payload["options"] = rota.options
+        if self.prefixes is not None:
+            tokens = await self._prefix_context(chave, compilado, rota)
+            if tokens:
+                # continua do prefixo já avaliado; raw porque o context já
+                # contém o início do prompt e o template não pode ser reaplicado
+                payload.update(prompt=compilado.sufixo, context=tokens, raw=True)
+        if formato is not None:
+            payload["format"] = formato
+        return payload
+
+    def _formato(self, prompt: str, itens: Optional[int] = None) -> Any:
+        """Schema da resposta (ou de um array com `itens` respostas)"""
+        formato = settings.OLLAMA_JSON_FORMAT
+        if formato == "schema" and prompt in analisadores:
+            schema = dict(response_schema(prompt))
+            if itens is None:
+                return schema
+            defs = schema.pop("$defs", None)
+            array = {"type": "array", "items": schema, "minItems": itens}
+            array["maxItems"] = itens
+            if defs:
+                array["$defs"] = defs
+            return array
+        if formato in ("json", "schema"):
+            return "json"
+        return None
 
     async def _parse_response(
         self, prompt: str, resposta: str, context: Dict[str, Any]
     ) -> Dict[str, Any]:
-        import json
-
+        """Valida contra o schema do prompt; se faltar algo, completa com o MVP
+
+        Com sem_fallback na requisição, devolve o que o Ollama gerou ({} se
+        não decodificou), mesmo fora do schema.
+        """
+        dados = self._decode(resposta)
+        if current_request().sem_fallback:
+            return dados if isinstance(dados, dict) else {}
+        schema = analisadores.resposta(prompt)
+        if dados is not None and (schema is None or _valida(schema, dados)):
+            return dados
+
+        mvp = await self.fallback.generate(prompt, context)
+        if isinstance(dados, dict) and schema is not None:
+            campos = {k: v for k, v in dados.items() if k in schema.model_fields}
+            completado = {**mvp, **campos}
+            if campos and _valida(schema, completado):
+                self.json_stats["completadas"] += 1
+                return RespostaDoMVP(completado)
+
+        self.json_stats["fallback"] += 1
+        return RespostaDoMVP(mvp)
+
+    def _decode(self, resposta: str) -> Any:
         try:
-            resposta_limpa = resposta.strip()
-            if resposta_limpa.startswith("```json"):
-                resposta_limpa = resposta_limpa[7:]
-            if resposta_limpa.startswith("```"):
-                resposta_limpa = resposta_limpa[3:]
-            if resposta_limpa.endswith("```"):
-                resposta_limpa = resposta_limpa[:-3]
-            resposta_limpa = resposta_limpa.strip()
-
-            return json.loads(resposta_limpa)
-        except Exception:
-            mvp = MVPEngine()
-            return await mvp.generate(prompt, context)
+            dados = json.loads(strip_fences(resposta))
+            self.json_stats["ok"] += 1
+            return dados
+        except ValueError:
+            pass
+        try:
+            dados = repair_json(resposta)
+            self.json_stats["reparadas"] += 1
+            return dados
+        except ValueError:
+            return None
+
 
+def _valida(schema: Type[BaseModel], dados: Any) -> bool:
+    try:
+        schema.model_validate(dados)
+        return True
+    except ValidationError:
+        return False
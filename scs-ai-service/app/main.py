@@ -1,11 +1,23 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from app import providers
 from app.api import router
+from app.request_state import begin_request, current_request, end_request
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await providers.startup()
+    yield
+    await providers.shutdown()
+
 
 app = FastAPI(
     title="SCS AI Service",
     description="Microserviço de IA para Super App SCS",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -14,8 +26,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # o front (outra origem) só lê headers de resposta listados aqui
+    expose_headers=["X-SCS-Degradado", "X-SCS-Refinamento"],
 )
 
+
+@app.middleware("http")
+async def request_state(request: Request, call_next):
+    token = begin_request(request.url.path)
+    estado = current_request()
+    try:
+        response = await call_next(request)
+    finally:
+        end_request(token)
+    if estado.degradado:
+        response.headers["X-SCS-Degradado"] = estado.degradado
+    if estado.refinamento:
+        response.headers["X-SCS-Refinamento"] = estado.refinamento
+    return response
+
+
 app.include_router(router, prefix="/api/v1")
 
 
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, field_validator
 from datetime import datetime
 from typing import Optional, List, Dict, Any, Union
+from app.timestamps import parse_datetime
 
 
 class EventoRequest(BaseModel):
@@ -79,6 +80,10 @@ class PriorizacaoAcessibilidade(BaseModel):
     recomendacao: str
 
 
+class PriorizacoesAcessibilidade(BaseModel):
+    priorizacao: List[PriorizacaoAcessibilidade]
+
+
 class GestaoRequest(BaseModel):
     eventos: List[Dict[str, Any]]
     alertas: List[Dict[str, Any]]
@@ -94,6 +99,10 @@ class RecomendacaoGestao(BaseModel):
     acoes: Optional[List[str]] = None
 
 
+class RecomendacoesGestao(BaseModel):
+    recomendacoes: List[RecomendacaoGestao]
+
+
 class GerarTextoRequest(BaseModel):
     tipo: str
     contexto: Dict[str, Any]
@@ -121,6 +130,7 @@ class ModelInfo(BaseModel):
     name: str
     provider: str
     available: bool
+    detalhes: Optional[Dict[str, Any]] = None
 
 
 # ===== NOVOS MODELOS PARA INOVAÇÃO =====
@@ -132,29 +142,14 @@ class AgoraNoSCSRequest(BaseModel):
     @field_validator('timestamp', mode='before')
     @classmethod
     def parse_timestamp(cls, v):
-        if v is None:
-            return None
-        if isinstance(v, datetime):
-            return v
         if isinstance(v, str):
-            v_clean = v.strip()
-            if not v_clean:
+            v = v.strip()
+            if not v:
                 return None
-            try:
-                if v_clean.endswith('Z'):
-                    v_clean = v_clean[:-1] + '+00:00'
-                elif '+' not in v_clean and 'T' in v_clean:
-                    v_clean = v_clean + '+00:00'
-                return datetime.fromisoformat(v_clean)
-            except (ValueError, AttributeError):
-                try:
-                    v_clean = v_clean.replace(' ', 'T')
-                    if '+' not in v_clean and 'T' in v_clean:
-                        v_clean = v_clean + '+00:00'
-                    return datetime.fromisoformat(v_clean)
-                except (ValueError, AttributeError):
-                    pass
-        return v
+        try:
+            return parse_datetime(v, v)
+        except ValueError:
+            return v
 
 
 class AgoraNoSCS(BaseModel):
@@ -0,0 +1,71 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+from app.llm import OllamaClient
+from app.config import settings
+
+
+class HealthMonitor:
+    """Sonda o Ollama em background; as requisições só leem o estado em cache"""
+
+    def __init__(
+        self,
+        client: OllamaClient,
+        interval: float = None,
+        max_backoff: float = None,
+        jitter: float = None,
+    ):
+        self.client = client
+        self.interval = interval or settings.OLLAMA_HEALTH_INTERVAL
+        self.max_backoff = max_backoff or settings.OLLAMA_HEALTH_MAX_BACKOFF
+        self.jitter = settings.OLLAMA_HEALTH_JITTER if jitter is None else jitter
+        self.falhas_consecutivas = 0
+        self.erros = 0
+        self.ultima_verificacao: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def check(self) -> bool:
+        disponivel = await self.client.probe()
+        self.ultima_verificacao = time.time()
+        self.falhas_consecutivas = 0 if disponivel else self.falhas_consecutivas + 1
+        return disponivel
+
+    def next_delay(self) -> float:
+        # expoente limitado: 2 ** 1024 já não cabe num float
+        expoente = min(self.falhas_consecutivas, 32)
+        atraso = min(self.interval * 2**expoente, self.max_backoff)
+        return atraso * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "disponivel": self.client.is_available(),
+            "falhasConsecutivas": self.falhas_consecutivas,
+            "erros": self.erros,
+            "ultimaVerificacao": self.ultima_verificacao,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+                atraso = self.next_delay()
+            except Exception:
+                # a sonda não pode morrer: sem ela o Ollama nunca volta
+                self.erros += 1
+                atraso = self.max_backoff
+            await asyncio.sleep(atraso)
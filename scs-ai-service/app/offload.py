@@ -0,0 +1,125 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+from app.config import settings
+from app.registry import OFFLOADABLE, analisadores
+from app.request_state import begin_request, end_request
+from app.timestamps import agora
+
+MODOS = ("thread", "process", "off")
+_engine = None
+
+
+def tamanho_entrada(
+    context: Dict[str, Any], campos: Optional[Iterable[str]] = None
+) -> int:
+    """Itens nas listas do contexto (até um nível de aninhamento)
+
+    Com `campos`, conta só esses (as entradas declaradas da análise).
+    """
+    total = 0
+    valores = context.values() if campos is None else map(context.get, campos)
+    for valor in valores:
+        if isinstance(valor, list):
+            total += len(valor)
+        elif isinstance(valor, dict):
+            total += sum(len(v) for v in valor.values() if isinstance(v, list))
+    return total
+
+
+def _executar_mvp(
+    prompt: str, context: Dict[str, Any], instante: datetime
+) -> Dict[str, Any]:
+    """Roda no worker; em processo, cada worker mantém seu próprio MVPEngine
+
+    O worker não herda o contexto da requisição, então o "agora" vai junto.
+    """
+    global _engine
+    if _engine is None:
+        from app.llm import MVPEngine
+
+        _engine = MVPEngine()
+    token = begin_request(agora=instante)
+    try:
+        return _engine.run(prompt, context)
+    finally:
+        end_request(token)
+
+
+class MVPOffloader:
+    """Tira do event loop as análises do MVP com entrada grande"""
+
+    def __init__(
+        self, mode: str = None, max_workers: int = None, threshold: int = None
+    ):
+        self.mode = mode or settings.MVP_OFFLOAD
+        if self.mode not in MODOS:
+            raise ValueError(f"MVP_OFFLOAD inválido: {self.mode}")
+        self.max_workers = max_workers or settings.MVP_OFFLOAD_WORKERS
+        self.threshold = threshold or settings.MVP_OFFLOAD_THRESHOLD
+        self._executor: Optional[Executor] = None
+        self.em_andamento = 0
+        self.pico = 0
+        self.delegadas = 0
+        self.inline = 0
+        self._tempo_total = 0.0
+
+    def grande(self, prompt: str, context: Dict[str, Any]) -> bool:
+        """Só análises registradas como offloadable; as demais são baratas"""
+        if self.mode == "off" or analisadores.custo(prompt) != OFFLOADABLE:
+            return False
+        entradas = analisadores.get(prompt).entradas
+        return tamanho_entrada(context, entradas) >= self.threshold
+
+    def should_offload(self, prompt: str, context: Dict[str, Any]) -> bool:
+        if self.grande(prompt, context):
+            return True
+        self.inline += 1
+        return False
+
+    async def run(self, prompt: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        self.delegadas += 1
+        self.em_andamento += 1
+        self.pico = max(self.pico, self.em_andamento)
+        inicio = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, _executar_mvp, prompt, context, agora()
+            )
+        finally:
+            self.em_andamento -= 1
+            self._tempo_total += time.monotonic() - inicio
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="mvp"
+                )
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "modo": self.mode,
+            "workers": self.max_workers,
+            "limiar": self.threshold,
+            "emAndamento": self.em_andamento,
+            "aguardando": max(0, self.em_andamento - self.max_workers),
+            "saturacao": round(self.em_andamento / self.max_workers, 2),
+            "pico": self.pico,
+            "delegadas": self.delegadas,
+            "inline": self.inline,
+            "tempoMedioMs": round(self._tempo_total * 1000 / self.delegadas, 1)
+            if self.delegadas
+            else 0.0,
+        }
@@ -0,0 +1,111 @@
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+from app.llm import LLMProvider, OllamaClient, ProviderIndisponivelError
+from app.config import settings
+
+
+class Backend:
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.em_andamento = 0
+        self.latencia_ewma = 0.0
+        self.requisicoes = 0
+        self.falhas = 0
+        self.falhas_consecutivas = 0
+        self.fora_ate = 0.0
+
+    @property
+    def disponivel(self) -> bool:
+        return self.client.is_available() and time.monotonic() >= self.fora_ate
+
+    def registrar(self, sucesso: bool, duracao: float) -> None:
+        self.requisicoes += 1
+        if sucesso:
+            self.falhas_consecutivas = 0
+            peso = settings.OLLAMA_POOL_EWMA_ALPHA
+            self.latencia_ewma = (
+                duracao
+                if self.latencia_ewma == 0
+                else peso * duracao + (1 - peso) * self.latencia_ewma
+            )
+            return
+        self.falhas += 1
+        self.falhas_consecutivas += 1
+        if self.falhas_consecutivas >= settings.OLLAMA_POOL_MAX_FAILURES:
+            self.fora_ate = time.monotonic() + settings.OLLAMA_POOL_EJECT_SECONDS
+            self.falhas_consecutivas = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.client.base_url,
+            "disponivel": self.disponivel,
+            "emAndamento": self.em_andamento,
+            "latenciaMs": round(self.latencia_ewma * 1000, 1),
+            "requisicoes": self.requisicoes,
+            "falhas": self.falhas,
+            "foraDeRotacao": time.monotonic() < self.fora_ate,
+        }
+
+
+class OllamaPool(LLMProvider):
+    """Distribui as gerações entre vários Ollama: menos requisições em
+    andamento primeiro, latência recente como desempate"""
+
+    def __init__(self, clients: List[OllamaClient]):
+        self.backends = [Backend(client) for client in clients]
+
+    def is_available(self) -> bool:
+        return any(backend.disponivel for backend in self.backends)
+
+    def choose(self) -> Backend:
+        disponiveis = [b for b in self.backends if b.disponivel]
+        if not disponiveis:
+            raise ProviderIndisponivelError("Nenhum backend Ollama disponível")
+        return min(disponiveis, key=lambda b: (b.em_andamento, b.latencia_ewma))
+
+    async def generate(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return await self._rotear(lambda client: client.generate(prompt, context))
+
+    async def generate_batch(
+        self, prompt: str, contexts: List[Dict[str, Any]]
+    ) -> List[Any]:
+        return await self._rotear(
+            lambda client: client.generate_batch(prompt, contexts)
+        )
+
+    async def _rotear(
+        self, chamar: Callable[[OllamaClient], Awaitable[Any]]
+    ) -> Any:
+        backend = self.choose()
+        backend.em_andamento += 1
+        inicio = time.monotonic()
+        try:
+            resultado = await chamar(backend.client)
+        except Exception:
+            backend.registrar(False, time.monotonic() - inicio)
+            raise
+        finally:
+            backend.em_andamento -= 1
+        backend.registrar(True, time.monotonic() - inicio)
+        return resultado
+
+    async def generate_stream(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        backend = self.choose()
+        backend.em_andamento += 1
+        inicio = time.monotonic()
+        try:
+            async for evento in backend.client.generate_stream(prompt, context):
+                yield evento
+        except Exception:
+            backend.registrar(False, time.monotonic() - inicio)
+            raise
+        finally:
+            backend.em_andamento -= 1
+        backend.registrar(True, time.monotonic() - inicio)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backends": [backend.stats() for backend in self.backends]}
@@ -0,0 +1,60 @@
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PrefixCache:
+    """`context` devolvido pelo Ollama para o prefixo fixo de cada tipo de
+    prompt. A chave inclui modelo e hash do prefixo: trocar um ou outro
+    descarta a entrada anterior"""
+
+    def __init__(self):
+        self._entradas: Dict[str, Tuple[str, List[int]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.primings = 0
+        self.reutilizados = 0
+        self.invalidados = 0
+        self.falhas = 0
+
+    @staticmethod
+    def chave(model: str, prefixo: str) -> str:
+        return hashlib.sha256(f"{model}\0{prefixo}".encode("utf-8")).hexdigest()
+
+    def lock(self, prompt: str) -> asyncio.Lock:
+        return self._locks.setdefault(prompt, asyncio.Lock())
+
+    def get(self, prompt: str, model: str, prefixo: str) -> Optional[List[int]]:
+        """None = precisa preparar; lista vazia = Ollama não devolveu context"""
+        entrada = self._entradas.get(prompt)
+        if entrada is None:
+            return None
+        if entrada[0] != self.chave(model, prefixo):
+            self.invalidate(prompt)
+            return None
+        if entrada[1]:
+            self.reutilizados += 1
+        return entrada[1]
+
+    def set(self, prompt: str, model: str, prefixo: str, tokens: List[int]) -> None:
+        self.primings += 1
+        self._entradas[prompt] = (self.chave(model, prefixo), tokens)
+
+    def invalidate(self, prompt: Optional[str] = None) -> None:
+        if prompt is None:
+            removidos = list(self._entradas)
+        else:
+            removidos = [prompt] if prompt in self._entradas else []
+        for nome in removidos:
+            del self._entradas[nome]
+        self.invalidados += len(removidos)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prefixos": {
+                prompt: len(tokens) for prompt, (_, tokens) in self._entradas.items()
+            },
+            "primings": self.primings,
+            "reutilizados": self.reutilizados,
+            "invalidados": self.invalidados,
+            "falhas": self.falhas,
+        }
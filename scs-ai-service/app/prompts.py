@@ -0,0 +1,449 @@
+import json
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+from app.config import settings
+from app.timestamps import parse_datetime
+
+# Níveis de detalhe tentados em ordem até o prompt caber no orçamento
+NIVEIS_TOP = (10, 5, 3, 1)
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    instrucoes: str
+    dados: Callable[[Dict[str, Any], int], Dict[str, Any]]
+
+
+@dataclass
+class PromptCompilado:
+    prefixo: str
+    sufixo: str
+    tokens: int
+    compactado: bool = False
+    truncado: bool = False
+
+    @property
+    def texto(self) -> str:
+        return self.prefixo + self.sufixo
+
+
+def estimar_tokens(texto: str) -> int:
+    return math.ceil(len(texto) / settings.PROMPT_CHARS_PER_TOKEN)
+
+
+def _hora(valor: Any) -> Optional[int]:
+    try:
+        data_hora = parse_datetime(valor, valor)
+    except ValueError:
+        return None
+    return getattr(data_hora, "hour", None)
+
+
+def _contagem(itens: List[Dict[str, Any]], campo: str, top: int) -> Dict[str, int]:
+    contagem = Counter(str(item.get(campo, "")) for item in itens)
+    return dict(contagem.most_common(top))
+
+
+def _por_hora(itens: List[Dict[str, Any]]) -> Dict[str, int]:
+    contagem = Counter(_hora(item.get("dataHora")) for item in itens)
+    contagem.pop(None, None)
+    return {f"{h:02d}h": n for h, n in sorted(contagem.items())}
+
+
+def resumir_alertas(alertas: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    return {
+        "total": len(alertas),
+        "porQuadra": _contagem(alertas, "quadra", top),
+        "porTipo": _contagem(alertas, "tipo", top),
+        "porHora": _por_hora(alertas),
+    }
+
+
+def resumir_eventos(eventos: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    return {
+        "total": len(eventos),
+        "porQuadra": _contagem(eventos, "quadra", top),
+        "porTipo": _contagem(eventos, "tipo", top),
+        "exemplos": [e.get("titulo", "") for e in eventos[:top] if e.get("titulo")],
+    }
+
+
+def _campos(origem: Dict[str, Any], *nomes: str) -> Dict[str, Any]:
+    return {nome: origem[nome] for nome in nomes if origem.get(nome) is not None}
+
+
+def _historico_quadra(ctx: Dict[str, Any], top: int) -> Dict[str, Any]:
+    prefixo = f"{ctx.get('quadra', '')}_"
+    itens = [
+        (chave, valor)
+        for chave, valor in ctx.get("historico", {}).items()
+        if chave.startswith(prefixo)
+    ]
+    return dict(itens[: top * 3])
+
+
+def _eventos_similares(ctx: Dict[str, Any], top: int) -> Dict[str, Any]:
+    similares = ctx.get("historico", {}).get("eventos_similares", [])
+    return {
+        "total": len(similares),
+        "taxasSucesso": [e.get("taxaSucesso") for e in similares[: top * 2]],
+    }
+
+
+def _formatar(valor: Any) -> str:
+    if isinstance(valor, str):
+        return valor
+    return json.dumps(valor, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _instrucoes(tarefa: str, campos: str) -> str:
+    return f"{tarefa}\n\nRetorne somente um JSON com:\n{campos}\n\nDados:\n"
+
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    "analisar_evento": PromptTemplate(
+        _instrucoes(
+            "Analise este evento do Setor Comercial Sul (SCS) em Brasília.",
+            '- nivelDestaque: "baixo", "medio" ou "alto"\n'
+            '- necessidadeApoio: {"seguranca": true/false, "iluminacao": true/false}\n'
+            '- riscoOperacional: "baixo", "medio" ou "alto"\n'
+            "- sugestaoTexto: texto descritivo do evento\n"
+            "- recomendacoes: lista de recomendações",
+        ),
+        lambda ctx, top: {
+            "Título": ctx["evento"].get("titulo", ""),
+            "Descrição": ctx["evento"].get("descricao", ""),
+            "Quadra": ctx["evento"].get("quadra", ""),
+            "Data/Hora": ctx["evento"].get("dataHora", ""),
+            "Tipo": ctx["evento"].get("tipo", ""),
+        },
+    ),
+    "analisar_seguranca": PromptTemplate(
+        _instrucoes(
+            "Analise os padrões de segurança do Setor Comercial Sul (SCS) em "
+            "Brasília a partir dos alertas e eventos resumidos.",
+            '- risco: "baixo", "medio" ou "alto"\n'
+            "- correlacaoEventos: lista de correlações entre alertas e eventos\n"
+            "- recomendacao: recomendação principal\n"
+            "- mapaPreditivo: objeto opcional com risco por quadra",
+        ),
+        lambda ctx, top: {
+            "Alertas": resumir_alertas(ctx.get("alertas", []), top),
+            "Eventos": resumir_eventos(ctx.get("eventos", []), top),
+        },
+    ),
+    "prever_risco": PromptTemplate(
+        _instrucoes(
+            "Preveja o risco de segurança para uma quadra do Setor Comercial Sul "
+            "(SCS) em Brasília.",
+            '- risco: "baixo", "medio" ou "alto"\n'
+            "- fatores: lista de fatores de risco\n"
+            "- recomendacoes: lista de recomendações\n"
+            "- probabilidade: número entre 0 e 1",
+        ),
+        lambda ctx, top: {
+            "Quadra": ctx.get("quadra", ""),
+            "Data/Hora": ctx.get("dataHora", ""),
+            "Eventos ativos": {
+                **resumir_eventos(ctx.get("eventosAtivos", []), top),
+                "destaqueAlto": sum(
+                    1
+                    for e in ctx.get("eventosAtivos", [])
+                    if e.get("nivelDestaque") == "alto"
+                ),
+            },
+        },
+    ),
+    "analisar_protecao_mulher": PromptTemplate(
+        _instrucoes(
+            "Analise os alertas de violência contra a mulher no Setor Comercial "
+            "Sul (SCS) em Brasília.",
+            '- risco: "baixo", "medio" ou "alto"\n'
+            '- horariosCriticos: lista de faixas "HH:00-HH:00"\n'
+            "- quadrasProblematicas: lista de quadras\n"
+            "- recomendacoes: lista de recomendações\n"
+            "- correlacaoBares: true/false",
+        ),
+        lambda ctx, top: {
+            "Alertas": resumir_alertas(ctx.get("alertas", []), top),
+            "Eventos": resumir_eventos(ctx.get("eventos", []), top),
+            "Bares": {
+                "total": len(ctx.get("bares", [])),
+                "porQuadra": _contagem(ctx.get("bares", []), "quadra", top),
+            },
+        },
+    ),
+    "priorizar_acessibilidade": PromptTemplate(
+        _instrucoes(
+            "Priorize as necessidades de acessibilidade do Setor Comercial Sul "
+            "(SCS) em Brasília.",
+            '- priorizacao: lista de {"necessidadeId": id da necessidade, '
+            '"score": 0-100, "impacto": "baixo"/"medio"/"alto", '
+            '"custoEstimado": "baixo"/"medio"/"alto", "recomendacao": texto}',
+        ),
+        lambda ctx, top: {
+            "Necessidades": [
+                {
+                    "id": str(i + 1),
+                    **_campos(n, "tipo", "quadra", "prioridade", "frequencia"),
+                }
+                for i, n in enumerate(ctx.get("necessidades", [])[: top * 5])
+            ],
+            "Total": len(ctx.get("necessidades", [])),
+        },
+    ),
+    "recomendacoes_gestao": PromptTemplate(
+        _instrucoes(
+            "Gere recomendações de gestão urbana para o Setor Comercial Sul "
+            "(SCS) em Brasília.",
+            '- recomendacoes: lista de {"tipo": texto, "quadra": texto, '
+            '"descricao": texto, "prioridade": "baixa"/"media"/"alta", '
+            '"acoes": lista de textos}',
+        ),
+        lambda ctx, top: {
+            "Eventos": resumir_eventos(ctx.get("eventos", []), top),
+            "Alertas": resumir_alertas(ctx.get("alertas", []), top),
+            "Ocupação": [
+                _campos(o, "quadra", "vazios", "ocupados")
+                for o in ctx.get("ocupacao", [])[: top * 2]
+            ],
+            "Engajamento QR Code": ctx.get("engajamentoQRCode", {}),
+        },
+    ),
+    "gerar_texto": PromptTemplate(
+        _instrucoes(
+            "Gere um texto de divulgação para o Setor Comercial Sul (SCS) em "
+            "Brasília.",
+            "- texto\n- hashtags: lista\n- legendaInstagram\n- mensagemWhatsApp",
+        ),
+        lambda ctx, top: {
+            "Tipo de texto": ctx.get("tipo", ""),
+            **{
+                chave.title(): valor
+                for chave, valor in ctx.get("contexto", {}).items()
+            },
+        },
+    ),
+    "otimizar_comunicacao": PromptTemplate(
+        _instrucoes(
+            "Sugira o melhor canal, horário e formato para divulgar este evento "
+            "do Setor Comercial Sul (SCS) em Brasília.",
+            '- canalSugerido: "instagram", "whatsapp" ou "telegram"\n'
+            '- horarioPublicacao: faixa "HH:MM-HH:MM"\n'
+            "- formato: texto\n"
+            "- conteudo: objeto com titulo, descricao e hashtags",
+        ),
+        lambda ctx, top: _campos(
+            ctx.get("evento", {}),
+            "titulo",
+            "descricao",
+            "quadra",
+            "dataHora",
+            "tipo",
+            "nivelDestaque",
+        ),
+    ),
+    "agora_no_scs": PromptTemplate(
+        _instrucoes(
+            "Descreva o que está acontecendo agora no Setor Comercial Sul (SCS) "
+            "em Brasília.",
+            '- status: "vivo", "moderado" ou "vazio"\n'
+            "- eventosAtivos: número\n- comerciosAbertos: número\n"
+            '- movimento: "baixo", "medio" ou "alto"\n'
+            '- seguranca: "presente", "ausente" ou "reforcado"\n'
+            '- iluminacao: "adequada", "insuficiente" ou "reforcada"\n'
+            "- recomendacao: texto\n- scoreVidaUrbana: número entre 0 e 1\n"
+            "- pessoasEstimadas: número",
+        ),
+        lambda ctx, top: {
+            "Quadra": ctx.get("quadra") or "SCS",
+            "Momento": ctx.get("timestamp") or "agora",
+            "Eventos ativos": resumir_eventos(ctx.get("eventosAtivos", []), top),
+            "Comércios abertos": len(ctx.get("comerciosAbertos", [])),
+            "Alertas recentes": resumir_alertas(
+                ctx.get("alertasRecentes", []), top
+            ),
+            "Check-ins": len(ctx.get("checkIns", [])),
+        },
+    ),
+    "prever_movimento": PromptTemplate(
+        _instrucoes(
+            "Preveja o movimento de pessoas em uma quadra do Setor Comercial Sul "
+            "(SCS) em Brasília.",
+            "- movimentoPrevisto: número entre 0 e 1\n"
+            '- categoria: "baixo", "medio" ou "alto"\n'
+            "- confianca: número entre 0 e 1\n"
+            "- fatores: lista de fatores\n- recomendacao: texto",
+        ),
+        lambda ctx, top: {
+            "Quadra": ctx.get("quadra", ""),
+            "Data/Hora": ctx.get("dataHora", ""),
+            "Eventos agendados": {
+                "total": len(ctx.get("eventosAgendados", [])),
+                "porImpacto": _contagem(
+                    ctx.get("eventosAgendados", []), "impactoEsperado", top
+                ),
+            },
+            "Histórico da quadra": _historico_quadra(ctx, top),
+        },
+    ),
+    "orquestrar_agentes": PromptTemplate(
+        _instrucoes(
+            "Combine as visões dos agentes de eventos, segurança e comércio para "
+            "sugerir uma ação no Setor Comercial Sul (SCS) em Brasília.",
+            "- acaoSugerida: texto\n- razao: texto\n"
+            "- probabilidadeSucesso: número entre 0 e 1\n"
+            "- acoesRecomendadas: lista de textos\n"
+            "- agentes: objeto com a análise de cada agente",
+        ),
+        lambda ctx, top: {
+            "Quadra": ctx.get("quadra", ""),
+            **_campos(
+                ctx.get("contexto", {}), "horario", "diaSemana", "comerciosAbertos"
+            ),
+            "Alertas": resumir_alertas(ctx.get("contexto", {}).get("alertas", []), top),
+            "Eventos": resumir_eventos(ctx.get("contexto", {}).get("eventos", []), top),
+        },
+    ),
+    "prever_sucesso_evento": PromptTemplate(
+        _instrucoes(
+            "Preveja o sucesso deste evento do Setor Comercial Sul (SCS) em "
+            "Brasília antes de ele acontecer.",
+            "- probabilidadeSucesso: número entre 0 e 1\n"
+            '- categoria: "baixo", "medio" ou "alto"\n'
+            "- fatores: lista de fatores\n"
+            "- sugestoesOtimizacao: lista de sugestões\n"
+            "- score: número entre 0 e 1",
+        ),
+        lambda ctx, top: {
+            **_campos(
+                ctx.get("evento", {}),
+                "titulo",
+                "descricao",
+                "quadra",
+                "dataHora",
+                "tipo",
+            ),
+            "Eventos similares": _eventos_similares(ctx, top),
+        },
+    ),
+}
+
+INSTRUCOES_LOTE = (
+    "Os dados trazem vários itens numerados. Responda cada item separadamente "
+    "e retorne somente um JSON array com um objeto por item, na mesma ordem; "
+    "cada objeto segue o formato abaixo.\n\n"
+)
+
+
+class PromptCompiler:
+    """Monta o prompt de cada tipo dentro do orçamento de tokens configurado"""
+
+    def __init__(self, budgets: Dict[str, int] = None, default_budget: int = None):
+        self.budgets = settings.PROMPT_TOKEN_BUDGETS if budgets is None else budgets
+        self.default_budget = default_budget or settings.PROMPT_TOKEN_BUDGET
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def budget(self, prompt: str) -> int:
+        return self.budgets.get(prompt, self.default_budget)
+
+    def compile(self, prompt: str, context: Dict[str, Any]) -> PromptCompilado:
+        compilado = self._compilar(prompt, context)
+        self._registrar(prompt, compilado)
+        return compilado
+
+    def compile_batch(
+        self, prompt: str, contexts: List[Dict[str, Any]]
+    ) -> PromptCompilado:
+        """Vários contextos do mesmo tipo num prompt que pede um JSON array;
+        o prefixo não depende da quantidade de itens"""
+        itens = [self._compilar(prompt, context) for context in contexts]
+        prefixo = INSTRUCOES_LOTE + itens[0].prefixo
+        sufixo = "\n\n".join(
+            f"Item {i}:\n{item.sufixo}" for i, item in enumerate(itens, 1)
+        )
+        compilado = PromptCompilado(
+            prefixo,
+            sufixo,
+            estimar_tokens(prefixo + sufixo),
+            compactado=any(item.compactado for item in itens),
+            truncado=any(item.truncado for item in itens),
+        )
+        self._registrar(f"{prompt}[lote]", compilado)
+        return compilado
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            prompt: {
+                "chamadas": s["chamadas"],
+                "tokensMedio": round(s["tokens"] / s["chamadas"]),
+                "tokensMax": s["tokensMax"],
+                "compactados": s["compactados"],
+                "truncados": s["truncados"],
+                "orcamento": self.budget(prompt),
+            }
+            for prompt, s in self._stats.items()
+        }
+
+    def _compilar(self, prompt: str, context: Dict[str, Any]) -> PromptCompilado:
+        template = TEMPLATES.get(prompt)
+        if template is None:
+            return self._generico(prompt, context)
+        return self._compactar(template, prompt, context)
+
+    def _compactar(
+        self, template: PromptTemplate, prompt: str, context: Dict[str, Any]
+    ) -> PromptCompilado:
+        orcamento = self.budget(prompt)
+        sufixo = ""
+        for nivel, top in enumerate(NIVEIS_TOP):
+            sufixo = _renderizar(template.dados(context, top))
+            tokens = estimar_tokens(template.instrucoes + sufixo)
+            if tokens <= orcamento:
+                return PromptCompilado(
+                    template.instrucoes, sufixo, tokens, compactado=nivel > 0
+                )
+        return self._truncar(template.instrucoes, sufixo, orcamento)
+
+    def _generico(self, prompt: str, context: Dict[str, Any]) -> PromptCompilado:
+        instrucoes = _instrucoes(f"Analise ({prompt}).", "- os campos pertinentes")
+        sufixo = _formatar(context)
+        tokens = estimar_tokens(instrucoes + sufixo)
+        if tokens <= self.budget(prompt):
+            return PromptCompilado(instrucoes, sufixo, tokens)
+        return self._truncar(instrucoes, sufixo, self.budget(prompt))
+
+    def _truncar(
+        self, instrucoes: str, sufixo: str, orcamento: int
+    ) -> PromptCompilado:
+        caracteres = int(orcamento * settings.PROMPT_CHARS_PER_TOKEN)
+        sufixo = sufixo[: max(0, caracteres - len(instrucoes))] + "…"
+        tokens = estimar_tokens(instrucoes + sufixo)
+        return PromptCompilado(
+            instrucoes, sufixo, tokens, compactado=True, truncado=True
+        )
+
+    def _registrar(self, prompt: str, compilado: PromptCompilado) -> None:
+        s = self._stats.setdefault(
+            prompt,
+            {
+                "chamadas": 0,
+                "tokens": 0,
+                "tokensMax": 0,
+                "compactados": 0,
+                "truncados": 0,
+            },
+        )
+        s["chamadas"] += 1
+        s["tokens"] += compilado.tokens
+        s["tokensMax"] = max(s["tokensMax"], compilado.tokens)
+        s["compactados"] += compilado.compactado
+        s["truncados"] += compilado.truncado
+
+
+def _renderizar(dados: Dict[str, Any]) -> str:
+    return "\n".join(
+        f"{chave}: {_formatar(valor)}" for chave, valor in dados.items()
+    )
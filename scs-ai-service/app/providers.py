@@ -0,0 +1,167 @@
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+from app.llm import LLMProvider, MVPEngine, OllamaClient
+from app.adaptive import AdaptiveLimit
+from app.batching import BatchingProvider
+from app.breaker import BreakerProvider, CircuitBreaker
+from app.cache import CachedProvider, ResponseCache
+from app.coalescing import CoalescingProvider
+from app.monitor import HealthMonitor
+from app.offload import MVPOffloader
+from app.pool import OllamaPool
+from app.prompts import PromptCompiler
+from app.refinement import RefinementJobs
+from app.registry import CHEAP, analisadores
+from app.scheduler import PriorityScheduler, ScheduledProvider
+from app.shadow import ShadowEvaluator
+from app.telemetry import OllamaMetrics, TokenBudgetProvider
+from app.warmup import ModelWarmer
+from app.config import settings
+
+response_cache: Optional[ResponseCache] = (
+    ResponseCache(sqlite_path=settings.LLM_CACHE_SQLITE_PATH)
+    if settings.LLM_CACHE_ENABLED
+    else None
+)
+
+
+def _com_cache(
+    provider: LLMProvider,
+    namespace: str,
+    diretos: FrozenSet[str] = frozenset(),
+    pular: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+) -> LLMProvider:
+    if response_cache is None:
+        return provider
+    return CachedProvider(provider, response_cache, namespace, diretos, pular)
+
+
+mvp_offload = MVPOffloader()
+mvp_engine = MVPEngine(offload=mvp_offload)
+# Prompts servidos pela tabela de features custam menos que a chave do cache
+# e do coalescing (JSON + sha256 + cópias): vão direto ao engine
+mvp_diretos = (
+    analisadores.prompts(CHEAP) if mvp_engine.memo.enabled else frozenset()
+)
+# Entradas que vão ao pool do offload também pulam as duas camadas: a chave
+# (JSON + sha256 do contexto inteiro) travaria o event loop mais que a análise
+mvp_coalescing = CoalescingProvider(mvp_engine, mvp_diretos, mvp_offload.grande)
+# Análises que comparam com o "agora" (eventos futuros) não entram no cache
+mvp_provider: LLMProvider = _com_cache(
+    mvp_coalescing,
+    "mvp",
+    mvp_diretos | analisadores.com_relogio(),
+    mvp_offload.grande,
+)
+
+# Pilha do Ollama:
+# cache -> coalescing -> batching -> orçamento -> scheduler -> breaker -> pool
+prompt_compiler = PromptCompiler()
+ollama_metrics = OllamaMetrics()
+ollama_scheduler = PriorityScheduler(
+    max_concurrency=settings.OLLAMA_MAX_PARALLEL * len(settings.ollama_base_urls),
+    adaptive=AdaptiveLimit(
+        max_limit=settings.OLLAMA_ADAPTIVE_MAX_LIMIT * len(settings.ollama_base_urls)
+    )
+    if settings.OLLAMA_ADAPTIVE_CONCURRENCY
+    else None,
+)
+ollama_breaker = CircuitBreaker()
+ollama_clients: List[OllamaClient] = []
+ollama_monitors: List[HealthMonitor] = []
+ollama_warmers: List[ModelWarmer] = []
+ollama_pool: Optional[OllamaPool] = None
+ollama_guarded: Optional[LLMProvider] = None
+ollama_batching: Optional[BatchingProvider] = None
+ollama_coalescing: Optional[CoalescingProvider] = None
+ollama_provider: Optional[LLMProvider] = None
+ollama_shadow: Optional[ShadowEvaluator] = None
+
+if settings.USE_OLLAMA:
+    ollama_clients = [
+        OllamaClient(
+            base_url=url,
+            fallback=mvp_provider,
+            prompts=prompt_compiler,
+            metrics=ollama_metrics,
+        )
+        for url in settings.ollama_base_urls
+    ]
+    ollama_monitors = [HealthMonitor(client) for client in ollama_clients]
+    if settings.OLLAMA_WARMUP:
+        ollama_warmers = [ModelWarmer(client) for client in ollama_clients]
+    ollama_pool = OllamaPool(ollama_clients)
+    # breaker abaixo do scheduler: espera na fila não conta como chamada lenta
+    ollama_guarded = TokenBudgetProvider(
+        ScheduledProvider(
+            BreakerProvider(ollama_pool, ollama_breaker), ollama_scheduler
+        ),
+        ollama_metrics,
+    )
+    ollama_batching = BatchingProvider(ollama_guarded)
+    ollama_coalescing = CoalescingProvider(ollama_batching)
+    ollama_provider = _com_cache(ollama_coalescing, "ollama")
+    # sem cache/coalescing: cada amostra é uma geração nova no Ollama
+    ollama_shadow = ShadowEvaluator(ollama_guarded, ocioso=ollama_scheduler.ocioso)
+
+refinement_jobs = RefinementJobs()
+
+
+async def startup() -> None:
+    for client in ollama_clients:
+        client.open()
+    for tarefa in [*ollama_monitors, *ollama_warmers]:
+        tarefa.start()
+    if ollama_shadow:
+        ollama_shadow.start()
+
+
+async def shutdown() -> None:
+    await refinement_jobs.close()
+    if ollama_shadow:
+        await ollama_shadow.stop()
+    for tarefa in [*ollama_warmers, *ollama_monitors]:
+        await tarefa.stop()
+    for client in ollama_clients:
+        await client.aclose()
+    if response_cache:
+        response_cache.close()
+    mvp_offload.close()
+
+
+def is_ready() -> bool:
+    """Pronto quando não há warm-up configurado ou algum backend já aqueceu"""
+    return not ollama_warmers or any(w.pronto for w in ollama_warmers)
+
+
+def warmup_stats() -> Optional[Dict[str, Any]]:
+    if not ollama_warmers:
+        return None
+    return {w.client.base_url: w.stats() for w in ollama_warmers}
+
+
+def stats() -> Dict[str, Any]:
+    json_stats = sum((Counter(c.json_stats) for c in ollama_clients), Counter())
+    return {
+        "cache": response_cache.stats() if response_cache else None,
+        "mvpOffload": mvp_offload.stats(),
+        "mvpMemo": mvp_engine.memo.stats(),
+        "coalescing": {
+            "mvp": mvp_coalescing.stats(),
+            "ollama": ollama_coalescing.stats() if ollama_coalescing else None,
+        },
+        "ollama": {m.client.base_url: m.stats() for m in ollama_monitors},
+        "pool": ollama_pool.stats() if ollama_pool else None,
+        "warmup": warmup_stats(),
+        "json": dict(json_stats),
+        "tempos": ollama_metrics.stats(),
+        "prompts": prompt_compiler.stats(),
+        "prefixos": {
+            c.base_url: c.prefixes.stats() for c in ollama_clients if c.prefixes
+        },
+        "scheduler": ollama_scheduler.stats(),
+        "breaker": ollama_breaker.stats(),
+        "lotes": ollama_batching.stats() if ollama_batching else None,
+        "refinamentos": refinement_jobs.stats(),
+        "shadow": ollama_shadow.stats() if ollama_shadow else None,
+    }
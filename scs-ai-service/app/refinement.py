@@ -0,0 +1,114 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from app.config import settings
+
+PENDENTE = "pendente"
+REFINADO = "refinado"
+FALHOU = "falhou"
+
+
+@dataclass
+class Refinamento:
+    """Revisão 0 é a resposta do MVP; revisão 1, a do Ollama quando chegar"""
+
+    id: str
+    prompt: str
+    resultado: Dict[str, Any]
+    revisao: int = 0
+    status: str = PENDENTE
+    erro: Optional[str] = None
+    criado: float = field(default_factory=time.monotonic)
+    pronto: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "prompt": self.prompt,
+            "status": self.status,
+            "revisao": self.revisao,
+            "resultado": self.resultado,
+            "erro": self.erro,
+        }
+
+
+class RefinementJobs:
+    """Gerações do Ollama que continuam depois que a resposta do MVP já saiu"""
+
+    def __init__(self, max_jobs: int = None, ttl: float = None):
+        self.max_jobs = max_jobs or settings.REFINE_MAX_JOBS
+        self.ttl = settings.REFINE_TTL if ttl is None else ttl
+        self.timeout = settings.OLLAMA_DEADLINE_MS / 1000
+        self._jobs: "OrderedDict[str, Refinamento]" = OrderedDict()
+        self._tarefas: Dict[str, asyncio.Task] = {}
+        self.criados = 0
+        self.refinados = 0
+        self.falhas = 0
+
+    def submit(
+        self,
+        prompt: str,
+        resultado: Dict[str, Any],
+        gerar: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Refinamento:
+        self._expirar()
+        job = Refinamento(id=uuid.uuid4().hex, prompt=prompt, resultado=resultado)
+        self._jobs[job.id] = job
+        self._tarefas[job.id] = asyncio.create_task(self._refinar(job, gerar))
+        self.criados += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Refinamento]:
+        self._expirar()
+        return self._jobs.get(job_id)
+
+    async def watch(self, job: Refinamento) -> AsyncIterator[Tuple[str, Any]]:
+        """Eventos SSE: a revisão atual e, se ainda pendente, a refinada"""
+        yield "resultado", job.to_dict()
+        if job.status == PENDENTE:
+            await job.pronto.wait()
+            yield "resultado" if job.status == REFINADO else "erro", job.to_dict()
+
+    async def close(self) -> None:
+        for tarefa in self._tarefas.values():
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas.values(), return_exceptions=True)
+        self._tarefas.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs": len(self._jobs),
+            "pendentes": len(self._tarefas),
+            "criados": self.criados,
+            "refinados": self.refinados,
+            "falhas": self.falhas,
+        }
+
+    async def _refinar(
+        self, job: Refinamento, gerar: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> None:
+        try:
+            job.resultado = await asyncio.wait_for(gerar(), self.timeout)
+            job.revisao, job.status = 1, REFINADO
+            self.refinados += 1
+        except asyncio.CancelledError:
+            job.status, job.erro = FALHOU, "cancelado"
+            raise
+        except Exception as e:
+            # a revisão do MVP continua valendo
+            job.status, job.erro = FALHOU, str(e) or type(e).__name__
+            self.falhas += 1
+        finally:
+            job.pronto.set()
+            self._tarefas.pop(job.id, None)
+
+    def _expirar(self) -> None:
+        agora = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.status == PENDENTE:
+                continue
+            if agora - job.criado > self.ttl or len(self._jobs) > self.max_jobs:
+                del self._jobs[job_id]
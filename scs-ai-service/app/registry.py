@@ -0,0 +1,96 @@
+"""Registro das análises do MVP: prompt -> função, entradas, resposta e custo.
+
+O MVPEngine despacha por aqui (um lookup, sem cadeia de ifs) e as camadas em
+volta leem o custo declarado em vez de manter listas próprias de prompts:
+
+- cheap: sai da tabela de features; cache e coalescing não compensam
+- batchable: texto livre, aceita esperar a janela do lote no Ollama
+- offloadable: entrada em lista que pode crescer; vai ao pool do offload
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Iterator, Optional, Tuple, Type
+from pydantic import BaseModel
+
+CHEAP = "cheap"
+BATCHABLE = "batchable"
+OFFLOADABLE = "offloadable"
+CUSTOS = (CHEAP, BATCHABLE, OFFLOADABLE)
+
+
+class PromptDesconhecidoError(ValueError):
+    """Prompt sem análise registrada"""
+
+
+@dataclass(frozen=True)
+class Analisador:
+    prompt: str
+    funcao: Callable[[Any, Dict[str, Any]], Dict[str, Any]]
+    entradas: Tuple[str, ...]
+    resposta: Type[BaseModel]
+    custo: str
+    relogio: bool = False  # depende do "agora": o cache do MVP não serve
+
+
+class AnalyzerRegistry:
+    def __init__(self):
+        self._analisadores: Dict[str, Analisador] = {}
+
+    def register(
+        self,
+        prompt: str,
+        resposta: Type[BaseModel],
+        entradas: Tuple[str, ...] = (),
+        custo: str = CHEAP,
+        relogio: bool = False,
+    ) -> Callable:
+        """Decorator: registra a função (método do engine) para o prompt"""
+        if custo not in CUSTOS:
+            raise ValueError(f"Custo inválido para {prompt}: {custo}")
+
+        def decorar(funcao: Callable) -> Callable:
+            if prompt in self._analisadores:
+                raise ValueError(f"Prompt já registrado: {prompt}")
+            self._analisadores[prompt] = Analisador(
+                prompt, funcao, tuple(entradas), resposta, custo, relogio
+            )
+            return funcao
+
+        return decorar
+
+    def get(self, prompt: str) -> Analisador:
+        try:
+            return self._analisadores[prompt]
+        except KeyError:
+            raise PromptDesconhecidoError(f"Prompt desconhecido: {prompt}") from None
+
+    def resposta(self, prompt: str) -> Optional[Type[BaseModel]]:
+        analisador = self._analisadores.get(prompt)
+        return analisador.resposta if analisador else None
+
+    def custo(self, prompt: str) -> Optional[str]:
+        analisador = self._analisadores.get(prompt)
+        return analisador.custo if analisador else None
+
+    def prompts(self, custo: str = None) -> FrozenSet[str]:
+        return frozenset(
+            a.prompt
+            for a in self._analisadores.values()
+            if custo is None or a.custo == custo
+        )
+
+    def com_relogio(self) -> FrozenSet[str]:
+        return frozenset(a.prompt for a in self._analisadores.values() if a.relogio)
+
+    def __contains__(self, prompt: str) -> bool:
+        return prompt in self._analisadores
+
+    def __iter__(self) -> Iterator[Analisador]:
+        return iter(list(self._analisadores.values()))
+
+    def __len__(self) -> int:
+        return len(self._analisadores)
+
+
+# Preenchido por app.llm ao definir o MVPEngine
+analisadores = AnalyzerRegistry()
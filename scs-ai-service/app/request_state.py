@@ -0,0 +1,49 @@
+import time
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+
+@dataclass
+class RequestState:
+    """Dados da requisição HTTP atual compartilhados entre api e services"""
+
+    inicio: float = field(default_factory=time.monotonic)
+    endpoint: Optional[str] = None
+    deadline_ms: Optional[int] = None
+    degradado: Optional[str] = None
+    refinar: bool = False
+    refinamento: Optional[str] = None
+    http: bool = False
+    agora: Optional[datetime] = None  # relógio único da requisição (timestamps)
+    sem_fallback: bool = False  # shadow: resposta crua do Ollama, sem o MVP
+
+    def restante(self, padrao_ms: int) -> float:
+        """Segundos que ainda restam do orçamento de latência"""
+        orcamento = (self.deadline_ms or padrao_ms) / 1000
+        return max(0.0, orcamento - (time.monotonic() - self.inicio))
+
+
+_estado: ContextVar[Optional[RequestState]] = ContextVar(
+    "request_state", default=None
+)
+
+
+def current_request() -> RequestState:
+    estado = _estado.get()
+    if estado is None:
+        # fora de uma requisição HTTP (testes, scripts): estado novo, sem
+        # guardar no contextvar, para o inicio não envelhecer entre chamadas
+        return RequestState()
+    return estado
+
+
+def begin_request(
+    endpoint: Optional[str] = None, agora: Optional[datetime] = None
+) -> Token:
+    return _estado.set(RequestState(endpoint=endpoint, http=True, agora=agora))
+
+
+def end_request(token: Token) -> None:
+    _estado.reset(token)
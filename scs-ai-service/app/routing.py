@@ -0,0 +1,51 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from app.config import settings
+
+# Opções de geração repassadas ao Ollama em "options"
+OPCOES = ("num_ctx", "num_predict", "temperature")
+
+
+@dataclass(frozen=True)
+class Rota:
+    model: str
+    options: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_routes(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    if not path or not Path(path).exists():
+        return {}
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def save_routes(path: str, rotas: Dict[str, Dict[str, Any]]) -> None:
+    Path(path).write_text(
+        json.dumps(rotas, indent=2, ensure_ascii=False, sort_keys=True) + "\n",
+        encoding="utf-8",
+    )
+
+
+class ModelRouter:
+    """Modelo e opções por tipo de prompt: arquivo gerado pelo tuning
+    (OLLAMA_ROUTES_FILE) sobreposto por OLLAMA_PROMPT_ROUTES"""
+
+    def __init__(self, routes: Dict[str, Dict[str, Any]] = None):
+        if routes is None:
+            routes = {
+                **load_routes(settings.OLLAMA_ROUTES_FILE),
+                **settings.OLLAMA_PROMPT_ROUTES,
+            }
+        self.routes = routes
+
+    def rota(self, prompt: str, padrao: str) -> Rota:
+        config = self.routes.get(prompt, {})
+        opcoes = config.get("options", {})
+        return Rota(
+            model=config.get("model") or padrao,
+            options={k: opcoes[k] for k in OPCOES if k in opcoes},
+        )
+
+    def models(self) -> List[str]:
+        return [r["model"] for r in self.routes.values() if r.get("model")]
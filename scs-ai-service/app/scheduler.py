@@ -0,0 +1,180 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from app.adaptive import AdaptiveLimit
+from app.llm import LLMProvider, ProviderIndisponivelError
+from app.registry import BATCHABLE, analisadores
+from app.config import settings
+
+# Ordem de atendimento: segurança primeiro, marketing por último
+CLASSES = ("seguranca", "operacional", "marketing")
+CLASSE_PADRAO = "operacional"
+# Prompt sem prioridade configurada: a classe vem do custo no registro.
+# Quem aceita esperar a janela do lote também aceita ir para o fim da fila.
+CLASSE_POR_CUSTO = {BATCHABLE: "marketing"}
+
+
+class FilaCheiaError(ProviderIndisponivelError):
+    motivo = "fila_cheia"
+
+
+class PriorityScheduler:
+    """Limita as gerações simultâneas no Ollama e atende a fila por prioridade"""
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        queue_limits: Dict[str, int] = None,
+        priorities: Dict[str, str] = None,
+        adaptive: Optional[AdaptiveLimit] = None,
+    ):
+        self.limite = max_concurrency or settings.OLLAMA_MAX_PARALLEL
+        self.adaptive = adaptive
+        self.queue_limits = queue_limits or settings.OLLAMA_QUEUE_LIMITS
+        self.priorities = (
+            settings.OLLAMA_PROMPT_PRIORITIES if priorities is None else priorities
+        )
+        self.ativos = 0
+        self._filas: Dict[str, Deque[asyncio.Future]] = {
+            classe: deque() for classe in CLASSES
+        }
+        self._metricas = {
+            classe: {
+                "atendidas": 0,
+                "rejeitadas": 0,
+                "esperaTotal": 0.0,
+                "esperaMax": 0.0,
+            }
+            for classe in CLASSES
+        }
+
+    def classe(self, prompt: str) -> str:
+        classe = self.priorities.get(prompt)
+        if classe is None:
+            classe = CLASSE_POR_CUSTO.get(analisadores.custo(prompt), CLASSE_PADRAO)
+        return classe if classe in self._filas else CLASSE_PADRAO
+
+    def ocioso(self) -> bool:
+        return self.ativos < self.limite and not any(self._filas.values())
+
+    @asynccontextmanager
+    async def slot(self, prompt: str, medir: bool = False) -> AsyncIterator[None]:
+        """medir=True: a duração alimenta o limite adaptativo (só gerações
+        unitárias; lotes e streams não são comparáveis)"""
+        classe = self.classe(prompt)
+        inicio = time.monotonic()
+        await self._adquirir(classe)
+        self._registrar_espera(classe, time.monotonic() - inicio)
+        inicio = time.monotonic()
+        try:
+            yield
+            if medir and self.adaptive:
+                duracao = time.monotonic() - inicio
+                self.set_limit(self.adaptive.update(duracao, self.ativos, self.limite))
+        finally:
+            self._liberar()
+
+    def set_limit(self, limite: int) -> None:
+        """Ao crescer, libera na hora quem está na fila"""
+        self.limite = limite
+        while self.ativos < self.limite and self._entregar():
+            self.ativos += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limite": self.limite,
+            "ativos": self.ativos,
+            "adaptativo": self.adaptive.stats() if self.adaptive else None,
+            "classes": {
+                classe: {
+                    "fila": len(self._filas[classe]),
+                    "atendidas": m["atendidas"],
+                    "rejeitadas": m["rejeitadas"],
+                    "esperaMediaMs": round(
+                        m["esperaTotal"] * 1000 / m["atendidas"], 1
+                    )
+                    if m["atendidas"]
+                    else 0.0,
+                    "esperaMaxMs": round(m["esperaMax"] * 1000, 1),
+                }
+                for classe, m in self._metricas.items()
+            },
+        }
+
+    async def _adquirir(self, classe: str) -> None:
+        if self.ocioso():
+            self.ativos += 1
+            return
+
+        fila = self._filas[classe]
+        if len(fila) >= self.queue_limits.get(classe, 0):
+            self._metricas[classe]["rejeitadas"] += 1
+            raise FilaCheiaError(f"Fila '{classe}' do Ollama cheia")
+
+        futuro = asyncio.get_running_loop().create_future()
+        fila.append(futuro)
+        try:
+            await futuro
+        except asyncio.CancelledError:
+            if futuro.cancelled():
+                if futuro in fila:
+                    fila.remove(futuro)
+            else:
+                # o slot foi entregue, mas o chamador desistiu antes de usá-lo
+                self._liberar()
+            raise
+
+    def _liberar(self) -> None:
+        if self.ativos <= self.limite and self._entregar():
+            return
+        self.ativos -= 1
+
+    def _entregar(self) -> bool:
+        """Passa um slot ao próximo da fila, por prioridade"""
+        for classe in CLASSES:
+            fila = self._filas[classe]
+            while fila:
+                futuro = fila.popleft()
+                if not futuro.done():
+                    futuro.set_result(None)
+                    return True
+        return False
+
+    def _registrar_espera(self, classe: str, espera: float) -> None:
+        metricas = self._metricas[classe]
+        metricas["atendidas"] += 1
+        metricas["esperaTotal"] += espera
+        metricas["esperaMax"] = max(metricas["esperaMax"], espera)
+
+
+class ScheduledProvider(LLMProvider):
+    """Encaminha gerações ao Ollama somente com um slot do scheduler"""
+
+    def __init__(self, client: LLMProvider, scheduler: PriorityScheduler):
+        self.client = client
+        self.scheduler = scheduler
+
+    def is_available(self) -> bool:
+        return self.client.is_available()
+
+    async def generate(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        async with self.scheduler.slot(prompt, medir=True):
+            return await self.client.generate(prompt, context)
+
+    async def generate_batch(
+        self, prompt: str, contexts: List[Dict[str, Any]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """O lote inteiro ocupa um único slot"""
+        async with self.scheduler.slot(prompt):
+            return await self.client.generate_batch(prompt, contexts)
+
+    async def generate_stream(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        async with self.scheduler.slot(prompt):
+            async for evento in self.client.generate_stream(prompt, context):
+                yield evento
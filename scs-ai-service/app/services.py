@@ -1,5 +1,7 @@
-from typing import Optional, List, Dict, Any
-from app.llm import LLMProvider, MVPEngine, OllamaClient
+import asyncio
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Type
+from pydantic import BaseModel
+from app.llm import LLMProvider, ProviderIndisponivelError
 from app.models import (
     EventoRequest,
     AnaliseEvento,
@@ -26,91 +28,152 @@ from app.models import (
     PreverSucessoEventoRequest,
     PrevisaoSucessoEvento,
 )
+from app.providers import (
+    mvp_provider,
+    ollama_guarded,
+    ollama_provider,
+    ollama_shadow,
+    refinement_jobs,
+)
+from app.request_state import current_request
 from app.config import settings
 
 
-class EventoService:
+class OllamaService:
+    """Base dos services que podem usar o Ollama, com fallback para o MVP"""
+
     def __init__(self):
-        self.mvp = MVPEngine()
-        self.ollama = OllamaClient() if settings.USE_OLLAMA else None
+        self.mvp = mvp_provider
+        self.ollama = ollama_provider
+        self.ollama_stream = ollama_guarded
+        self.refinamentos = refinement_jobs
+        self.shadow = ollama_shadow
+
+    def _get_provider(self, model: str) -> LLMProvider:
+        if model == "ollama" and self.ollama and self.ollama.is_available():
+            return self.ollama
+        return self.mvp
 
+    async def _generate(
+        self, prompt: str, context: Dict[str, Any], model: str
+    ) -> Dict[str, Any]:
+        """Corre o Ollama contra o deadline da requisição; estourou, responde o MVP"""
+        provider = self._get_provider(model)
+        if provider is self.mvp:
+            if model == "ollama":
+                current_request().degradado = ProviderIndisponivelError.motivo
+            resultado = await self.mvp.generate(prompt, context)
+            if self.shadow:
+                self.shadow.offer(prompt, context, resultado)
+            return resultado
+
+        estado = current_request()
+        if estado.refinar:
+            # MVP agora; a versão do Ollama chega por /refinamentos/{id}
+            resultado = await self.mvp.generate(prompt, context)
+            job = self.refinamentos.submit(
+                prompt, resultado, lambda: provider.generate(prompt, context)
+            )
+            estado.refinamento = job.id
+            return resultado
+
+        padrao_ms = settings.OLLAMA_DEADLINES_MS.get(
+            prompt, settings.OLLAMA_DEADLINE_MS
+        )
+        try:
+            return await asyncio.wait_for(
+                provider.generate(prompt, context), estado.restante(padrao_ms)
+            )
+        except ProviderIndisponivelError as e:
+            estado.degradado = e.motivo
+        except asyncio.TimeoutError:
+            estado.degradado = "deadline"
+        return await self.mvp.generate(prompt, context)
+
+    async def _stream(
+        self,
+        prompt: str,
+        context: Dict[str, Any],
+        model: str,
+        schema: Type[BaseModel],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        if self._get_provider(model) is self.mvp:
+            response = await self.mvp.generate(prompt, context)
+            yield "resultado", schema(**response)
+            return
+
+        try:
+            stream = self.ollama_stream.generate_stream(prompt, context)
+            async for evento, dados in stream:
+                yield evento, schema(**dados) if evento == "resultado" else dados
+        except ProviderIndisponivelError:
+            response = await self.mvp.generate(prompt, context)
+            yield "resultado", schema(**response)
+
+
+class EventoService(OllamaService):
     async def analisar(
         self, evento: EventoRequest, model: str = "mvp"
     ) -> AnaliseEvento:
-        provider = self._get_provider(model)
-        response = await provider.generate(
-            "analisar_evento", {"evento": evento.model_dump()}
+        response = await self._generate(
+            "analisar_evento", {"evento": evento.model_dump()}, model
         )
         return AnaliseEvento(**response)
 
-    def _get_provider(self, model: str) -> LLMProvider:
-        if model == "ollama" and self.ollama and self.ollama.is_available():
-            return self.ollama
-        return self.mvp
-
+    def analisar_stream(
+        self, evento: EventoRequest, model: str = "mvp"
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        return self._stream(
+            "analisar_evento",
+            {"evento": evento.model_dump()},
+            model,
+            AnaliseEvento,
+        )
 
-class SegurancaService:
-    def __init__(self):
-        self.mvp = MVPEngine()
-        self.ollama = OllamaClient() if settings.USE_OLLAMA else None
 
+class SegurancaService(OllamaService):
     async def analisar_padroes(
         self, alertas: list, eventos: list, model: str = "mvp"
     ) -> AnaliseSeguranca:
-        provider = self._get_provider(model)
-        response = await provider.generate(
-            "analisar_seguranca", {"alertas": alertas, "eventos": eventos}
+        response = await self._generate(
+            "analisar_seguranca", {"alertas": alertas, "eventos": eventos}, model
         )
         return AnaliseSeguranca(**response)
 
     async def prever_risco(
         self, request: PredicaoRiscoRequest, model: str = "mvp"
     ) -> PredicaoRisco:
-        provider = self._get_provider(model)
-        response = await provider.generate(
+        response = await self._generate(
             "prever_risco",
             {
                 "quadra": request.quadra,
                 "dataHora": request.dataHora.isoformat(),
                 "eventosAtivos": request.eventosAtivos or [],
             },
+            model,
         )
         return PredicaoRisco(**response)
 
-    def _get_provider(self, model: str) -> LLMProvider:
-        if model == "ollama" and self.ollama and self.ollama.is_available():
-            return self.ollama
-        return self.mvp
-
-
-class ProtecaoMulherService:
-    def __init__(self):
-        self.mvp = MVPEngine()
-        self.ollama = OllamaClient() if settings.USE_OLLAMA else None
 
+class ProtecaoMulherService(OllamaService):
     async def analisar(
         self, request: ProtecaoMulherRequest, model: str = "mvp"
     ) -> AnaliseProtecaoMulher:
-        provider = self._get_provider(model)
-        response = await provider.generate(
+        response = await self._generate(
             "analisar_protecao_mulher",
             {
                 "alertas": request.alertas,
                 "eventos": request.eventos,
                 "bares": request.bares or [],
             },
+            model,
         )
         return AnaliseProtecaoMulher(**response)
 
-    def _get_provider(self, model: str) -> LLMProvider:
-        if model == "ollama" and self.ollama and self.ollama.is_available():
-            return self.ollama
-        return self.mvp
-
 
 class AcessibilidadeService:
     def __init__(self):
-        self.mvp = MVPEngine()
+        self.mvp = mvp_provider
 
     async def priorizar(
         self, necessidades: list
@@ -126,16 +189,11 @@ class AcessibilidadeService:
         return [PriorizacaoAcessibilidade(**p) for p in priorizacao]
 
 
-class GestaoService:
-    def __init__(self):
-        self.mvp = MVPEngine()
-        self.ollama = OllamaClient() if settings.USE_OLLAMA else None
-
+class GestaoService(OllamaService):
     async def gerar_recomendacoes(
         self, request: GestaoRequest, model: str = "mvp"
     ) -> list[RecomendacaoGestao]:
-        provider = self._get_provider(model)
-        response = await provider.generate(
+        response = await self._generate(
             "recomendacoes_gestao",
             {
                 "eventos": request.eventos,
@@ -143,44 +201,39 @@ class GestaoService:
                 "ocupacao": request.ocupacao,
                 "engajamentoQRCode": request.engajamentoQRCode or {},
             },
+            model,
         )
         recomendacoes = response.get("recomendacoes", [])
         return [RecomendacaoGestao(**r) for r in recomendacoes]
 
-    def _get_provider(self, model: str) -> LLMProvider:
-        if model == "ollama" and self.ollama and self.ollama.is_available():
-            return self.ollama
-        return self.mvp
-
-
-class ComunicacaoService:
-    def __init__(self):
-        self.mvp = MVPEngine()
-        self.ollama = OllamaClient() if settings.USE_OLLAMA else None
 
+class ComunicacaoService(OllamaService):
     async def gerar_texto(
         self, request: GerarTextoRequest, model: str = "mvp"
     ) -> TextoGerado:
-        provider = self._get_provider(model)
-        response = await provider.generate(
-            "gerar_texto", {"tipo": request.tipo, "contexto": request.contexto}
+        response = await self._generate(
+            "gerar_texto", {"tipo": request.tipo, "contexto": request.contexto}, model
         )
         return TextoGerado(**response)
 
+    def gerar_texto_stream(
+        self, request: GerarTextoRequest, model: str = "mvp"
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        return self._stream(
+            "gerar_texto",
+            {"tipo": request.tipo, "contexto": request.contexto},
+            model,
+            TextoGerado,
+        )
+
     async def otimizar(
         self, request: ComunicacaoRequest, model: str = "mvp"
     ) -> ComunicacaoOtimizada:
-        provider = self._get_provider(model)
-        response = await provider.generate(
-            "otimizar_comunicacao", {"evento": request.evento}
+        response = await self._generate(
+            "otimizar_comunicacao", {"evento": request.evento}, model
         )
         return ComunicacaoOtimizada(**response)
 
-    def _get_provider(self, model: str) -> LLMProvider:
-        if model == "ollama" and self.ollama and self.ollama.is_available():
-            return self.ollama
-        return self.mvp
-
 
 # ===== NOVOS SERVICES INOVADORES =====
 
@@ -188,7 +241,7 @@ class AgoraNoSCSService:
     """MAPA VIVO: Mostra o que está acontecendo AGORA no SCS"""
 
     def __init__(self):
-        self.mvp = MVPEngine()
+        self.mvp = mvp_provider
 
     async def obter_status(
         self, request: AgoraNoSCSRequest, dados_reais: Dict[str, Any]
@@ -209,7 +262,7 @@ class MovimentoPredictorService:
     """PREDIÇÃO: Prever movimento futuro"""
 
     def __init__(self):
-        self.mvp = MVPEngine()
+        self.mvp = mvp_provider
 
     async def prever(
         self, request: PreverMovimentoRequest, historico: Optional[Dict] = None
@@ -228,7 +281,7 @@ class AgentesOrchestratorService:
     """IA MULTI-AGENTE: Orquestra múltiplos agentes"""
 
     def __init__(self):
-        self.mvp = MVPEngine()
+        self.mvp = mvp_provider
 
     async def orquestrar(
         self, request: OrquestrarAgentesRequest, dados_contexto: Dict[str, Any]
@@ -245,7 +298,7 @@ class EventoPredictorService:
     """PREDIÇÃO: Prever sucesso de eventos"""
 
     def __init__(self):
-        self.mvp = MVPEngine()
+        self.mvp = mvp_provider
 
     async def prever_sucesso(
         self, request: PreverSucessoEventoRequest, historico: Optional[Dict] = None
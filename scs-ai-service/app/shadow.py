@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.llm import LLMProvider, _valida
+from app.registry import analisadores
+from app.request_state import begin_request, current_request, end_request
+from app.config import settings
+
+
+def concordancia(mvp: Dict[str, Any], ollama: Dict[str, Any]) -> float:
+    """Fração dos campos do MVP que o Ollama devolveu com o mesmo valor"""
+    if not mvp:
+        return 1.0 if mvp == ollama else 0.0
+    iguais = sum(ollama.get(campo) == valor for campo, valor in mvp.items())
+    return iguais / len(mvp)
+
+
+class ShadowEvaluator:
+    """Reexecuta no Ollama uma amostra das respostas servidas pelo MVP, fora
+    do caminho da requisição. Fila cheia ou Ollama ocupado: a amostra é
+    descartada.
+
+    Compara a saída crua do Ollama (sem fallback nem complemento do MVP);
+    respostas fora do schema contam em "invalidas" e concordam só no que
+    trouxeram.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        sample_rate: float = None,
+        queue_size: int = None,
+        workers: int = None,
+        ocioso: Callable[[], bool] = lambda: True,
+    ):
+        self.provider = provider
+        self.sample_rate = (
+            settings.SHADOW_SAMPLE_RATE if sample_rate is None else sample_rate
+        )
+        self.workers = workers or settings.SHADOW_WORKERS
+        self.timeout = settings.SHADOW_TIMEOUT
+        self.ocioso = ocioso
+        self._fila: asyncio.Queue = asyncio.Queue(
+            maxsize=queue_size or settings.SHADOW_QUEUE_SIZE
+        )
+        self._tasks: List[asyncio.Task] = []
+        self.descartadas = 0
+        self._metricas: Dict[str, Dict[str, Any]] = {}
+
+    def offer(
+        self, prompt: str, context: Dict[str, Any], resultado: Dict[str, Any]
+    ) -> bool:
+        if not self._tasks or random.random() >= self.sample_rate:
+            return False
+        try:
+            self._fila.put_nowait((prompt, context, resultado))
+        except asyncio.QueueFull:
+            self.descartadas += 1
+            return False
+        return True
+
+    def start(self) -> None:
+        if not self._tasks and self.sample_rate > 0:
+            self._tasks = [
+                asyncio.create_task(self._run()) for _ in range(self.workers)
+            ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def evaluate(
+        self, prompt: str, context: Dict[str, Any], resultado: Dict[str, Any]
+    ) -> Optional[float]:
+        if not self.provider.is_available() or not self.ocioso():
+            self.descartadas += 1
+            return None
+        metricas = self._metricas.setdefault(
+            prompt,
+            {
+                "amostras": 0,
+                "identicas": 0,
+                "concordanciaTotal": 0.0,
+                "latenciaTotal": 0.0,
+                "latenciaMax": 0.0,
+                "erros": 0,
+                "invalidas": 0,
+            },
+        )
+        token = begin_request()
+        current_request().sem_fallback = True
+        inicio = time.monotonic()
+        try:
+            ollama = await asyncio.wait_for(
+                self.provider.generate(prompt, context), self.timeout
+            )
+        except Exception:
+            metricas["erros"] += 1
+            return None
+        finally:
+            end_request(token)
+        duracao = time.monotonic() - inicio
+        valor = concordancia(resultado, ollama)
+        schema = analisadores.resposta(prompt)
+        metricas["amostras"] += 1
+        metricas["invalidas"] += schema is not None and not _valida(schema, ollama)
+        metricas["identicas"] += valor == 1.0
+        metricas["concordanciaTotal"] += valor
+        metricas["latenciaTotal"] += duracao
+        metricas["latenciaMax"] = max(metricas["latenciaMax"], duracao)
+        return valor
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "taxaAmostragem": self.sample_rate,
+            "fila": self._fila.qsize(),
+            "descartadas": self.descartadas,
+            "prompts": {
+                prompt: {
+                    "amostras": m["amostras"],
+                    "identicas": m["identicas"],
+                    "erros": m["erros"],
+                    "invalidas": m["invalidas"],
+                    "concordanciaMedia": round(
+                        m["concordanciaTotal"] / m["amostras"], 3
+                    )
+                    if m["amostras"]
+                    else None,
+                    "latenciaMediaMs": round(
+                        m["latenciaTotal"] * 1000 / m["amostras"], 1
+                    )
+                    if m["amostras"]
+                    else None,
+                    "latenciaMaxMs": round(m["latenciaMax"] * 1000, 1),
+                }
+                for prompt, m in self._metricas.items()
+            },
+        }
+
+    async def _run(self) -> None:
+        while True:
+            item: Tuple[str, Dict[str, Any], Dict[str, Any]] = await self._fila.get()
+            try:
+                await self.evaluate(*item)
+            finally:
+                self._fila.task_done()
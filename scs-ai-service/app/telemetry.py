@@ -0,0 +1,175 @@
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from app.llm import LLMProvider, ProviderIndisponivelError
+from app.request_state import current_request
+from app.config import settings
+
+# Limites (ms) dos buckets dos histogramas de duração
+BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# Campos de tempo (ns) e de contagem de tokens do chunk final do /api/generate
+DURACOES = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration")
+CONTADORES = ("prompt_eval_count", "eval_count")
+INTERNO = "interno"
+
+
+class OrcamentoTokensError(ProviderIndisponivelError):
+    motivo = "orcamento_tokens"
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS_MS):
+        self.buckets = buckets
+        self.contagens = [0] * (len(buckets) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observe(self, valor: float) -> None:
+        self.contagens[bisect_left(self.buckets, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def stats(self) -> Dict[str, Any]:
+        acumulado, buckets = 0, {}
+        for limite, contagem in zip([*map(str, self.buckets), "+Inf"], self.contagens):
+            acumulado += contagem
+            buckets[limite] = acumulado
+        return {
+            "buckets": buckets,
+            "soma": round(self.soma, 1),
+            "total": self.total,
+            "media": round(self.soma / self.total, 1) if self.total else None,
+        }
+
+
+class _Serie:
+    """Histogramas de duração e contadores de tokens de uma dimensão"""
+
+    def __init__(self):
+        self.chamadas = 0
+        self.sem_metricas = 0
+        self.tokens_estimados = 0
+        self.duracoes = {campo: Histogram() for campo in DURACOES}
+        self.contadores = {campo: 0 for campo in CONTADORES}
+
+    def add(self, final: Optional[Dict[str, Any]], estimados: int) -> None:
+        self.chamadas += 1
+        if final is None:
+            # parada antecipada: o Ollama não chegou a mandar o chunk final
+            self.sem_metricas += 1
+            self.tokens_estimados += estimados
+            return
+        for campo in DURACOES:
+            if campo in final:
+                self.duracoes[campo].observe(final[campo] / 1e6)
+        for campo in CONTADORES:
+            self.contadores[campo] += final.get(campo, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        eval_ms = self.duracoes["eval_duration"].soma
+        return {
+            "chamadas": self.chamadas,
+            "semMetricas": self.sem_metricas,
+            "tokensEstimados": self.tokens_estimados,
+            **self.contadores,
+            "tokensPorSegundo": round(self.contadores["eval_count"] * 1000 / eval_ms, 1)
+            if eval_ms
+            else None,
+            "duracoesMs": {campo: h.stats() for campo, h in self.duracoes.items()},
+        }
+
+
+class OllamaMetrics:
+    """Tempos e tokens reportados pelo Ollama por tipo de prompt e por endpoint
+    da API, com orçamento opcional de tokens por endpoint numa janela móvel"""
+
+    def __init__(self, budgets: Dict[str, int] = None, window: float = None):
+        self.budgets = settings.OLLAMA_TOKEN_BUDGETS if budgets is None else budgets
+        self.window = window or settings.OLLAMA_TOKEN_BUDGET_WINDOW
+        self._prompts: Dict[str, _Serie] = {}
+        self._endpoints: Dict[str, _Serie] = {}
+        self._consumo: Dict[str, Deque[Tuple[float, int]]] = {}
+        self.rejeitadas: Dict[str, int] = {}
+
+    def record(
+        self,
+        prompt: str,
+        endpoint: Optional[str],
+        final: Optional[Dict[str, Any]],
+        estimados: int = 0,
+    ) -> None:
+        endpoint = endpoint or INTERNO
+        self._prompts.setdefault(prompt, _Serie()).add(final, estimados)
+        self._endpoints.setdefault(endpoint, _Serie()).add(final, estimados)
+        if endpoint in self.budgets:
+            tokens = (
+                sum(final.get(campo, 0) for campo in CONTADORES) if final else estimados
+            )
+            self._consumo.setdefault(endpoint, deque()).append(
+                (time.monotonic(), tokens)
+            )
+
+    def consumidos(self, endpoint: str) -> int:
+        consumo = self._consumo.get(endpoint)
+        if not consumo:
+            return 0
+        limite = time.monotonic() - self.window
+        while consumo and consumo[0][0] < limite:
+            consumo.popleft()
+        return sum(tokens for _, tokens in consumo)
+
+    def check_budget(self, endpoint: Optional[str]) -> None:
+        endpoint = endpoint or INTERNO
+        orcamento = self.budgets.get(endpoint)
+        if orcamento is not None and self.consumidos(endpoint) >= orcamento:
+            self.rejeitadas[endpoint] = self.rejeitadas.get(endpoint, 0) + 1
+            raise OrcamentoTokensError(
+                f"Orçamento de {orcamento} tokens de {endpoint} esgotado"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prompts": {p: s.stats() for p, s in self._prompts.items()},
+            "endpoints": {e: s.stats() for e, s in self._endpoints.items()},
+            "orcamentos": {
+                endpoint: {
+                    "limite": orcamento,
+                    "consumidos": self.consumidos(endpoint),
+                    "janelaSegundos": self.window,
+                    "rejeitadas": self.rejeitadas.get(endpoint, 0),
+                }
+                for endpoint, orcamento in self.budgets.items()
+            },
+        }
+
+
+class TokenBudgetProvider(LLMProvider):
+    """Manda para o MVP (via OrcamentoTokensError) quando o endpoint da
+    requisição já gastou seu orçamento de tokens na janela"""
+
+    def __init__(self, provider: LLMProvider, metrics: OllamaMetrics):
+        self.provider = provider
+        self.metrics = metrics
+
+    def is_available(self) -> bool:
+        return self.provider.is_available()
+
+    async def generate(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        self.metrics.check_budget(current_request().endpoint)
+        return await self.provider.generate(prompt, context)
+
+    async def generate_batch(
+        self, prompt: str, contexts: List[Dict[str, Any]]
+    ) -> List[Any]:
+        self.metrics.check_budget(current_request().endpoint)
+        return await self.provider.generate_batch(prompt, contexts)
+
+    async def generate_stream(
+        self, prompt: str, context: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        self.metrics.check_budget(current_request().endpoint)
+        async for evento in self.provider.generate_stream(prompt, context):
+            yield evento
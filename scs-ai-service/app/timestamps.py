@@ -0,0 +1,69 @@
+"""Parse de datas ISO-8601 e relógio da requisição.
+
+Política de fuso: toda data sai "aware" no fuso do SCS (SCS_TIMEZONE,
+America/Sao_Paulo). Texto ou datetime sem fuso é hora local de Brasília;
+com "Z" ou offset, é convertido. Hora e dia da semana são sempre os locais.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional
+from zoneinfo import ZoneInfo
+from app.config import settings
+from app.request_state import current_request
+
+FUSO = ZoneInfo(settings.SCS_TIMEZONE)
+
+
+def para_local(data: datetime) -> datetime:
+    if data.tzinfo is None:
+        # combine sai bem mais barato que replace(tzinfo=...) no loop
+        return datetime.combine(data, data.time(), FUSO)
+    return data.astimezone(FUSO)
+
+
+@lru_cache(maxsize=4096)
+def parse_iso(texto: str) -> datetime:
+    """Memoizado: o mesmo texto se repete muito entre alertas e eventos"""
+    return para_local(datetime.fromisoformat(texto))
+
+
+def parse_datetime(valor: Any, padrao: Optional[datetime] = None) -> Any:
+    """Texto ISO ou datetime -> datetime local; outros valores -> padrao
+
+    Texto inválido levanta ValueError, como o fromisoformat.
+    """
+    if isinstance(valor, str):
+        return parse_iso(valor)
+    if isinstance(valor, datetime):
+        return para_local(valor)
+    return padrao
+
+
+def parse_lote(valores: Iterable[Any], padrao: Optional[datetime] = None) -> List:
+    """Uma lista inteira de uma vez; cada texto distinto é parseado uma só vez"""
+    valores = list(valores)
+    try:
+        unicos = set(valores)
+    except TypeError:
+        return [parse_datetime(valor, padrao) for valor in valores]
+    textos = {valor: parse_iso(valor) for valor in unicos if isinstance(valor, str)}
+    if len(textos) == len(unicos):
+        return list(map(textos.__getitem__, valores))
+    return [
+        textos[valor] if isinstance(valor, str) else parse_datetime(valor, padrao)
+        for valor in valores
+    ]
+
+
+def agora() -> datetime:
+    """"Agora" da requisição: capturado uma vez e reusado por todas as análises
+
+    Fora de uma requisição HTTP (testes, scripts) é o relógio corrente.
+    """
+    estado = current_request()
+    if not estado.http:
+        return datetime.now(FUSO)
+    if estado.agora is None:
+        estado.agora = datetime.now(FUSO)
+    return estado.agora
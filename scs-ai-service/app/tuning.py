@@ -0,0 +1,154 @@
+"""Escolhe modelo e opções por tipo de prompt medindo candidatos no Ollama.
+
+    python -m app.tuning candidatos.json [--base-url URL] [--stand-in]
+
+candidatos.json:
+
+    {"gerar_texto": {
+        "candidatos": [
+            {"model": "phi3", "options": {"num_predict": 128}},
+            {"model": "llama3", "options": {"num_ctx": 2048}}],
+        "amostras": [{"contexto": {"titulo": "Show no SCS"}}]}}
+
+Vence o candidato mais rápido (mediana) cujas respostas passam todas no schema
+do prompt, sem reparo de JSON e sem corte por num_predict (done_reason
+"stop"); o resultado é gravado em OLLAMA_ROUTES_FILE. Sem "amostras", cada
+prompt é medido com um contexto vazio; amostra que falha conta como inválida.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Type
+import httpx
+from pydantic import BaseModel, ValidationError
+from app.fake_ollama import create_app
+from app.llm import OllamaClient
+from app.registry import analisadores
+from app.routing import ModelRouter, load_routes, save_routes
+from app.config import settings
+
+
+async def medir(
+    client: OllamaClient,
+    prompt: str,
+    candidato: Dict[str, Any],
+    amostras: List[Dict[str, Any]],
+    repeticoes: int,
+) -> Dict[str, Any]:
+    client.router = ModelRouter({prompt: candidato})
+    schema = analisadores.resposta(prompt)
+    duracoes, validas, erros = [], 0, 0
+    for amostra in amostras:
+        for _ in range(repeticoes):
+            inicio = time.monotonic()
+            try:
+                texto, final = await client.generate_raw(prompt, amostra)
+            except httpx.HTTPError:
+                continue
+            except Exception:
+                # amostra que o prompt não aceita (ex.: analisar_evento sem evento)
+                erros += 1
+                continue
+            duracoes.append(time.monotonic() - inicio)
+            validas += final.get("done_reason") == "stop" and _valida_estrito(
+                schema, texto
+            )
+    total = len(amostras) * repeticoes
+    return {
+        **candidato,
+        "latenciaMs": round(statistics.median(duracoes) * 1000, 1)
+        if duracoes
+        else None,
+        "validas": validas,
+        "erros": erros,
+        "total": total,
+    }
+
+
+def _valida_estrito(schema: Optional[Type[BaseModel]], texto: str) -> bool:
+    """JSON como saiu do modelo (sem reparo) e dentro do schema"""
+    try:
+        dados = json.loads(texto)
+    except ValueError:
+        return False
+    if schema is None:
+        return True
+    try:
+        schema.model_validate(dados)
+    except ValidationError:
+        return False
+    return True
+
+
+async def tune(
+    client: OllamaClient, candidatos: Dict[str, Dict[str, Any]], repeticoes: int = 3
+) -> Dict[str, Dict[str, Any]]:
+    """Mede todos os candidatos; devolve {prompt: {"vencedor", "medicoes"}}"""
+    client.prefixes = None  # cada medição avalia o prompt inteiro
+    resultado = {}
+    for prompt, config in candidatos.items():
+        amostras = config.get("amostras") or [{}]
+        medicoes = [
+            await medir(client, prompt, candidato, amostras, repeticoes)
+            for candidato in config["candidatos"]
+        ]
+        aprovados = [m for m in medicoes if m["total"] and m["validas"] == m["total"]]
+        vencedor = min(aprovados, key=lambda m: m["latenciaMs"], default=None)
+        resultado[prompt] = {"vencedor": vencedor, "medicoes": medicoes}
+    return resultado
+
+
+def stand_in_transport() -> httpx.ASGITransport:
+    """Ollama falso em memória (app.fake_ollama) respondendo com o MVP"""
+    return httpx.ASGITransport(app=create_app())
+
+
+async def _executar(args: argparse.Namespace) -> int:
+    candidatos = json.loads(Path(args.candidatos).read_text(encoding="utf-8"))
+    http = None
+    if args.stand_in:
+        http = httpx.AsyncClient(transport=stand_in_transport())
+    client = OllamaClient(base_url=args.base_url, client=http)
+    try:
+        resultado = await tune(client, candidatos, args.repeticoes)
+    finally:
+        await client.aclose()
+
+    rotas = load_routes(args.saida)
+    for prompt, r in resultado.items():
+        vencedor = r["vencedor"]
+        for m in r["medicoes"]:
+            print(
+                f"{prompt:28} {m['model']:16} {json.dumps(m.get('options', {})):40}"
+                f" {m['latenciaMs']}ms {m['validas']}/{m['total']} válidas"
+            )
+        if vencedor is None:
+            print(f"{prompt}: nenhum candidato com saída válida; rota mantida")
+            continue
+        rotas[prompt] = {
+            "model": vencedor["model"],
+            "options": vencedor.get("options", {}),
+            "latenciaMs": vencedor["latenciaMs"],
+        }
+    save_routes(args.saida, rotas)
+    print(f"Rotas gravadas em {args.saida}")
+    return 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("candidatos")
+    parser.add_argument("--base-url", default=settings.ollama_base_urls[0])
+    parser.add_argument("--stand-in", action="store_true")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", default=settings.OLLAMA_ROUTES_FILE)
+    return asyncio.run(_executar(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""Caminho vetorizado (NumPy) das análises do MVP com muitos alertas.
+
+    python -m app.vectorized --tamanhos 10000 100000 1000000
+
+Os alertas viram colunas (hora local, quadra) uma vez só e os
+histogramas saem de bincount; o top-k usa argpartition e desempata pela
+primeira aparição, como o sorted estável do caminho em Python. Textos ISO no
+formato canônico são validados e fatiados em bloco; os demais passam pelo
+fromisoformat, uma vez por texto distinto. NumPy está no requirements; se
+faltar no ambiente, o MVPEngine segue no loop por alerta.
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from functools import cached_property, lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app import timestamps
+from app.config import settings
+from app.timestamps import FUSO
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = None
+
+NUMPY_DISPONIVEL = np is not None
+
+
+def usar(alertas: List[Dict[str, Any]]) -> bool:
+    return (
+        NUMPY_DISPONIVEL
+        and settings.MVP_VECTORIZED
+        and len(alertas) >= settings.MVP_VECTORIZED_THRESHOLD
+    )
+
+
+def _moldes() -> Dict[int, str]:
+    """Formatos ISO que o caminho vetorizado valida sozinho, por tamanho"""
+    curto = "dddd-dd-ddTdd:dd"
+    corpos = (curto, curto + ":dd", curto + ":dd.ddd", curto + ":dd.dddddd")
+    return {len(c + f): c + f for c in corpos for f in ("", "Z", "±dd:dd")}
+
+
+MOLDES = _moldes()
+DIAS_NO_MES = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _numero(posicoes: "np.ndarray", inicio: int, fim: int) -> "np.ndarray":
+    valor = posicoes[inicio].astype(np.int32) - ord("0")
+    for posicao in range(inicio + 1, fim):
+        valor = valor * 10 + posicoes[posicao] - ord("0")
+    return valor
+
+
+def _posicoes(textos: List[str]) -> Optional[Tuple["np.ndarray", "np.ndarray"]]:
+    """Bytes dos textos por posição (linha i = i-ésimo caractere de todos)"""
+    try:
+        tamanhos = np.fromiter(map(len, textos), np.int64, len(textos))
+        if tamanhos.min() == tamanhos.max():
+            # tamanho único (o comum): um join só, sem passar por dtype "S"
+            dados = np.frombuffer("".join(textos).encode("ascii"), np.uint8)
+            matriz = dados.reshape(len(textos), int(tamanhos[0]))
+        elif set(map(type, textos)) == {str}:
+            matriz = np.array(textos, dtype="S")
+            matriz = matriz.view(np.uint8).reshape(len(textos), -1)
+        else:
+            return None
+    except (TypeError, UnicodeEncodeError):
+        return None
+    return np.ascontiguousarray(matriz.T), tamanhos
+
+
+def campos_iso(
+    textos: List[str],
+) -> Optional[Tuple["np.ndarray", Dict[str, "np.ndarray"]]]:
+    """Máscara dos textos ISO canônicos válidos e seus campos, como escritos
+
+    A máscara só marca textos que datetime.fromisoformat aceitaria (formato e
+    faixas, inclusive 29/02); o resto fica para o parse por texto. "offset"
+    (segundos) e "aware" vêm do sufixo "Z"/"±hh:mm".
+    """
+    resultado = _posicoes(textos) if textos else None
+    if resultado is None:
+        return None
+    posicoes, tamanhos = resultado
+    largura = len(posicoes)
+    if largura < 16:
+        return np.zeros(len(textos), bool), {}
+
+    canonico = np.zeros(len(textos), bool)
+    aware = np.zeros(len(textos), bool)
+    offset = np.zeros(len(textos), np.int64)
+    for tamanho, molde in MOLDES.items():
+        if tamanho > largura:
+            continue
+        linhas = tamanhos == tamanho
+        if not linhas.any():
+            continue
+        ok = linhas
+        for posicao, esperado in enumerate(molde):
+            coluna = posicoes[posicao]
+            if esperado == "d":
+                ok = ok & (coluna - ord("0") <= 9)
+            elif esperado == "±":
+                ok = ok & ((coluna == ord("+")) | (coluna == ord("-")))
+            else:
+                ok = ok & (coluna == ord(esperado))
+        if molde.endswith("Z"):
+            aware |= ok
+        elif molde.endswith("±dd:dd"):
+            horas = _numero(posicoes, tamanho - 5, tamanho - 3)
+            minutos = _numero(posicoes, tamanho - 2, tamanho)
+            ok &= (horas <= 23) & (minutos <= 59)
+            sinal = np.where(posicoes[tamanho - 6] == ord("-"), -1, 1)
+            offset = np.where(ok, sinal * (horas * 3600 + minutos * 60), offset)
+            aware |= ok
+        canonico |= ok
+
+    campos = {
+        "ano": _numero(posicoes, 0, 4),
+        "mes": _numero(posicoes, 5, 7),
+        "dia": _numero(posicoes, 8, 10),
+        "hora": _numero(posicoes, 11, 13),
+        "minuto": _numero(posicoes, 14, 16),
+        "segundo": np.zeros(len(textos), np.int32),
+        "offset": offset,
+        "aware": aware,
+    }
+    ano, mes = campos["ano"], campos["mes"]
+    bissexto = (ano % 4 == 0) & ((ano % 100 != 0) | (ano % 400 == 0))
+    dias = np.asarray(DIAS_NO_MES)[np.clip(mes, 1, 12) - 1] + ((mes == 2) & bissexto)
+    canonico &= (ano >= 1) & (mes >= 1) & (mes <= 12)
+    canonico &= (campos["dia"] >= 1) & (campos["dia"] <= dias)
+    canonico &= (campos["hora"] <= 23) & (campos["minuto"] <= 59)
+    if largura >= 19:
+        com_segundos = (tamanhos >= 19) & (tamanhos != MOLDES_SEM_SEGUNDOS)
+        segundo = np.where(com_segundos, _numero(posicoes, 17, 19), 0)
+        canonico &= segundo <= 59
+        campos["segundo"] = segundo
+    return canonico, campos
+
+
+# "dddd-dd-ddTdd:dd±dd:dd" é o único molde com 19+ caracteres sem segundos
+MOLDES_SEM_SEGUNDOS = len("dddd-dd-ddTdd:dd±dd:dd")
+SEM_OFFSET = -(2**63)
+
+
+@lru_cache(maxsize=65536)
+def _offset_local(hora_utc: int) -> int:
+    """Offset (s) do fuso do SCS na hora UTC inteira; SEM_OFFSET se muda nela"""
+    try:
+        inicio = datetime.fromtimestamp(hora_utc * 3600, FUSO).utcoffset()
+        fim = datetime.fromtimestamp(hora_utc * 3600 + 3599, FUSO).utcoffset()
+    except (OverflowError, OSError, ValueError):
+        return SEM_OFFSET
+    return int(inicio.total_seconds()) if inicio == fim else SEM_OFFSET
+
+
+def segundos_locais(
+    canonico: "np.ndarray", campos: Dict[str, "np.ndarray"]
+) -> "np.ndarray":
+    """Segundos desde 1970 no relógio do SCS (mesma política de app.timestamps)
+
+    Sem fuso, o texto já é hora local; com fuso, passa por UTC e volta pelo
+    offset do SCS daquela hora. Linhas cuja hora UTC cruza uma troca de offset
+    saem de canonico (vão para o parse por texto).
+    """
+    ano = np.where(canonico, campos["ano"], 1970)
+    mes = np.where(canonico, campos["mes"], 1)
+    dia = np.where(canonico, campos["dia"], 1)
+    datas = (
+        (ano - 1970).astype("datetime64[Y]") + (mes - 1).astype("timedelta64[M]")
+    ).astype("datetime64[D]")
+    segundos = (datas.astype(np.int64) + dia - 1) * 86400 + (
+        campos["hora"] * 3600 + campos["minuto"] * 60 + campos["segundo"]
+    )
+    com_fuso = np.flatnonzero(canonico & campos["aware"])
+    if len(com_fuso):
+        utc = segundos[com_fuso] - campos["offset"][com_fuso]
+        horas_utc, inverso = np.unique(utc // 3600, return_inverse=True)
+        offsets = np.fromiter(
+            map(_offset_local, horas_utc.tolist()), np.int64, len(horas_utc)
+        )[inverso]
+        segundos[com_fuso] = utc + offsets
+        canonico[com_fuso[offsets == SEM_OFFSET]] = False
+    return segundos
+
+
+class ColunasAlertas:
+    """Alertas em colunas; quadras viram ids na ordem da primeira aparição"""
+
+    def __init__(self, alertas: List[Dict[str, Any]], agora: datetime = None):
+        self.total = len(alertas)
+        self.agora = agora or timestamps.agora()
+        self._brutos = [alerta.get("dataHora") for alerta in alertas]
+
+        quadras = [alerta.get("quadra", "") for alerta in alertas]
+        ids = {quadra: i for i, quadra in enumerate(dict.fromkeys(quadras))}
+        self.quadra = np.fromiter(map(ids.__getitem__, quadras), np.int64, self.total)
+        self.quadras = list(ids)
+
+    def _data(self, bruto: Any) -> datetime:
+        return timestamps.parse_datetime(bruto, self.agora)
+
+    def _coluna(self, extrair: Callable[[Any], Any], dtype: Any) -> "np.ndarray":
+        return np.fromiter(
+            map(lambda b: extrair(self._data(b)), self._brutos), dtype, self.total
+        )
+
+    @cached_property
+    def hora(self) -> "np.ndarray":
+        """Hora no relógio do SCS"""
+        iso = campos_iso(self._brutos)
+        if iso is None or not iso[1]:
+            return self._coluna(lambda d: d.hour, np.int64)
+        canonico, campos = iso
+        hora = segundos_locais(canonico, campos) // 3600 % 24
+        # textos fora do formato canônico: parse (e erro) como no loop
+        for i in np.flatnonzero(~canonico).tolist():
+            hora[i] = self._data(self._brutos[i]).hour
+        return hora
+
+    def primeira_aparicao(self, horas: "np.ndarray") -> "np.ndarray":
+        """Índice do primeiro alerta de cada hora pedida"""
+        return np.array([np.argmax(self.hora == h) for h in horas.tolist()], np.int64)
+
+
+def top_k(
+    contagens: "np.ndarray",
+    k: int,
+    chegada: Callable[["np.ndarray"], "np.ndarray"] = None,
+) -> "np.ndarray":
+    """Índices das k maiores contagens; empate vai para quem chegou primeiro
+
+    chegada(candidatos) dá a ordem de chegada dos candidatos; sem ela vale o
+    próprio índice (ids atribuídos na ordem da primeira aparição).
+    """
+    candidatos = np.flatnonzero(contagens)
+    if len(candidatos) > k:
+        maiores = np.argpartition(-contagens[candidatos], k - 1)[:k]
+        limiar = contagens[candidatos[maiores]].min()
+        # todos os empatados no limiar entram antes do desempate
+        candidatos = candidatos[contagens[candidatos] >= limiar]
+    ordem_chegada = chegada(candidatos) if chegada else candidatos
+    ordem = np.lexsort((ordem_chegada, -contagens[candidatos]))
+    return candidatos[ordem[:k]]
+
+
+def protecao_mulher(
+    alertas: List[Dict[str, Any]], agora: datetime = None
+) -> Tuple[List[str], List[Any]]:
+    """horariosCriticos (top 3) e quadrasProblematicas (top 2)"""
+    colunas = ColunasAlertas(alertas, agora)
+    por_hora = np.bincount(colunas.hora, minlength=24)
+    horas = top_k(por_hora, 3, colunas.primeira_aparicao)
+    quadras = top_k(np.bincount(colunas.quadra), 2)
+    return (
+        [f"{h:02d}:00-{h+1:02d}:00" for h in horas.tolist()],
+        [colunas.quadras[q] for q in quadras.tolist()],
+    )
+
+
+def _alertas_sinteticos(total: int, rng: random.Random) -> List[Dict[str, Any]]:
+    inicio = datetime(2024, 12, 1)
+    return [
+        {
+            "tipo": "assedio",
+            "quadra": f"SCS {rng.randint(1, 9)}",
+            "dataHora": (inicio + timedelta(minutes=rng.randrange(43200))).isoformat(),
+        }
+        for _ in range(total)
+    ]
+
+
+def _medir(funcao: Callable[[], Any], repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def benchmark(tamanhos: List[int], repeticoes: int = 3, seed: int = 0) -> List[Dict]:
+    from app.llm import MVPEngine
+
+    if not NUMPY_DISPONIVEL:
+        raise RuntimeError("NumPy não está instalado")
+    engine = MVPEngine()
+    rng = random.Random(seed)
+    linhas = []
+    for total in tamanhos:
+        contexto = {"alertas": _alertas_sinteticos(total, rng), "eventos": []}
+        for prompt in ("analisar_protecao_mulher",):
+            resultados: Dict[str, Dict[str, Any]] = {}
+            tempos = {}
+            for modo, ligado in (("python", False), ("numpy", True)):
+                settings.MVP_VECTORIZED = ligado
+                resultados[modo] = engine.run(prompt, contexto)
+                tempos[modo] = _medir(
+                    lambda: engine.run(prompt, contexto), repeticoes
+                )
+            linhas.append(
+                {
+                    "prompt": prompt,
+                    "alertas": total,
+                    "pythonMs": round(tempos["python"] * 1000, 1),
+                    "numpyMs": round(tempos["numpy"] * 1000, 1),
+                    "ganho": round(tempos["python"] / tempos["numpy"], 2),
+                    "iguais": resultados["python"] == resultados["numpy"],
+                }
+            )
+    return linhas
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    settings.MVP_VECTORIZED_THRESHOLD = 0
+    for linha in benchmark(args.tamanhos, args.repeticoes, args.seed):
+        print(
+            f"{linha['prompt']:<25} {linha['alertas']:>9} alertas  "
+            f"python {linha['pythonMs']:>8} ms  numpy {linha['numpyMs']:>8} ms  "
+            f"x{linha['ganho']:<5} iguais={linha['iguais']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+from app.llm import OllamaClient
+from app.config import settings
+
+
+class ModelWarmer:
+    """Pré-carrega os modelos do Ollama no startup e, se configurado, periodicamente"""
+
+    def __init__(
+        self,
+        client: OllamaClient,
+        models: List[str] = None,
+        retry: float = None,
+        rewarm_interval: Optional[float] = None,
+    ):
+        self.client = client
+        self.models = models or _modelos_configurados(client)
+        self.retry = retry or settings.OLLAMA_WARMUP_RETRY
+        self.rewarm_interval = rewarm_interval or settings.OLLAMA_REWARM_INTERVAL
+        self.pronto = False
+        self.falhas = 0
+        self.modelos: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def warm(self) -> bool:
+        sucesso = True
+        for model in self.models:
+            inicio = time.monotonic()
+            try:
+                data = await self.client.warmup(model)
+            except Exception:
+                self.falhas += 1
+                sucesso = False
+                continue
+            self.modelos[model] = {
+                "loadDurationMs": round(data.get("load_duration", 0) / 1e6, 1),
+                "totalDurationMs": round((time.monotonic() - inicio) * 1000, 1),
+                "aquecidoEm": time.time(),
+            }
+        self.pronto = self.pronto or sucesso
+        return sucesso
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pronto": self.pronto, "falhas": self.falhas, "modelos": self.modelos}
+
+    async def _run(self) -> None:
+        while not await self.warm():
+            await asyncio.sleep(self.retry)
+        while self.rewarm_interval:
+            await asyncio.sleep(self.rewarm_interval)
+            await self.warm()
+
+
+def _modelos_configurados(client: OllamaClient) -> List[str]:
+    modelos = [client.model, *client.router.models(), *settings.OLLAMA_WARMUP_MODELS]
+    return list(dict.fromkeys(modelos))
@@ -1,6 +1,8 @@
+import json
+import httpx
 import pytest
 from datetime import datetime
-from app.models import EventoRequest
+from app.models import AnaliseEvento, EventoRequest, TextoGerado
 from app.services import EventoService
 
 
@@ -83,3 +85,83 @@ async def test_gerar_texto():
     assert len(resultado.texto) > 0
     assert resultado.hashtags is not None
 
+
+@pytest.mark.asyncio
+async def test_cors_expoe_headers_do_scs():
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://scs") as http:
+        response = await http.get("/", headers={"Origin": "http://localhost:5173"})
+
+    expostos = response.headers["access-control-expose-headers"]
+    assert "X-SCS-Refinamento" in expostos
+    assert "X-SCS-Degradado" in expostos
+
+
+def eventos_sse(corpo: str) -> list:
+    """[(evento, dados)] de um corpo text/event-stream"""
+    eventos = []
+    for bloco in corpo.split("\n\n"):
+        if not bloco:
+            continue
+        campos = dict(linha.split(": ", 1) for linha in bloco.split("\n"))
+        eventos.append((campos["event"], json.loads(campos["data"])))
+    return eventos
+
+
+async def post_sse(caminho: str, corpo: dict) -> httpx.Response:
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://scs") as http:
+        return await http.post(caminho, json=corpo)
+
+
+@pytest.mark.asyncio
+async def test_sse_analisar_evento_termina_com_resultado():
+    evento = {
+        "titulo": "Festival de Música",
+        "descricao": "Show ao vivo",
+        "quadra": "SCS 1",
+        "dataHora": "2024-12-20T20:00:00",
+        "tipo": "musical",
+    }
+    response = await post_sse("/api/v1/eventos/analisar/stream", evento)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.endswith("\n\n")
+    eventos = eventos_sse(response.text)
+    assert [nome for nome, _ in eventos] == ["resultado"]
+    AnaliseEvento(**eventos[-1][1])
+
+
+class OllamaEmStream:
+    def is_available(self):
+        return True
+
+    async def generate_stream(self, prompt, context):
+        for token in ('{"texto": ', '"Oi"}'):
+            yield "token", token
+        yield "resultado", {"texto": "Oi", "hashtags": ["#SCS"]}
+
+
+@pytest.mark.asyncio
+async def test_sse_gerar_texto_repassa_tokens_e_resultado(monkeypatch):
+    from app import api
+
+    monkeypatch.setattr(api.comunicacao_service, "ollama", OllamaEmStream())
+    monkeypatch.setattr(api.comunicacao_service, "ollama_stream", OllamaEmStream())
+    response = await post_sse(
+        "/api/v1/textos/gerar/stream?model=ollama",
+        {"tipo": "evento", "contexto": {"titulo": "Show"}},
+    )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    eventos = eventos_sse(response.text)
+    assert eventos[:2] == [("token", '{"texto": '), ("token", '"Oi"}')]
+    nome, resultado = eventos[-1]
+    assert (nome, len(eventos)) == ("resultado", 3)
+    assert TextoGerado(**resultado) == TextoGerado(texto="Oi", hashtags=["#SCS"])
@@ -0,0 +1,143 @@
+import httpx
+import pytest
+from app.breaker import (
+    BreakerProvider,
+    CircuitBreaker,
+    CircuitoAbertoError,
+    FalhaProviderError,
+)
+from app.cache import CachedProvider, ResponseCache
+from app.coalescing import CoalescingProvider
+from app.fake_ollama import FakeOllamaConfig, Latencia, create_app
+from app.llm import OllamaClient
+from app.prefix_cache import PrefixCache
+from app.models import AnaliseEvento, PredicaoRisco
+from app.shadow import ShadowEvaluator
+from app.tuning import tune
+
+
+def cliente_fake(**config) -> OllamaClient:
+    app = create_app(FakeOllamaConfig(seed=7, **config))
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+    cliente = OllamaClient(base_url="http://fake-ollama", client=http)
+    cliente.fake = app.state.fake
+    return cliente
+
+
+@pytest.mark.asyncio
+async def test_fake_responde_tags_generate_e_stream_no_schema_pedido():
+    cliente = cliente_fake(latencia=Latencia("uniforme", 5, 2))
+    cliente.prefixes = PrefixCache()
+
+    assert await cliente.probe() is True
+    resultado = await cliente.generate("prever_risco", {"quadra": "SCS 1"})
+    eventos = [e async for e in cliente.generate_stream("prever_risco", {})]
+
+    PredicaoRisco(**resultado)
+    assert eventos[0][0] == "token"
+    assert eventos[-1][0] == "resultado"
+    assert cliente.json_stats["fallback"] == 0
+    assert cliente.prefixes.stats()["reutilizados"] == 1
+    assert (await cliente.warmup())["load_duration"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_fake_injeta_json_invalido_e_cliente_recorre_ao_mvp():
+    cliente = cliente_fake(taxa_json_invalido=1.0)
+    cliente.prefixes = None
+
+    for _ in range(6):
+        resultado = await cliente.generate("prever_risco", {"quadra": "SCS 1"})
+        PredicaoRisco(**resultado)
+
+    stats = cliente.json_stats
+    assert cliente.fake.contadores["jsonInvalido"] == 6
+    assert stats["ok"] == 0
+    assert stats["fallback"] > 0
+
+
+@pytest.mark.asyncio
+async def test_fake_com_erros_abre_o_circuito():
+    cliente = cliente_fake(taxa_erro=1.0)
+    cliente.prefixes = None
+    breaker = CircuitBreaker(min_calls=3, error_rate=0.5, open_seconds=60)
+    provider = BreakerProvider(cliente, breaker)
+
+    for _ in range(3):
+        with pytest.raises(FalhaProviderError):
+            await provider.generate("prever_risco", {})
+    with pytest.raises(CircuitoAbertoError):
+        await provider.generate("prever_risco", {})
+
+
+@pytest.mark.asyncio
+async def test_shadow_nao_conta_fallback_do_mvp_como_concordancia():
+    cliente = cliente_fake(taxa_json_invalido=1.0)
+    cliente.prefixes = None
+    cliente._available = True
+    shadow = ShadowEvaluator(cliente, sample_rate=1.0)
+    mvp = await cliente.fallback.generate("prever_risco", {"quadra": "SCS 1"})
+
+    for _ in range(4):
+        await shadow.evaluate("prever_risco", {"quadra": "SCS 1"}, mvp)
+
+    stats = shadow.stats()["prompts"]["prever_risco"]
+    assert stats["amostras"] == 4
+    assert stats["identicas"] == 0
+    assert stats["invalidas"] == 4
+    assert cliente.json_stats["fallback"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fake_responde_todos_os_prompts_e_erro_vira_500():
+    cliente = cliente_fake()
+    cliente.prefixes = None
+
+    resultado = await cliente.generate("analisar_evento", {"evento": {}})
+    AnaliseEvento(**resultado)
+    assert cliente.json_stats["fallback"] == 0
+
+    async def quebra(formato):
+        raise RuntimeError("bug")
+
+    cliente.fake.resposta = quebra
+    with pytest.raises(httpx.HTTPStatusError):
+        payload = await cliente._payload("prever_risco", {})
+        [t async for t in cliente._stream_tokens("prever_risco", payload)]
+
+
+@pytest.mark.asyncio
+async def test_tuning_no_fake_rejeita_saida_cortada_e_amostra_invalida():
+    cliente = cliente_fake()
+    candidatos = {
+        "gerar_texto": {
+            "candidatos": [
+                {"model": "llama3", "options": {"num_predict": 3}},
+                {"model": "llama3"},
+            ]
+        },
+        "analisar_evento": {"candidatos": [{"model": "llama3"}]},
+    }
+
+    resultado = await tune(cliente, candidatos, repeticoes=1)
+
+    cortado, inteiro = resultado["gerar_texto"]["medicoes"]
+    assert (cortado["validas"], inteiro["validas"]) == (0, 1)
+    assert "options" not in resultado["gerar_texto"]["vencedor"]
+    evento = resultado["analisar_evento"]
+    assert evento["vencedor"] is None
+    assert evento["medicoes"][0]["erros"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_do_ollama_nao_guarda_resposta_do_mvp():
+    cliente = cliente_fake(taxa_json_invalido=1.0)
+    cliente.prefixes = None
+    provider = CachedProvider(CoalescingProvider(cliente), ResponseCache(), "ollama")
+
+    for _ in range(2):
+        resultado = await provider.generate("prever_risco", {"quadra": "SCS 1"})
+        PredicaoRisco(**resultado)
+
+    assert cliente.fake.contadores["generate"] == 2
+    assert provider.cache.stats()["entradas"] == 0
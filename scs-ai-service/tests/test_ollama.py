@@ -0,0 +1,324 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.llm import OllamaClient
+from app.monitor import HealthMonitor
+from app.prefix_cache import PrefixCache
+from app.request_state import begin_request, end_request
+from app.routing import ModelRouter
+from app.telemetry import OllamaMetrics, OrcamentoTokensError, TokenBudgetProvider
+from app.tuning import tune
+from app.warmup import ModelWarmer
+
+
+def criar_cliente(handler) -> OllamaClient:
+    transport = httpx.MockTransport(handler)
+    return OllamaClient(
+        base_url="http://ollama", client=httpx.AsyncClient(transport=transport)
+    )
+
+
+@pytest.mark.asyncio
+async def test_is_available_le_estado_da_ultima_sonda():
+    cliente = criar_cliente(lambda request: httpx.Response(200, json={}))
+
+    assert cliente.is_available() is False
+    assert await cliente.probe() is True
+    assert cliente.is_available() is True
+
+
+@pytest.mark.asyncio
+async def test_monitor_aplica_backoff_apos_falhas():
+    cliente = criar_cliente(lambda request: httpx.Response(500))
+    monitor = HealthMonitor(cliente, interval=1.0, max_backoff=8.0, jitter=0.0)
+
+    for _ in range(5):
+        await monitor.check()
+
+    assert cliente.is_available() is False
+    assert monitor.falhas_consecutivas == 5
+    assert monitor.next_delay() == 8.0
+
+    monitor.falhas_consecutivas = 5000
+    assert monitor.next_delay() == 8.0
+
+
+@pytest.mark.asyncio
+async def test_monitor_sobrevive_a_erro_na_sonda():
+    cliente = criar_cliente(lambda request: httpx.Response(200, json={}))
+    monitor = HealthMonitor(cliente, interval=0.001, max_backoff=0.001, jitter=0.0)
+    chamadas = []
+
+    async def check():
+        chamadas.append(1)
+        if len(chamadas) == 1:
+            raise RuntimeError("bug")
+        return True
+
+    monitor.check = check
+    monitor.start()
+    while len(chamadas) < 3:
+        await asyncio.sleep(0.001)
+    await monitor.stop()
+
+    assert monitor.stats()["erros"] == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_stream_repassa_tokens_e_resultado():
+    linhas = [
+        {"response": '{"texto": "Show', "done": False},
+        {"response": ' hoje", "hashtags": []}', "done": False},
+        {"response": "", "done": True},
+    ]
+    corpo = "\n".join(json.dumps(linha) for linha in linhas)
+    cliente = criar_cliente(lambda request: httpx.Response(200, text=corpo))
+
+    eventos = [
+        evento async for evento in cliente.generate_stream("gerar_texto", {})
+    ]
+
+    assert eventos[:2] == [
+        ("token", '{"texto": "Show'),
+        ("token", ' hoje", "hashtags": []}'),
+    ]
+    assert eventos[-1] == ("resultado", {"texto": "Show hoje", "hashtags": []})
+
+
+def resposta_ndjson(*tokens: str) -> str:
+    linhas = [{"response": token, "done": False} for token in tokens]
+    linhas.append({"response": "", "done": True, "done_reason": "stop"})
+    return "\n".join(json.dumps(linha) for linha in linhas)
+
+
+@pytest.mark.asyncio
+async def test_generate_envia_schema_e_para_quando_o_json_fecha():
+    enviados = []
+
+    def handler(request):
+        enviados.append(json.loads(request.content))
+        corpo = resposta_ndjson('{"texto": "Oi"}', " texto extra")
+        return httpx.Response(200, text=corpo)
+
+    cliente = criar_cliente(handler)
+    resultado = await cliente.generate("gerar_texto", {"contexto": {}})
+
+    assert resultado == {"texto": "Oi"}
+    assert enviados[-1]["format"]["required"] == ["texto"]
+    assert cliente.json_stats["paradasAntecipadas"] == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_repara_json_truncado_e_completa_com_mvp():
+    corpo = resposta_ndjson('{"risco": "alto", "fatores": ["Evento gran')
+    cliente = criar_cliente(lambda request: httpx.Response(200, text=corpo))
+
+    resultado = await cliente.generate(
+        "prever_risco", {"quadra": "SCS 3", "eventosAtivos": []}
+    )
+
+    assert resultado["risco"] == "alto"
+    assert resultado["fatores"] == ["Evento gran"]
+    assert resultado["recomendacoes"] == []
+    assert cliente.json_stats["reparadas"] == 1
+    assert cliente.json_stats["completadas"] == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_conta_fallback_quando_resposta_nao_e_json():
+    corpo = resposta_ndjson("Desculpe, não entendi.")
+    cliente = criar_cliente(lambda request: httpx.Response(200, text=corpo))
+
+    resultado = await cliente.generate("prever_risco", {"quadra": "SCS 1"})
+
+    assert resultado["risco"] == "medio"
+    assert cliente.json_stats["fallback"] == 1
+
+
+@pytest.mark.asyncio
+async def test_prefixo_preparado_uma_vez_e_reaproveitado_via_context():
+    enviados = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        enviados.append(payload)
+        if not payload["stream"]:
+            corpo = {"context": [1, 2, 3, 9], "eval_count": 1}
+            return httpx.Response(200, json=corpo)
+        return httpx.Response(200, text=resposta_ndjson('{"texto": "Oi"}'))
+
+    cliente = criar_cliente(handler)
+    cliente.prefixes = PrefixCache()
+    for titulo in ("Show", "Feira"):
+        await cliente.generate("gerar_texto", {"contexto": {"titulo": titulo}})
+
+    preparo, *geracoes = enviados
+    contexto = {"contexto": {"titulo": "Feira"}}
+    compilado = cliente.prompts.compile("gerar_texto", contexto)
+    assert preparo["prompt"] == compilado.prefixo
+    assert len(geracoes) == 2
+    assert geracoes[-1]["context"] == [1, 2, 3]
+    assert geracoes[-1]["prompt"] == compilado.sufixo
+    assert cliente.prefixes.stats()["reutilizados"] == 1
+
+    cliente.model = "phi3"
+    await cliente.generate("gerar_texto", {"contexto": {}})
+    assert enviados[-2]["stream"] is False
+    assert cliente.prefixes.invalidados == 1
+
+
+@pytest.mark.asyncio
+async def test_rota_define_modelo_e_opcoes_por_prompt():
+    enviados = []
+
+    def handler(request):
+        enviados.append(json.loads(request.content))
+        return httpx.Response(200, text=resposta_ndjson('{"texto": "Oi"}'))
+
+    cliente = criar_cliente(handler)
+    cliente.prefixes = None
+    cliente.router = ModelRouter(
+        {"gerar_texto": {"model": "phi3", "options": {"num_predict": 64, "x": 1}}}
+    )
+    await cliente.generate("gerar_texto", {"contexto": {}})
+    await cliente.generate("prever_risco", {"quadra": "SCS 1"})
+
+    assert enviados[0]["model"] == "phi3"
+    assert enviados[0]["options"] == {"num_predict": 64}
+    assert enviados[1]["model"] == cliente.model
+    assert "options" not in enviados[1]
+
+
+@pytest.mark.asyncio
+async def test_tuning_escolhe_o_mais_rapido_com_saida_valida():
+    atrasos = {"rapido": 0.0, "medio": 0.02, "lento": 0.05}
+
+    async def handler(request):
+        model = json.loads(request.content)["model"]
+        await asyncio.sleep(atrasos[model])
+        texto = "sem json" if model == "rapido" else '{"texto": "Oi"}'
+        return httpx.Response(200, text=resposta_ndjson(texto))
+
+    candidatos = {
+        "gerar_texto": {
+            "candidatos": [{"model": m} for m in ("lento", "rapido", "medio")]
+        }
+    }
+    resultado = await tune(criar_cliente(handler), candidatos, repeticoes=2)
+
+    assert resultado["gerar_texto"]["vencedor"]["model"] == "medio"
+    assert [m["validas"] for m in resultado["gerar_texto"]["medicoes"]] == [2, 0, 2]
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_pede_array_e_devolve_none_para_item_invalido():
+    enviados = []
+
+    def handler(request):
+        enviados.append(json.loads(request.content))
+        itens = '[{"texto": "Show"}, {"hashtags": []}, {"texto": "Feira"}]'
+        return httpx.Response(200, text=resposta_ndjson(itens))
+
+    cliente = criar_cliente(handler)
+    cliente.prefixes = None
+    contextos = [{"contexto": {"titulo": t}} for t in ("Show", "Samba", "Feira")]
+    resultados = await cliente.generate_batch("gerar_texto", contextos)
+
+    assert resultados == [{"texto": "Show"}, None, {"texto": "Feira"}]
+    assert enviados[0]["format"]["type"] == "array"
+    assert enviados[0]["format"]["minItems"] == 3
+    assert "Item 3:" in enviados[0]["prompt"]
+    assert cliente.json_stats["itensLoteInvalidos"] == 1
+
+
+@pytest.mark.asyncio
+async def test_metricas_do_ollama_e_orcamento_de_tokens_por_endpoint():
+    final = {
+        "done": True,
+        "total_duration": 1_200_000_000,
+        "load_duration": 5_000_000,
+        "prompt_eval_count": 40,
+        "prompt_eval_duration": 200_000_000,
+        "eval_count": 20,
+        "eval_duration": 800_000_000,
+    }
+    linhas = [{"response": "Oi", "done": False}, final]
+    corpo = "\n".join(json.dumps(linha) for linha in linhas)
+    cliente = criar_cliente(lambda request: httpx.Response(200, text=corpo))
+    cliente.prefixes = None
+    metricas = OllamaMetrics(budgets={"/api/v1/textos/gerar": 100}, window=60)
+    cliente.metrics = metricas
+    provider = TokenBudgetProvider(cliente, metricas)
+    token = begin_request("/api/v1/textos/gerar")
+
+    try:
+        await provider.generate("gerar_texto", {"contexto": {}})
+        await provider.generate("gerar_texto", {"contexto": {}})
+        with pytest.raises(OrcamentoTokensError):
+            await provider.generate("gerar_texto", {"contexto": {}})
+    finally:
+        end_request(token)
+
+    stats = metricas.stats()
+    serie = stats["prompts"]["gerar_texto"]
+    assert (serie["chamadas"], serie["eval_count"]) == (2, 40)
+    assert serie["tokensPorSegundo"] == 25.0
+    assert serie["duracoesMs"]["total_duration"]["buckets"]["2500"] == 2
+    assert stats["endpoints"]["/api/v1/textos/gerar"]["prompt_eval_count"] == 80
+    assert stats["orcamentos"]["/api/v1/textos/gerar"]["rejeitadas"] == 1
+
+
+@pytest.mark.asyncio
+async def test_json_completo_ainda_le_o_chunk_final_com_as_metricas():
+    final = {"done": True, "total_duration": 900_000_000, "eval_count": 7}
+    linhas = [
+        {"response": '{"texto": "Oi"}', "done": False},
+        {"response": " extra", "done": False},
+        final,
+    ]
+    corpo = "\n".join(json.dumps(linha) for linha in linhas)
+    cliente = criar_cliente(lambda request: httpx.Response(200, text=corpo))
+    cliente.prefixes = None
+    cliente.metrics = metricas = OllamaMetrics()
+
+    resultado = await cliente.generate("gerar_texto", {"contexto": {}})
+
+    serie = metricas.stats()["prompts"]["gerar_texto"]
+    assert resultado == {"texto": "Oi"}
+    assert cliente.json_stats["paradasAntecipadas"] == 1
+    assert (serie["semMetricas"], serie["eval_count"]) == (0, 7)
+    assert serie["duracoesMs"]["total_duration"]["buckets"]["1000"] == 1
+
+
+@pytest.mark.asyncio
+async def test_warmup_carrega_modelos_com_keep_alive():
+    enviados = []
+
+    def handler(request):
+        enviados.append(json.loads(request.content))
+        return httpx.Response(200, json={"done": True, "load_duration": 2_500_000})
+
+    warmer = ModelWarmer(criar_cliente(handler), models=["llama3", "phi3"])
+
+    assert await warmer.warm() is True
+    assert warmer.pronto is True
+    assert [e["model"] for e in enviados] == ["llama3", "phi3"]
+    assert all(e["keep_alive"] for e in enviados)
+    assert warmer.stats()["modelos"]["phi3"]["loadDurationMs"] == 2.5
+
+
+@pytest.mark.asyncio
+async def test_warmup_falho_mantem_servico_nao_pronto():
+    warmer = ModelWarmer(criar_cliente(lambda request: httpx.Response(500)))
+
+    assert await warmer.warm() is False
+    assert warmer.pronto is False
+    assert warmer.falhas == 1
+
+
+def test_rewarm_interval_vazio_no_env_vale_none(monkeypatch):
+    from app.config import Settings
+
+    monkeypatch.setenv("OLLAMA_REWARM_INTERVAL", "")
+    assert Settings().OLLAMA_REWARM_INTERVAL is None
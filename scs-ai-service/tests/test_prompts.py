@@ -0,0 +1,59 @@
+from app.prompts import TEMPLATES, PromptCompiler, estimar_tokens
+
+
+def alertas(n: int) -> list:
+    return [
+        {
+            "quadra": f"SCS {i % 6}",
+            "tipo": "assedio",
+            "dataHora": f"2024-12-20T{i % 24:02d}:00:00",
+        }
+        for i in range(n)
+    ]
+
+
+def test_todo_prompt_do_mvp_tem_template():
+    prompts = {
+        "analisar_evento",
+        "analisar_seguranca",
+        "prever_risco",
+        "analisar_protecao_mulher",
+        "priorizar_acessibilidade",
+        "recomendacoes_gestao",
+        "gerar_texto",
+        "otimizar_comunicacao",
+        "agora_no_scs",
+        "prever_movimento",
+        "orquestrar_agentes",
+        "prever_sucesso_evento",
+    }
+    assert prompts <= set(TEMPLATES)
+
+
+def test_listas_grandes_viram_agregados():
+    compilador = PromptCompiler(default_budget=1024)
+
+    compilado = compilador.compile(
+        "analisar_protecao_mulher",
+        {"alertas": alertas(20000), "eventos": [], "bares": []},
+    )
+
+    assert '"total":20000' in compilado.sufixo
+    assert '"22h":833' in compilado.sufixo
+    assert compilado.tokens == estimar_tokens(compilado.texto)
+    assert compilado.tokens <= 1024
+
+
+def test_orcamento_apertado_compacta_e_depois_trunca():
+    necessidades = [
+        {"tipo": "rampa", "quadra": "SCS 1", "prioridade": "alta", "frequencia": 3}
+    ] * 100
+    compilador = PromptCompiler(budgets={"priorizar_acessibilidade": 150})
+
+    compilado = compilador.compile(
+        "priorizar_acessibilidade", {"necessidades": necessidades}
+    )
+
+    assert compilado.compactado
+    assert compilado.tokens <= 151
+    assert compilador.stats()["priorizar_acessibilidade"]["compactados"] == 1
@@ -0,0 +1,575 @@
+import asyncio
+import time
+import pytest
+from datetime import datetime
+from app.llm import LLMProvider
+from app.adaptive import AdaptiveLimit
+from app.batching import BatchingProvider
+from app.breaker import (
+    BreakerProvider,
+    CircuitBreaker,
+    CircuitoAbertoError,
+    FalhaProviderError,
+)
+from app.cache import CachedProvider, ResponseCache
+from app.coalescing import CoalescingProvider
+from app.llm import MVPEngine, ProviderIndisponivelError
+from app.models import EventoRequest
+from app.offload import MVPOffloader
+from app.pool import OllamaPool
+from app.refinement import RefinementJobs
+from app.registry import (
+    BATCHABLE,
+    CHEAP,
+    PromptDesconhecidoError,
+    analisadores,
+)
+from app.request_state import begin_request, current_request, end_request
+from app.scheduler import FilaCheiaError, PriorityScheduler, ScheduledProvider
+from app.services import EventoService
+from app.shadow import ShadowEvaluator
+from app.timestamps import FUSO
+
+
+class ProviderLento(LLMProvider):
+    def __init__(self, atraso: float = 0.01):
+        self.atraso = atraso
+        self.chamadas = 0
+
+    def is_available(self) -> bool:
+        return True
+
+    async def generate(self, prompt, context):
+        self.chamadas += 1
+        await asyncio.sleep(self.atraso)
+        return {"prompt": prompt, "itens": list(context.get("itens", []))}
+
+
+@pytest.mark.asyncio
+async def test_coalescing_compartilha_geracoes_identicas():
+    base = ProviderLento()
+    provider = CoalescingProvider(base)
+
+    contexto = {"itens": [1, 2], "a": 1}
+    resultados = await asyncio.gather(
+        *[provider.generate("gerar_texto", contexto) for _ in range(5)],
+        provider.generate("gerar_texto", {"a": 1, "itens": [1, 2]}),
+        provider.generate("gerar_texto", {"itens": [3]}),
+    )
+
+    assert base.chamadas == 2
+    assert provider.stats()["coalescidas"] == 5
+    assert resultados[0] == resultados[5]
+    assert resultados[0] is not resultados[1]
+
+
+@pytest.mark.asyncio
+async def test_cache_evita_nova_geracao_e_conta_evictions():
+    base = ProviderLento(atraso=0)
+    provider = CachedProvider(base, ResponseCache(max_entries=2), "teste")
+
+    await provider.generate("gerar_texto", {"itens": [1]})
+    await provider.generate("gerar_texto", {"itens": [1]})
+    await provider.generate("gerar_texto", {"itens": [2]})
+    await provider.generate("gerar_texto", {"itens": [3]})
+
+    assert base.chamadas == 3
+    assert provider.cache.stats()["hits"] == 1
+    assert provider.cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_ttl_zero_desliga_cache_do_prompt():
+    base = ProviderLento(atraso=0)
+    cache = ResponseCache(ttls={"agora_no_scs": 0})
+    provider = CachedProvider(base, cache, "teste")
+
+    await provider.generate("agora_no_scs", {})
+    await provider.generate("agora_no_scs", {})
+
+    assert base.chamadas == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_sqlite_sobrevive_a_reinicio(tmp_path):
+    caminho = str(tmp_path / "cache.db")
+    primeiro = ResponseCache(sqlite_path=caminho)
+    await CachedProvider(ProviderLento(0), primeiro, "teste").generate(
+        "gerar_texto", {"itens": [1]}
+    )
+    primeiro.close()
+
+    base = ProviderLento(atraso=0)
+    segundo = ResponseCache(sqlite_path=caminho)
+    resultado = await CachedProvider(base, segundo, "teste").generate(
+        "gerar_texto", {"itens": [1]}
+    )
+
+    assert base.chamadas == 0
+    assert resultado == {"prompt": "gerar_texto", "itens": [1]}
+    assert segundo.stats()["hitsDisco"] == 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_atende_seguranca_antes_de_marketing():
+    scheduler = PriorityScheduler(max_concurrency=1)
+    ordem = []
+
+    async def gerar(prompt):
+        async with scheduler.slot(prompt):
+            ordem.append(prompt)
+            await asyncio.sleep(0.01)
+
+    primeira = asyncio.create_task(gerar("analisar_evento"))
+    await asyncio.sleep(0)
+    await asyncio.gather(primeira, gerar("gerar_texto"), gerar("prever_risco"))
+
+    assert ordem == ["analisar_evento", "prever_risco", "gerar_texto"]
+    assert scheduler.stats()["classes"]["marketing"]["esperaMaxMs"] > 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_rejeita_quando_fila_da_classe_esta_cheia():
+    scheduler = PriorityScheduler(
+        max_concurrency=1, queue_limits={"marketing": 1, "seguranca": 1}
+    )
+
+    async def gerar(prompt):
+        async with scheduler.slot(prompt):
+            await asyncio.sleep(0.01)
+
+    resultados = await asyncio.gather(
+        *[gerar("gerar_texto") for _ in range(3)], return_exceptions=True
+    )
+
+    assert isinstance(resultados[2], FilaCheiaError)
+    assert scheduler.stats()["classes"]["marketing"]["rejeitadas"] == 1
+    assert scheduler.ativos == 0
+
+
+@pytest.mark.asyncio
+async def test_deadline_estourado_responde_com_mvp_degradado():
+    service = EventoService()
+    service.ollama = ProviderLento(atraso=1.0)
+    token = begin_request()
+    current_request().deadline_ms = 20
+    evento = EventoRequest(
+        titulo="Show",
+        descricao="Show ao vivo",
+        quadra="SCS 1",
+        dataHora=datetime(2024, 12, 20, 20, 0, 0),
+        tipo="musical",
+    )
+
+    try:
+        resultado = await service.analisar(evento, model="ollama")
+        degradado = current_request().degradado
+    finally:
+        end_request(token)
+
+    assert resultado.nivelDestaque == "alto"
+    assert degradado == "deadline"
+
+
+@pytest.mark.asyncio
+async def test_refinar_responde_mvp_e_entrega_ollama_depois():
+    service = EventoService()
+    service.ollama = ProviderLento(atraso=0.02)
+    service.refinamentos = RefinementJobs()
+    token = begin_request()
+    current_request().refinar = True
+    evento = EventoRequest(
+        titulo="Show",
+        descricao="Show ao vivo",
+        quadra="SCS 1",
+        dataHora=datetime(2024, 12, 20, 20, 0, 0),
+        tipo="musical",
+    )
+
+    try:
+        resultado = await service.analisar(evento, model="ollama")
+        job = service.refinamentos.get(current_request().refinamento)
+    finally:
+        end_request(token)
+
+    assert resultado.nivelDestaque == "alto"
+    assert (job.status, job.revisao) == ("pendente", 0)
+
+    eventos = [evento async for evento in service.refinamentos.watch(job)]
+
+    assert [dados["revisao"] for _, dados in eventos] == [0, 1]
+    assert job.status == "refinado"
+    assert job.resultado["prompt"] == "analisar_evento"
+
+
+def test_current_request_fora_de_requisicao_nao_guarda_estado():
+    current_request().deadline_ms = 20
+
+    estado = current_request()
+
+    assert estado.deadline_ms is None
+    assert not estado.http
+
+
+class ProviderComFalha(ProviderLento):
+    async def generate(self, prompt, context):
+        self.chamadas += 1
+        raise RuntimeError("ollama reiniciando")
+
+
+@pytest.mark.asyncio
+async def test_breaker_abre_apos_falhas_e_fecha_apos_teste():
+    breaker = CircuitBreaker(min_calls=3, error_rate=0.5, open_seconds=0.05)
+    base = ProviderComFalha()
+    provider = BreakerProvider(base, breaker)
+
+    for _ in range(3):
+        with pytest.raises(FalhaProviderError):
+            await provider.generate("prever_risco", {})
+    with pytest.raises(CircuitoAbertoError):
+        await provider.generate("prever_risco", {})
+
+    assert breaker.estado == "open"
+    assert base.chamadas == 3
+
+    await asyncio.sleep(0.06)
+    provider.provider = ProviderLento(atraso=0)
+    await provider.generate("prever_risco", {})
+
+    assert breaker.estado == "closed"
+    assert [t["para"] for t in breaker.stats()["transicoes"]] == [
+        "open",
+        "half_open",
+        "closed",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pool_roteia_pelo_menor_numero_em_andamento_e_ejeta_falhas():
+    a, b = ProviderLento(atraso=0.02), ProviderLento(atraso=0.02)
+    a.base_url, b.base_url = "http://ollama-a", "http://ollama-b"
+    pool = OllamaPool([a, b])
+
+    await asyncio.gather(*[pool.generate("gerar_texto", {}) for _ in range(4)])
+    assert a.chamadas == b.chamadas == 2
+
+    quebrado = ProviderComFalha()
+    quebrado.base_url = "http://ollama-a"
+    pool.backends[0].client = quebrado
+    pool.backends[1].latencia_ewma = 10.0  # força a escolha do backend quebrado
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            await pool.generate("gerar_texto", {})
+
+    assert pool.stats()["backends"][0]["foraDeRotacao"]
+    await pool.generate("gerar_texto", {})
+    assert b.chamadas == 3
+
+    pool.backends[1].fora_ate = float("inf")
+    with pytest.raises(ProviderIndisponivelError):
+        await pool.generate("gerar_texto", {})
+
+
+@pytest.mark.asyncio
+async def test_shadow_compara_amostras_e_descarta_com_fila_cheia():
+    shadow = ShadowEvaluator(ProviderLento(), sample_rate=1.0, queue_size=1)
+    shadow.start()
+
+    mvp = [{"prompt": "gerar_texto", "itens": itens} for itens in ([1], [2], [3])]
+    aceitas = [shadow.offer("gerar_texto", {"itens": [1]}, r) for r in mvp]
+    await shadow._fila.join()
+    await shadow.stop()
+
+    assert aceitas == [True, False, False]
+    stats = shadow.stats()
+    assert stats["descartadas"] == 2
+    assert stats["prompts"]["gerar_texto"]["amostras"] == 1
+    assert stats["prompts"]["gerar_texto"]["concordanciaMedia"] == 1.0
+    assert await shadow.evaluate("gerar_texto", {}, {"prompt": "x", "itens": []}) == 0.5
+
+
+class ProviderEmLote(ProviderLento):
+    def __init__(self):
+        super().__init__(atraso=0)
+        self.lotes = []
+
+    async def generate_batch(self, prompt, contexts):
+        self.lotes.append(len(contexts))
+        # o segundo item "não parseia" e precisa ser gerado individualmente
+        return [
+            None if i == 1 else {"prompt": prompt, "itens": c["itens"]}
+            for i, c in enumerate(contexts)
+        ]
+
+
+@pytest.mark.asyncio
+async def test_batching_agrupa_janela_e_gera_individualmente_o_que_falhou():
+    base = ProviderEmLote()
+    provider = BatchingProvider(base, prompts=["gerar_texto"], max_size=3, window_ms=5)
+
+    resultados = await asyncio.gather(
+        *[provider.generate("gerar_texto", {"itens": [i]}) for i in range(4)],
+        provider.generate("prever_risco", {"itens": []}),
+    )
+
+    assert [r["itens"] for r in resultados[:4]] == [[0], [1], [2], [3]]
+    assert base.lotes == [3]  # o quarto ficou sozinho na janela seguinte
+    assert base.chamadas == 3  # item 1 do lote, item 3 sozinho e prever_risco
+    assert provider.stats()["individuais"] == 2
+
+
+def test_limite_adaptativo_cresce_com_latencia_estavel_e_corta_com_fila():
+    adaptive = AdaptiveLimit(min_limit=1, max_limit=6, tolerance=2.0, backoff=0.5)
+    limite = 2
+    for _ in range(20):
+        limite = adaptive.update(0.1, ativos=limite, limite=limite)
+    assert limite == 6
+
+    for _ in range(20):
+        limite = adaptive.update(1.0, ativos=limite, limite=limite)
+    assert limite < 6
+    assert adaptive.stats()["reducoes"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_libera_fila_quando_o_limite_cresce():
+    scheduler = PriorityScheduler(max_concurrency=1, queue_limits={"operacional": 4})
+    liberado = asyncio.Event()
+
+    async def ocupar():
+        async with scheduler.slot("analisar_evento"):
+            await liberado.wait()
+
+    tarefas = [asyncio.create_task(ocupar()) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert scheduler.ativos == 1
+
+    scheduler.set_limit(3)
+    assert scheduler.ativos == 3
+    assert scheduler.stats()["classes"]["operacional"]["fila"] == 0
+
+    liberado.set()
+    await asyncio.gather(*tarefas)
+    assert scheduler.ativos == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("modo", ["thread", "process"])
+async def test_mvp_delega_entradas_grandes_ao_pool(modo):
+    offload = MVPOffloader(mode=modo, max_workers=2, threshold=100)
+    engine = MVPEngine(offload=offload)
+    alertas = [
+        {"tipo": "violencia", "quadra": f"SCS {i % 6}", "dataHora": "2024-12-20T23:00"}
+        for i in range(300)
+    ]
+    contexto = {"alertas": alertas, "eventos": [], "bares": []}
+
+    try:
+        grande = await engine.generate("analisar_protecao_mulher", contexto)
+        pequeno = await engine.generate("analisar_protecao_mulher", {"alertas": []})
+        # "cheap" no registro: fica no event loop mesmo com lista grande
+        await engine.generate("prever_risco", {"eventosAtivos": alertas})
+    finally:
+        offload.close()
+
+    assert grande == MVPEngine().run("analisar_protecao_mulher", contexto)
+    assert pequeno["risco"] == "baixo"
+    stats = offload.stats()
+    assert (stats["delegadas"], stats["inline"], stats["emAndamento"]) == (1, 2, 0)
+
+
+def test_breaker_ignora_resultado_de_chamada_de_geracao_anterior():
+    breaker = CircuitBreaker(
+        min_calls=2, error_rate=0.5, open_seconds=0.01, half_open_calls=1
+    )
+    antiga = breaker.before_call()
+    for _ in range(2):
+        breaker.record(False, 0.0, breaker.before_call())
+    assert breaker.estado == "open"
+
+    time.sleep(0.02)
+    teste = breaker.before_call()
+    breaker.record(True, 0.0, antiga)
+    breaker.release(antiga)
+    assert breaker.estado == "half_open"
+    with pytest.raises(CircuitoAbertoError):
+        breaker.before_call()
+
+    breaker.record(True, 0.0, teste)
+    assert breaker.estado == "closed"
+
+
+@pytest.mark.asyncio
+async def test_espera_na_fila_nao_conta_como_chamada_lenta():
+    breaker = CircuitBreaker(min_calls=2, slow_call_ms=30, slow_rate=0.5)
+    provider = ScheduledProvider(
+        BreakerProvider(ProviderLento(0.02), breaker),
+        PriorityScheduler(max_concurrency=1),
+    )
+
+    await asyncio.gather(*[provider.generate("prever_risco", {}) for _ in range(4)])
+
+    assert breaker.estado == "closed"
+    assert breaker.stats()["taxaLentas"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_entrada_do_offload_pula_chave_de_cache_e_coalescing():
+    offload = MVPOffloader(mode="thread", max_workers=1, threshold=10)
+    base = ProviderLento(0)
+    coalescing = CoalescingProvider(base, pular=offload.grande)
+    provider = CachedProvider(coalescing, ResponseCache(), "mvp", pular=offload.grande)
+
+    await provider.generate("analisar_protecao_mulher", {"alertas": [{}] * 10})
+    await provider.generate("analisar_protecao_mulher", {"alertas": [{}] * 10})
+    await provider.generate("analisar_protecao_mulher", {"alertas": [{}]})
+
+    assert base.chamadas == 3
+    assert coalescing.stats()["executadas"] == 1
+    assert provider.cache.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize(
+    "datas",
+    [
+        ["2024-12-20T23:00:00Z", "2024-12-21T01:15:00.000Z", "2024-12-20T22:10"],
+        ["2024-12-20 22:00:00", "2024-02-29T03:00:00-03:00", "2024-12-20"],
+        ["2024-12-20T23:00:00+0300", datetime(2024, 12, 20, 4), None],
+        # horário de verão de 2018/19: troca de offset dentro da hora UTC
+        ["2018-11-04T02:30:00Z", "2018-11-04T03:30:00Z", "2019-02-17T01:59:59Z"],
+        ["2019-02-17T02:30:00-01:00", "2018-11-04T00:30:00", "1914-01-01T03:30Z"],
+    ],
+)
+def test_protecao_mulher_vetorizada_igual_ao_loop(monkeypatch, datas):
+    pytest.importorskip("numpy")
+    from app.config import settings
+
+    # empates de hora e de quadra: o desempate é a ordem de chegada
+    alertas = [
+        {"quadra": f"SCS {(i * 7) % 5}", "dataHora": datas[i % len(datas)]}
+        for i in range(40)
+    ] + [{"tipo": "sem quadra", "dataHora": datas[0]}]
+    contexto = {"alertas": alertas, "bares": []}
+    # alertas sem data usam o "agora" da requisição, igual nos dois caminhos
+    token = begin_request(agora=datetime(2024, 12, 20, 20, 30, tzinfo=FUSO))
+    try:
+        monkeypatch.setattr(settings, "MVP_VECTORIZED", False)
+        esperado = MVPEngine().run("analisar_protecao_mulher", contexto)
+        monkeypatch.setattr(settings, "MVP_VECTORIZED", True)
+        monkeypatch.setattr(settings, "MVP_VECTORIZED_THRESHOLD", 1)
+        assert MVPEngine().run("analisar_protecao_mulher", contexto) == esperado
+    finally:
+        end_request(token)
+
+
+def test_colunas_alertas_validam_como_fromisoformat():
+    pytest.importorskip("numpy")
+    from app.vectorized import ColunasAlertas
+
+    colunas = ColunasAlertas(
+        [{"dataHora": "2024-12-20T23:00:00Z"}, {"dataHora": "2023-03-05T10:00Z"}]
+    )
+    # horas no fuso do SCS (UTC-3)
+    assert colunas.hora.tolist() == [20, 7]
+    for invalida in ("2023-02-29T10:00:00", "2024-12-20T24:00:00", "amanhã"):
+        with pytest.raises(ValueError):
+            ColunasAlertas([{"dataHora": invalida}] * 3).hora
+
+
+
+def test_timestamps_convertem_para_o_fuso_do_scs():
+    from app.timestamps import parse_datetime, parse_lote
+
+    local = parse_datetime("2024-12-20T23:00:00Z")
+    assert (local.hour, local.utcoffset().total_seconds()) == (20, -3 * 3600)
+    assert parse_datetime(datetime(2024, 12, 20, 22)).tzinfo is FUSO
+    assert parse_datetime(None, "padrao") == "padrao"
+    datas = parse_lote(["2024-12-20T22:00", None, "2024-12-20T22:00"], local)
+    assert datas[1] is local and datas[0] is datas[2]
+    with pytest.raises(ValueError):
+        parse_datetime("20/12/2024")
+
+
+def test_agora_unico_por_requisicao():
+    from app.timestamps import agora
+
+    token = begin_request("/api/v1/seguranca/analisar")
+    try:
+        primeiro = agora()
+        assert agora() is primeiro
+        engine = MVPEngine()
+        # evento com fuso explícito comparado ao "agora" aware, sem TypeError
+        assert engine._is_futuro("2999-01-01T00:00:00Z")
+        assert not engine._is_futuro(datetime(2000, 1, 1))
+    finally:
+        end_request(token)
+    assert agora() is not primeiro
+
+
+@pytest.mark.asyncio
+async def test_memo_de_features_completa_texto_livre_e_devolve_copias():
+    engine = MVPEngine()
+    evento = {
+        "titulo": "Roda de Samba",
+        "descricao": "Grande roda",
+        "quadra": "SCS 3",
+        "tipo": "musical",
+        "dataHora": "2024-12-20T21:00:00",
+    }
+
+    primeiro = engine.run("analisar_evento", {"evento": evento})
+    primeiro["recomendacoes"].append("mutação do chamador")
+    segundo = engine.run("analisar_evento", {"evento": {**evento, "titulo": "Forró"}})
+
+    assert segundo["recomendacoes"] == ["Iluminação adicional recomendada"]
+    assert "Forró" in segundo["sugestaoTexto"]
+    assert engine.memo.stats()["prompts"]["analisar_evento"] == {
+        "chaves": 1,
+        "hits": 1,
+        "misses": 1,
+    }
+
+    # com histórico de similares a taxa é contínua: calcula sem a tabela
+    historico = {"eventos_similares": [{"taxaSucesso": 0.9}]}
+    resultado = engine.run(
+        "prever_sucesso_evento", {"evento": evento, "historico": historico}
+    )
+    assert "Baseado em 1 eventos similares no histórico" in resultado["fatores"]
+    assert "prever_sucesso_evento" not in engine.memo.stats()["prompts"]
+
+    base = ProviderLento(0)
+    provider = CachedProvider(
+        CoalescingProvider(base, analisadores.prompts(CHEAP)),
+        ResponseCache(),
+        "mvp",
+        analisadores.prompts(CHEAP),
+    )
+    await provider.generate("prever_risco", {"quadra": "SCS 1"})
+    await provider.generate("prever_risco", {"quadra": "SCS 1"})
+    assert base.chamadas == 2
+    assert provider.cache.stats()["misses"] == 0
+
+
+def test_registro_de_analisadores():
+    engine = MVPEngine()
+    assert len(analisadores) == 12
+    for analisador in analisadores:
+        assert analisador.entradas
+        assert analisador.resposta.model_json_schema()
+    assert analisadores.prompts(BATCHABLE) == {"gerar_texto"}
+    assert analisadores.com_relogio() == {"analisar_seguranca", "orquestrar_agentes"}
+    assert BatchingProvider(ProviderLento()).prompts == {"gerar_texto"}
+    assert PriorityScheduler(priorities={}).classe("gerar_texto") == "marketing"
+
+    with pytest.raises(PromptDesconhecidoError):
+        engine.run("nao_existe", {})
+
+    # análise nova entra sem mexer no dispatcher
+    @analisadores.register("teste_eco", resposta=EventoRequest, entradas=("x",))
+    def _eco(self, context):
+        return {"x": context["x"]}
+
+    try:
+        assert engine.run("teste_eco", {"x": 1}) == {"x": 1}
+    finally:
+        analisadores._analisadores.pop("teste_eco")